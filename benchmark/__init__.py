@@ -0,0 +1,15 @@
+"""
+Benchmark package.
+
+Reproducible load benchmark of the API:
+- dataset: synthetic Parcellaire-Express-like data loaded into a local PostGIS
+- traces: request traces mimicking the web map (pan/zoom sessions)
+- runner: replays a trace against a running server and reports latencies
+
+Typical run:
+    python -m benchmark.dataset --communes 16
+    python -m benchmark.traces --sessions 20 --steps 50 -o trace.jsonl
+    uvicorn main:app --workers 1 &
+    python -m benchmark.runner trace.jsonl -o results.json
+    python -m benchmark.runner trace.jsonl --compare results.json
+"""
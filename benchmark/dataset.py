@@ -0,0 +1,265 @@
+"""
+Synthetic cadastral dataset generator.
+
+Generates Parcellaire-Express-like layers (commune, feuille, parcelle,
+batiments) in EPSG:2154 around DEFAULT_MAP_CENTER, directly in PostGIS
+(generate_series), so that millions of parcelles load in seconds.
+
+Layout:
+- communes are square cells of `--commune-size` meters on a grid
+- each commune is split into feuilles (sections) of `--feuille-size` meters
+- each feuille is split into parcelles on a jittered grid; the density varies
+  per commune between `--min-density` and `--max-density` parcelles per km²
+  (rural to urban), and neighbouring parcelles share their vertices
+- a share of the parcelles (denser communes: more) gets a building
+
+Generation is deterministic for a given set of arguments.
+
+Usage:
+    python -m benchmark.dataset --communes 16 --drop
+"""
+
+import argparse
+import logging
+import math
+import time
+
+from sqlalchemy import create_engine, func, select, text
+
+from config import DATABASE_URL, DEFAULT_MAP_CENTER, SOURCE_SRID, TARGET_SRID
+from database import Base
+from models.batiments import Batiment
+from models.commune import Commune
+from models.feuille import Feuille
+from models.parcelle import Parcelle
+from services.derived import refresh_all
+
+logger = logging.getLogger(__name__)
+
+# Synthetic department code and edition
+DEPARTMENT = "02"
+EDITION = "1"
+
+TABLES = [Commune.__table__, Feuille.__table__, Parcelle.__table__, Batiment.__table__]
+
+
+# =============================================================================
+# SQL TEMPLATES
+# =============================================================================
+
+# Deterministic pseudo-random value in [0, 1) for integer coordinates
+RANDOM_SQL = (
+    "(abs(sin(({a}) * 12.9898 + ({b}) * 78.233 + {seed}) * 43758.5453)"
+    " - floor(abs(sin(({a}) * 12.9898 + ({b}) * 78.233 + {seed}) * 43758.5453)))"
+)
+
+COMMUNE_SQL = """
+INSERT INTO commune (nom_commune, code_departement, code_insee, geom)
+VALUES (:nom, :dep, :insee, ST_Multi(ST_MakeEnvelope(:x0, :y0, :x1, :y1, :srid)))
+"""
+
+FEUILLE_SQL = """
+INSERT INTO feuille (feuille, section, code_departement, nom_commune, code_commune,
+                     code_insee, commune_abs, echelle, edition, code_arret, geom)
+SELECT f.n, f.section, :dep, :nom, :com, :insee, '000', '2000', :edition, '000',
+       ST_Multi(ST_MakeEnvelope(f.x0, f.y0, f.x0 + :fsize, f.y0 + :fsize, :srid))
+FROM (
+    SELECT row_number() OVER (ORDER BY i, j) AS n,
+           chr(65 + (((i * :nf + j) / 26) % 26)::int) || chr(65 + ((i * :nf + j) % 26)::int) AS section,
+           :x0 + i * :fsize AS x0,
+           :y0 + j * :fsize AS y0
+    FROM generate_series(0, :nf - 1) AS i, generate_series(0, :nf - 1) AS j
+) AS f
+"""
+
+# Parcelles: grid nodes jittered with a deterministic function of their global
+# coordinates, so that adjacent parcelles (even across feuilles) share vertices
+PARCELLE_SQL = """
+WITH cells AS (
+    SELECT f.feuille, f.section,
+           ST_XMin(f.geom) AS fx, ST_YMin(f.geom) AS fy,
+           i, j
+    FROM feuille AS f,
+         generate_series(0, :np - 1) AS i,
+         generate_series(0, :np - 1) AS j
+    WHERE f.code_insee = :insee
+),
+nodes AS (
+    SELECT c.*,
+           ARRAY[
+               ST_MakePoint(fx + i * :step + {jx00}, fy + j * :step + {jy00}),
+               ST_MakePoint(fx + (i + 1) * :step + {jx10}, fy + j * :step + {jy10}),
+               ST_MakePoint(fx + (i + 1) * :step + {jx11}, fy + (j + 1) * :step + {jy11}),
+               ST_MakePoint(fx + i * :step + {jx01}, fy + (j + 1) * :step + {jy01})
+           ] AS pts
+    FROM cells AS c
+),
+polygons AS (
+    SELECT feuille, section, i, j,
+           ST_SetSRID(ST_MakePolygon(ST_MakeLine(pts || pts[1])), :srid) AS geom
+    FROM nodes
+)
+INSERT INTO parcelle (idu, numero, section, feuille, code_dep, nom_com, com_abs,
+                      code_arr, contenance, geom)
+SELECT :insee || '000' || section || lpad((i * :np + j + 1)::text, 4, '0'),
+       lpad((i * :np + j + 1)::text, 4, '0'),
+       section, feuille, :dep, :nom, '000', '000',
+       round(ST_Area(geom))::int,
+       ST_Multi(geom)
+FROM polygons
+"""
+
+BATIMENT_SQL = """
+INSERT INTO batiments (type_batiment, geom)
+SELECT CASE WHEN {r} < 0.8 THEN 'Bâti dur' ELSE 'Bâti léger' END,
+       ST_Multi(ST_Scale(geom, ST_MakePoint(0.35, 0.35), ST_Centroid(geom)))
+FROM parcelle
+WHERE nom_com = :nom AND {r} < :share
+"""
+
+
+def _jitter(axis: str, di: int, dj: int, seed: int) -> str:
+    # Jitter of a grid node: +/- 30% of a step, from its global indices
+    offset = 0 if axis == "x" else 1000
+    a = f"round((fx + (i + {di}) * :step) / :step)"
+    b = f"round((fy + (j + {dj}) * :step) / :step)"
+    return f"(({RANDOM_SQL.format(a=a, b=b, seed=seed + offset)} - 0.5) * 0.6 * :step)"
+
+
+def parcelle_sql(seed: int) -> str:
+    """
+    Parcelle INSERT statement with jitter expressions for the four corners.
+    """
+    corners = {}
+    for di, dj in ((0, 0), (1, 0), (1, 1), (0, 1)):
+        corners[f"jx{di}{dj}"] = _jitter("x", di, dj, seed)
+        corners[f"jy{di}{dj}"] = _jitter("y", di, dj, seed)
+    return PARCELLE_SQL.format(**corners)
+
+
+# =============================================================================
+# GENERATION
+# =============================================================================
+
+def commune_density(index: int, min_density: float, max_density: float, seed: int) -> float:
+    """
+    Parcelle density (per km²) of a commune: mostly rural, a few dense towns.
+    """
+    r = abs(math.sin(index * 12.9898 + seed) * 43758.5453) % 1
+    return min_density + (max_density - min_density) * r ** 3
+
+
+def generate(
+    engine,
+    communes: int,
+    commune_size: float,
+    feuille_size: float,
+    min_density: float,
+    max_density: float,
+    building_share: float,
+    seed: int,
+    drop: bool,
+):
+    """
+    Generate the synthetic dataset and the derived tables.
+    """
+    if drop:
+        Base.metadata.drop_all(engine, tables=TABLES)
+    Base.metadata.create_all(engine, tables=TABLES)
+
+    grid = math.ceil(math.sqrt(communes))
+    feuilles_per_side = max(1, round(commune_size / feuille_size))
+    feuille_size = commune_size / feuilles_per_side
+
+    with engine.begin() as conn:
+        # Center the dataset on the default map center
+        point = func.ST_Transform(
+            func.ST_SetSRID(
+                func.ST_MakePoint(DEFAULT_MAP_CENTER["lon"], DEFAULT_MAP_CENTER["lat"]),
+                TARGET_SRID
+            ),
+            SOURCE_SRID
+        )
+        center = conn.execute(select(func.ST_X(point), func.ST_Y(point))).one()
+        origin_x = center[0] - grid * commune_size / 2
+        origin_y = center[1] - grid * commune_size / 2
+
+        insert_parcelles = text(parcelle_sql(seed))
+        insert_batiments = text(BATIMENT_SQL.format(
+            r=RANDOM_SQL.format(a="gid", b="feuille", seed=seed + 2000)
+        ))
+
+        for index in range(communes):
+            started = time.perf_counter()
+            x0 = origin_x + (index % grid) * commune_size
+            y0 = origin_y + (index // grid) * commune_size
+            code_com = f"{index + 1:03d}"
+            insee = DEPARTMENT + code_com
+            nom = f"COMMUNE {code_com}"
+
+            density = commune_density(index, min_density, max_density, seed)
+            parcelles_per_feuille = density * (feuille_size / 1000) ** 2
+            per_side = max(1, round(math.sqrt(parcelles_per_feuille)))
+            share = building_share * (0.5 + (density - min_density) / max(1, max_density - min_density))
+
+            conn.execute(text(COMMUNE_SQL), {
+                "nom": nom, "dep": DEPARTMENT, "insee": insee,
+                "x0": x0, "y0": y0, "x1": x0 + commune_size, "y1": y0 + commune_size,
+                "srid": SOURCE_SRID,
+            })
+            conn.execute(text(FEUILLE_SQL), {
+                "dep": DEPARTMENT, "nom": nom, "com": code_com, "insee": insee,
+                "edition": EDITION, "nf": feuilles_per_side, "fsize": feuille_size,
+                "x0": x0, "y0": y0, "srid": SOURCE_SRID,
+            })
+            parcelles = conn.execute(insert_parcelles, {
+                "insee": insee, "dep": DEPARTMENT, "nom": nom,
+                "np": per_side, "step": feuille_size / per_side, "srid": SOURCE_SRID,
+            }).rowcount
+            batiments = conn.execute(insert_batiments, {"nom": nom, "share": min(share, 1.0)}).rowcount
+
+            logger.info(
+                "%s: %d parcelles (%.0f/km²), %d batiments in %.1fs",
+                nom, parcelles, density, batiments, time.perf_counter() - started
+            )
+
+        for table in TABLES:
+            conn.execute(text(f"ANALYZE {table.name}"))
+
+    with engine.begin() as conn:
+        refresh_all(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic cadastral dataset in PostGIS.")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Target database (sync driver)")
+    parser.add_argument("--communes", type=int, default=16, help="Number of communes")
+    parser.add_argument("--commune-size", type=float, default=4000, help="Commune side in meters")
+    parser.add_argument("--feuille-size", type=float, default=1000, help="Feuille side in meters")
+    parser.add_argument("--min-density", type=float, default=80, help="Rural parcelles per km²")
+    parser.add_argument("--max-density", type=float, default=2500, help="Urban parcelles per km²")
+    parser.add_argument("--building-share", type=float, default=0.4, help="Average share of built parcelles")
+    parser.add_argument("--seed", type=int, default=1, help="Generation seed")
+    parser.add_argument("--drop", action="store_true", help="Drop and recreate the tables first")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    engine = create_engine(args.database_url)
+    started = time.perf_counter()
+    generate(
+        engine,
+        communes=args.communes,
+        commune_size=args.commune_size,
+        feuille_size=args.feuille_size,
+        min_density=args.min_density,
+        max_density=args.max_density,
+        building_share=args.building_share,
+        seed=args.seed,
+        drop=args.drop,
+    )
+    logger.info("Dataset generated in %.1fs", time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
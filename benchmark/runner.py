@@ -0,0 +1,221 @@
+"""
+Benchmark runner.
+
+Replays a trace (see benchmark/traces.py) against a running API server, one
+concurrent task per session, and reports per endpoint:
+- latency percentiles (p50 / p95 / p99)
+- throughput (requests per second over the run)
+- response bytes
+- database time, read from the `Server-Timing: db;dur=...` response header
+  when the server sends it
+
+Results can be saved as JSON and compared with a previous run.
+
+Usage:
+    python -m benchmark.runner trace.jsonl -o results.json
+    python -m benchmark.runner trace.jsonl --realtime --compare results.json
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+
+SERVER_TIMING_DB = re.compile(r"(?:^|,)\s*db;dur=([0-9.]+)")
+
+
+# =============================================================================
+# STATISTICS
+# =============================================================================
+
+def percentile(values: list, p: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of a list of values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, round(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples: list, duration: float) -> dict:
+    """
+    Summarize request samples of one endpoint.
+
+    Args:
+        samples: (status, latency_ms, bytes, db_ms or None) tuples
+        duration: Wall-clock duration of the run in seconds
+    """
+    latencies = [s[1] for s in samples]
+    sizes = [s[2] for s in samples]
+    db_times = [s[3] for s in samples if s[3] is not None]
+    errors = sum(1 for s in samples if s[0] >= 400)
+
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": len(samples) / duration if duration else None,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+        },
+        "bytes": {
+            "mean": sum(sizes) / len(sizes) if sizes else None,
+            "total": sum(sizes),
+        },
+        "db_ms": {
+            "p50": percentile(db_times, 50),
+            "p95": percentile(db_times, 95),
+            "mean": sum(db_times) / len(db_times) if db_times else None,
+        },
+    }
+
+
+# =============================================================================
+# REPLAY
+# =============================================================================
+
+async def replay_session(client: httpx.AsyncClient, records: list, realtime: bool, speed: float, samples: dict):
+    """
+    Replay the requests of one session sequentially.
+    """
+    started = time.perf_counter()
+    for record in records:
+        if realtime:
+            delay = record["t"] / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        t0 = time.perf_counter()
+        try:
+            response = await client.get(record["path"], params=record["params"])
+            content = response.content
+            status = response.status_code
+            match = SERVER_TIMING_DB.search(response.headers.get("server-timing", ""))
+            db_ms = float(match.group(1)) if match else None
+        except httpx.HTTPError:
+            content, status, db_ms = b"", 599, None
+        latency_ms = (time.perf_counter() - t0) * 1000
+
+        samples[record["endpoint"]].append((status, latency_ms, len(content), db_ms))
+
+
+async def run(trace_path: str, base_url: str, realtime: bool, speed: float, timeout: float) -> dict:
+    """
+    Replay a trace and return the results per endpoint.
+    """
+    sessions = defaultdict(list)
+    with open(trace_path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                sessions[record["session"]].append(record)
+
+    samples = defaultdict(list)
+    limits = httpx.Limits(max_connections=len(sessions), max_keepalive_connections=len(sessions))
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            replay_session(client, records, realtime, speed, samples)
+            for records in sessions.values()
+        ))
+        duration = time.perf_counter() - started
+
+    all_samples = [s for endpoint_samples in samples.values() for s in endpoint_samples]
+    return {
+        "trace": trace_path,
+        "base_url": base_url,
+        "sessions": len(sessions),
+        "duration_s": duration,
+        "total": summarize(all_samples, duration),
+        "endpoints": {
+            endpoint: summarize(endpoint_samples, duration)
+            for endpoint, endpoint_samples in sorted(samples.items())
+        },
+    }
+
+
+# =============================================================================
+# REPORTING
+# =============================================================================
+
+def _format(value, unit="") -> str:
+    if value is None:
+        return "-"
+    return f"{value:,.1f}{unit}"
+
+
+def _delta(current, baseline) -> str:
+    if current is None or not baseline:
+        return ""
+    return f" ({(current - baseline) / baseline * 100:+.0f}%)"
+
+
+def print_report(results: dict, baseline: Optional[dict] = None):
+    """
+    Print a results table (with changes relative to a baseline run).
+    """
+    header = f"{'endpoint':<24}{'reqs':>7}{'err':>5}{'req/s':>9}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}{'KB/resp':>16}{'db ms':>16}"
+    print(header)
+    print("-" * len(header))
+
+    rows = [("TOTAL", results["total"])] + list(results["endpoints"].items())
+    for name, stats in rows:
+        base = None
+        if baseline is not None:
+            base = baseline["total"] if name == "TOTAL" else baseline["endpoints"].get(name)
+
+        def cell(getter, scale=1.0):
+            value = getter(stats)
+            value = value / scale if value is not None else None
+            base_value = getter(base) if base else None
+            base_value = base_value / scale if base_value is not None else None
+            return _format(value) + _delta(value, base_value)
+
+        print(
+            f"{name:<24}{stats['requests']:>7}{stats['errors']:>5}"
+            f"{_format(stats['throughput_rps']):>9}"
+            f"{cell(lambda s: s['latency_ms']['p50']):>16}"
+            f"{cell(lambda s: s['latency_ms']['p95']):>16}"
+            f"{cell(lambda s: s['latency_ms']['p99']):>16}"
+            f"{cell(lambda s: s['bytes']['mean'], 1024):>16}"
+            f"{cell(lambda s: s['db_ms']['mean']):>16}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a map trace against the API.")
+    parser.add_argument("trace", help="Trace file (JSON lines)")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--realtime", action="store_true", help="Respect the trace timing (think times)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time acceleration with --realtime")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Request timeout (seconds)")
+    parser.add_argument("-o", "--output", help="Save results as JSON")
+    parser.add_argument("--compare", help="Previous results (JSON) to compare with")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.trace, args.base_url, args.realtime, args.speed, args.timeout))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
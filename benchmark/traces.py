@@ -0,0 +1,208 @@
+"""
+Map trace generator.
+
+Generates request traces that mimic static/index.html: each session is a
+user panning and zooming the map; every view change issues the requests the
+web client would send (bbox of a 1280x800 viewport, simplification from
+getSimplifyTolerance(), limit), after a debounce/think time.
+
+Traces are JSON lines:
+    {"session": 0, "t": 1.23, "endpoint": "parcelle", "path": "/parcelle/", "params": {...}}
+
+Usage:
+    python -m benchmark.traces --sessions 20 --steps 50 -o trace.jsonl
+    python -m benchmark.traces --layers batiments commune --tiles -o mixed.jsonl
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+
+from config import AGGREGATE_MAX_ZOOM, DEFAULT_MAP_CENTER, DEFAULT_PARCELLE_LIMIT
+from services.tiles import tile_simplify_tolerance
+
+# Web client viewport (pixels) and zoom range
+VIEWPORT_WIDTH = 1280
+VIEWPORT_HEIGHT = 800
+MIN_ZOOM = 11
+MAX_ZOOM = 18
+
+# Relative frequency of user actions
+ACTIONS = {
+    "pan": 0.6,
+    "zoom_in": 0.15,
+    "zoom_out": 0.15,
+    "reload": 0.1,
+}
+
+
+# =============================================================================
+# WEB MERCATOR HELPERS
+# =============================================================================
+
+def lonlat_to_pixels(lon: float, lat: float, zoom: int) -> tuple:
+    """
+    Convert WGS84 coordinates to global pixel coordinates at a zoom level.
+    """
+    scale = 256 * 2 ** zoom
+    x = (lon + 180) / 360 * scale
+    sin_lat = math.sin(math.radians(lat))
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def pixels_to_lonlat(x: float, y: float, zoom: int) -> tuple:
+    """
+    Convert global pixel coordinates at a zoom level to WGS84 coordinates.
+    """
+    scale = 256 * 2 ** zoom
+    lon = x / scale * 360 - 180
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / scale))))
+    return lon, lat
+
+
+def viewport_bbox(lon: float, lat: float, zoom: int) -> tuple:
+    """
+    Bounding box (xmin, ymin, xmax, ymax) of the viewport centered on a point.
+    """
+    cx, cy = lonlat_to_pixels(lon, lat, zoom)
+    xmin, ymax = pixels_to_lonlat(cx - VIEWPORT_WIDTH / 2, cy - VIEWPORT_HEIGHT / 2, zoom)
+    xmax, ymin = pixels_to_lonlat(cx + VIEWPORT_WIDTH / 2, cy + VIEWPORT_HEIGHT / 2, zoom)
+    return xmin, ymin, xmax, ymax
+
+
+def viewport_tiles(lon: float, lat: float, zoom: int) -> list:
+    """
+    XYZ tiles covering the viewport centered on a point.
+    """
+    cx, cy = lonlat_to_pixels(lon, lat, zoom)
+    x0 = int((cx - VIEWPORT_WIDTH / 2) // 256)
+    x1 = int((cx + VIEWPORT_WIDTH / 2) // 256)
+    y0 = int((cy - VIEWPORT_HEIGHT / 2) // 256)
+    y1 = int((cy + VIEWPORT_HEIGHT / 2) // 256)
+    return [(zoom, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+# =============================================================================
+# TRACE GENERATION
+# =============================================================================
+
+def view_requests(lon: float, lat: float, zoom: int, limit: int, layers: list, tiles: bool) -> list:
+    """
+    Requests issued by the web client for one view.
+    """
+    xmin, ymin, xmax, ymax = viewport_bbox(lon, lat, zoom)
+    bbox = {"xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax}
+    simplify = tile_simplify_tolerance(zoom)
+
+    if zoom <= AGGREGATE_MAX_ZOOM:
+        # Zoomed out: the client shows summaries per cell
+        requests = [{
+            "endpoint": "parcelle_aggregate",
+            "path": "/parcelle/aggregate",
+            "params": {**bbox, "zoom": zoom},
+        }]
+    else:
+        requests = [{
+            "endpoint": "parcelle",
+            "path": "/parcelle/",
+            "params": {**bbox, "limit": limit, "simplify": simplify},
+        }]
+    for layer in layers:
+        requests.append({
+            "endpoint": layer,
+            "path": f"/{layer}/",
+            "params": {**bbox, "limit": limit, "simplify": simplify},
+        })
+    if tiles:
+        for z, x, y in viewport_tiles(lon, lat, zoom):
+            requests.append({
+                "endpoint": "parcelle_mvt",
+                "path": f"/parcelle/tiles/{z}/{x}/{y}.mvt",
+                "params": {},
+            })
+    return requests
+
+
+def generate_session(
+    rng: random.Random,
+    session: int,
+    steps: int,
+    spread: float,
+    think_time: float,
+    limit: int,
+    layers: list,
+    tiles: bool,
+):
+    """
+    Generate the requests of one user session (random walk over the map).
+
+    Yields:
+        Trace records
+    """
+    # Sessions start around the default view (shared links, home page)
+    lon = DEFAULT_MAP_CENTER["lon"] + rng.uniform(-spread, spread)
+    lat = DEFAULT_MAP_CENTER["lat"] + rng.uniform(-spread, spread) * 0.66
+    zoom = DEFAULT_MAP_CENTER["zoom"]
+    t = 0.0
+
+    names = list(ACTIONS)
+    weights = list(ACTIONS.values())
+
+    for step in range(steps):
+        if step > 0:
+            action = rng.choices(names, weights)[0]
+            if action == "pan":
+                # Drag by 10-60% of the viewport in a random direction
+                cx, cy = lonlat_to_pixels(lon, lat, zoom)
+                angle = rng.uniform(0, 2 * math.pi)
+                distance = rng.uniform(0.1, 0.6) * VIEWPORT_WIDTH
+                lon, lat = pixels_to_lonlat(
+                    cx + distance * math.cos(angle),
+                    cy + distance * math.sin(angle),
+                    zoom
+                )
+            elif action == "zoom_in":
+                zoom = min(MAX_ZOOM, zoom + 1)
+            elif action == "zoom_out":
+                zoom = max(MIN_ZOOM, zoom - 1)
+
+            # Debounce (300 ms in index.html) plus the user's think time
+            t += 0.3 + rng.expovariate(1 / think_time)
+
+        for request in view_requests(lon, lat, zoom, limit, layers, tiles):
+            yield {"session": session, "t": round(t, 3), **request}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate web map request traces.")
+    parser.add_argument("--sessions", type=int, default=20, help="Number of concurrent user sessions")
+    parser.add_argument("--steps", type=int, default=50, help="View changes per session")
+    parser.add_argument("--spread", type=float, default=0.05, help="Start position spread (degrees)")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean think time (seconds)")
+    parser.add_argument("--limit", type=int, default=DEFAULT_PARCELLE_LIMIT, help="Parcelle limit")
+    parser.add_argument("--layers", nargs="*", default=[], help="Other layers requested with each view")
+    parser.add_argument("--tiles", action="store_true", help="Also request parcelle vector tiles")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for session in range(args.sessions):
+            records = generate_session(
+                rng, session, args.steps, args.spread, args.think_time,
+                args.limit, args.layers, args.tiles
+            )
+            for record in records:
+                output.write(json.dumps(record) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
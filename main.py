@@ -9,33 +9,77 @@ Access map at: http://localhost:8000/map
 API docs at: http://localhost:8000/docs
 """
 
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy.exc import DBAPIError
 
 # Import routers
 from routers import (
     batiments,
     borne_limite_propriete,
+    cache,
     commune,
     emprise,
+    export,
     feuille,
     localisant,
+    majic,
+    metrics,
     parcelle,
+    search,
     spatial_ref_sys,
     subdivision_fiscale,
 )
 
+from services.admission import CancelOnDisconnectMiddleware, is_query_timeout
+from services.majic import majic_available, majic_client
+from services.metrics import InstrumentedJSONResponse, MetricsMiddleware
+from services.replicas import replica_set
+
 # =============================================================================
 # APPLICATION SETUP
 # =============================================================================
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application startup/shutdown: start the read-replica health checks,
+    release shared clients on shutdown.
+    """
+    replica_set.start()
+    yield
+    await replica_set.stop()
+    await majic_client.aclose()
+
+
 app = FastAPI(
     title="PostGIS Cadastral API",
     description="API for French cadastral data (Parcellaire Express) with PostGIS",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=InstrumentedJSONResponse,
 )
 
+# Per-request timings: Server-Timing header and /metrics histograms
+app.add_middleware(MetricsMiddleware)
+
+# Requests whose client disconnected are cancelled, with their queries
+app.add_middleware(CancelOnDisconnectMiddleware)
+
+
+@app.exception_handler(DBAPIError)
+async def database_error_handler(request: Request, exc: DBAPIError):
+    """
+    Queries stopped by their statement timeout answer 504; other database
+    errors stay internal errors.
+    """
+    if is_query_timeout(exc):
+        return JSONResponse(status_code=504, content={"detail": "Query timed out"})
+    raise exc
+
 
 # =============================================================================
 # ROUTER REGISTRATION
@@ -54,6 +98,20 @@ app.include_router(emprise.router)
 # Reference data
 app.include_router(spatial_ref_sys.router)
 
+# Search (autocomplete)
+app.include_router(search.router)
+
+# Bulk downloads
+app.include_router(export.router)
+
+# External data (property owners), when httpx is installed
+if majic_available():
+    app.include_router(majic.router)
+
+# Monitoring
+app.include_router(cache.router)
+app.include_router(metrics.router)
+
 
 # =============================================================================
 # STATIC FILES
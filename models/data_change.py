@@ -0,0 +1,43 @@
+"""
+Data change log model.
+
+One row per data load or update: a full reload (no extent) or an
+incremental update limited to an area (extent of the changed feuilles).
+The latest row id is the data version marker used by the caches
+(see services/versioning.py).
+"""
+
+from sqlalchemy import Column, DateTime, Integer, String, func
+from geoalchemy2 import Geometry
+
+from config import TARGET_SRID
+from database import Base
+
+
+class DataChange(Base):
+    """
+    SQLAlchemy model for data changes.
+    
+    Attributes:
+        id: Change number (data version marker), increasing
+        created_at: Time of the change
+        description: What was loaded (e.g. "full refresh", "edition update")
+        feuilles: Number of changed feuilles (None for a full reload)
+        extent: Changed area as one envelope per changed feuille
+            (MultiPolygon in WGS84 / EPSG:4326), None for a full reload
+    """
+    
+    __tablename__ = "data_change"
+    
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    description = Column(String)
+    feuilles = Column(Integer)
+    
+    extent = Column(
+        Geometry(
+            geometry_type="MULTIPOLYGON",
+            srid=TARGET_SRID,
+            spatial_index=False
+        )
+    )
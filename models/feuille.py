@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 from geoalchemy2 import Geometry
 from database import Base
 
@@ -25,3 +25,8 @@ class Feuille(Base):
             spatial_index=True
         )
     )
+
+    __table_args__ = (
+        # Sections of a commune (search endpoint)
+        Index("ix_feuille_section", code_insee, section),
+    )
@@ -5,7 +5,7 @@ Represents a cadastral parcel from the French Parcellaire Express dataset.
 Data source: IGN Parcellaire Express (https://geoservices.ign.fr/parcellaire-express)
 """
 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String, func
 from geoalchemy2 import Geometry
 
 from database import Base
@@ -27,6 +27,8 @@ class Parcelle(Base):
         code_arr: Arrondissement/prefix code
         contenance: Surface area in centiares (1 centiare = 0.01 m²)
         geom: Geometry (MultiPolygon in Lambert 93 / EPSG:2154)
+        centroid: Point on surface of geom (Lambert 93), indexed for KNN
+            ordering; filled by `python -m scripts.refresh_derived`
     """
     
     __tablename__ = "parcelle"
@@ -57,3 +59,21 @@ class Parcelle(Base):
             spatial_index=True
         )
     )
+    
+    # Stored point on surface (Lambert 93), used for center-first ordering
+    centroid = Column(
+        Geometry(
+            geometry_type="POINT",
+            srid=2154,
+            spatial_index=True
+        )
+    )
+    
+    __table_args__ = (
+        # Feuille key (département, commune, absorbed commune, section + sheet
+        # number), used by incremental edition updates
+        Index("ix_parcelle_feuille_key", func.left(idu, 10), feuille),
+        # Parcelle references by commune (INSEE prefix of the IDU), section
+        # and number, used by the search endpoint
+        Index("ix_parcelle_reference", func.left(idu, 5), section, numero),
+    )
@@ -0,0 +1,69 @@
+"""
+Parcelle aggregate model.
+
+Pre-aggregated parcelle summaries per cell (feuille, commune or square grid
+cell), one row per aggregation level and cell, with the cell geometry already
+simplified and transformed to WGS84. Built from the parcelle table by
+`python -m scripts.refresh_derived` (see services/derived.py).
+"""
+
+from sqlalchemy import BigInteger, Column, Index, Integer, String, literal_column
+from geoalchemy2 import Geometry
+
+from config import AGGREGATE_LEVELS, TARGET_SRID
+from database import Base
+
+
+def level_literal(level: str):
+    """
+    Aggregation level rendered as an SQL constant.
+
+    Queries must compare the level with a constant (not a bound parameter)
+    for PostgreSQL to match the partial spatial index of the level.
+    """
+    return literal_column("'" + level.replace("'", "''") + "'")
+
+
+class ParcelleAggregate(Base):
+    """
+    SQLAlchemy model for parcelle summaries per cell.
+    
+    Attributes:
+        level: Aggregation level (see AGGREGATE_LEVELS)
+        cell: Cell identifier within the level (feuille/commune id, or
+            "<column>_<row>" of a grid cell)
+        parcelles: Number of parcelles in the cell
+        contenance: Total surface of the parcelles, in centiares
+        dominant_section: Most frequent section among the parcelles
+        geom: Cell geometry (MultiPolygon in WGS84 / EPSG:4326)
+    """
+    
+    __tablename__ = "parcelle_aggregate"
+    
+    level = Column(String, primary_key=True)
+    cell = Column(String, primary_key=True)
+    
+    # Summary of the parcelles whose point on surface lies in the cell
+    parcelles = Column(Integer)
+    contenance = Column(BigInteger)
+    dominant_section = Column(String)
+    
+    # Geometry (WGS84), indexed per level below
+    geom = Column(
+        Geometry(
+            geometry_type="MULTIPOLYGON",
+            srid=TARGET_SRID,
+            spatial_index=False
+        )
+    )
+    
+    # One partial spatial index per level
+    __table_args__ = tuple(
+        Index(
+            f"idx_parcelle_aggregate_geom_{level}",
+            "geom",
+            postgresql_using="gist",
+            postgresql_where=literal_column("level") == level_literal(level),
+        )
+        for _, level, _ in AGGREGATE_LEVELS
+    )
@@ -0,0 +1,60 @@
+"""
+Parcelle geometry pyramid model.
+
+Pre-simplified parcelle geometries, one row per parcelle and simplification
+level, already transformed to WGS84. Built from the parcelle table by
+`python -m scripts.refresh_derived` (see services/derived.py).
+"""
+
+from sqlalchemy import Column, Float, Index, Integer, literal_column
+from geoalchemy2 import Geometry
+
+from config import PYRAMID_TOLERANCES, TARGET_SRID
+from database import Base
+
+
+def tolerance_literal(tolerance: float):
+    """
+    Tolerance rendered as an SQL constant.
+
+    Queries must compare the tolerance with a constant (not a bound parameter)
+    for PostgreSQL to match the partial spatial index of the level.
+    """
+    return literal_column(repr(float(tolerance)))
+
+
+class ParcellePyramid(Base):
+    """
+    SQLAlchemy model for pre-simplified parcelle geometries.
+    
+    Attributes:
+        gid: Parcelle primary key (parcelle.gid)
+        tolerance: Simplification tolerance in meters (pyramid level)
+        geom: Simplified geometry (MultiPolygon in WGS84 / EPSG:4326)
+    """
+    
+    __tablename__ = "parcelle_pyramid"
+    
+    gid = Column(Integer, primary_key=True)
+    tolerance = Column(Float, primary_key=True)
+    
+    # Geometry (WGS84), indexed per level below
+    geom = Column(
+        Geometry(
+            geometry_type="MULTIPOLYGON",
+            srid=TARGET_SRID,
+            spatial_index=False
+        )
+    )
+    
+    # One partial spatial index per level, so that each level is searched
+    # like a separate table
+    __table_args__ = tuple(
+        Index(
+            f"idx_parcelle_pyramid_geom_{tolerance:g}".replace(".", "_"),
+            "geom",
+            postgresql_using="gist",
+            postgresql_where=literal_column("tolerance") == tolerance_literal(tolerance),
+        )
+        for tolerance in PYRAMID_TOLERANCES
+    )
@@ -1,13 +1,16 @@
 from sqlalchemy import Column, Integer, String
-from geoalchemy2 import Geometry
 from database import Base
 
 class SpatialRefSys(Base):
+    """
+    PostGIS catalog of spatial reference systems (no geometry column).
+    """
+
     __tablename__ = "spatial_ref_sys"
 
-    id = Column(Integer, primary_key=True, index=True)
+    srid = Column(Integer, primary_key=True)
 
-    auth_name = Column(String)
+    auth_name = Column(String(256))
     auth_srid = Column(Integer)
-    srtext = Column(String)
-    proj4text = Column(String)
+    srtext = Column(String(2048))
+    proj4text = Column(String(2048))
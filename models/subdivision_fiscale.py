@@ -8,7 +8,7 @@ class SubdivisionFiscale(Base):
     id = Column(Integer, primary_key=True, index=True)
 
     lettre = Column(String)
-    idu_parcelle = Column(String)
+    idu_parcelle = Column(String, index=True)
 
     geom = Column(
         Geometry(
@@ -0,0 +1,38 @@
+"""
+Cache router.
+
+Exposes the counters of the tile/response cache, of the parcelle lookup
+cache (hits, misses, evictions), of the request coalescing and of the
+point-in-parcelle index.
+"""
+
+from fastapi import APIRouter
+
+from services.cache import parcelle_lookup_cache, parcelle_lookup_stats, response_cache, response_flights
+from services.point_index import point_index
+
+router = APIRouter(prefix="/cache", tags=["Cache"])
+
+
+@router.get("/stats")
+def get_cache_stats():
+    """
+    Get response cache statistics.
+    
+    Returns:
+        Hit/miss/eviction counters, sizes, coalesced queries and the
+        current data version
+    """
+    return {
+        **response_cache.info(),
+        "parcelle_lookup": {
+            "entries": len(parcelle_lookup_cache),
+            "bytes": parcelle_lookup_cache.size,
+            "max_bytes": parcelle_lookup_cache.max_bytes,
+            "hits": parcelle_lookup_stats.memory_hits,
+            "misses": parcelle_lookup_stats.misses,
+            "evictions": parcelle_lookup_stats.memory_evictions,
+        },
+        "coalescing": response_flights.info(),
+        "point_index": point_index.info(),
+    }
@@ -0,0 +1,108 @@
+"""
+Export router.
+
+Bulk downloads of a layer as FlatGeobuf or GeoParquet files, for a
+département, a commune or a bounding box (see services/export.py).
+
+The file is written to a temporary file by a worker thread (sync engine,
+server-side cursor), then sent and removed. Exports go through admission
+control and run with the statement timeout of the route (see
+services/admission.py).
+"""
+
+import os
+import tempfile
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+
+import database
+from config import EXPORT_DIR
+from services.admission import admitted, statement_timeout
+from services.export import (
+    EXPORT_EXTENSIONS,
+    EXPORT_MEDIA_TYPES,
+    ExportArea,
+    ExportFormat,
+    export_layer,
+    geoparquet_available,
+)
+from services.layers import Layer, layer_registry
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+
+def export_to_file(layer: Layer, area: ExportArea, output_format: ExportFormat, timeout: int = 0) -> str:
+    """
+    Write an export to a temporary file.
+
+    Args:
+        timeout: Statement timeout (ms) of the export queries (0: server
+            default)
+
+    Returns:
+        Path of the file (removed by the caller)
+    """
+    with tempfile.NamedTemporaryFile(
+        dir=EXPORT_DIR, suffix=EXPORT_EXTENSIONS[output_format], delete=False
+    ) as output:
+        try:
+            with database.engine.connect() as conn:
+                if timeout:
+                    # Transaction-local, so that pooled connections keep the default
+                    conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+                export_layer(conn, layer, area, output_format, output)
+        except BaseException:
+            output.close()
+            os.remove(output.name)
+            raise
+    return output.name
+
+
+@router.get("/{layer_name}")
+async def export(
+    request: Request,
+    layer_name: str,
+    format: ExportFormat = Query(ExportFormat.FLATGEOBUF, description="File format"),
+    code_dep: Optional[str] = Query(None, description="Département code (e.g. 02)"),
+    insee: Optional[str] = Query(None, description="Commune INSEE code (e.g. 02001)"),
+    nom_com: Optional[str] = Query(None, description="Commune name"),
+    xmin: Optional[float] = Query(None, description="Minimum longitude (WGS84)"),
+    ymin: Optional[float] = Query(None, description="Minimum latitude (WGS84)"),
+    xmax: Optional[float] = Query(None, description="Maximum longitude (WGS84)"),
+    ymax: Optional[float] = Query(None, description="Maximum latitude (WGS84)"),
+):
+    """
+    Download the features of a layer as a FlatGeobuf (with spatial index) or
+    GeoParquet file, in WGS84.
+
+    At least one area criterion is required (département, commune or
+    bounding box); criteria are combined.
+    """
+
+    layer = layer_registry.get(layer_name)
+    if layer is None:
+        raise HTTPException(status_code=404, detail=f"Unknown layer {layer_name}")
+    if layer.geometry_column is None:
+        raise HTTPException(status_code=400, detail=f"{layer_name} has no geometry")
+    if format == ExportFormat.GEOPARQUET and not geoparquet_available():
+        raise HTTPException(status_code=501, detail="GeoParquet export requires pyarrow")
+
+    corners = (xmin, ymin, xmax, ymax)
+    if any(value is not None for value in corners) and None in corners:
+        raise HTTPException(status_code=400, detail="The bounding box needs xmin, ymin, xmax and ymax")
+    area = ExportArea(code_dep, insee, nom_com, corners if xmin is not None else None)
+    if area.is_empty():
+        raise HTTPException(status_code=400, detail="Give a département, a commune or a bounding box")
+
+    async with admitted():
+        path = await run_in_threadpool(export_to_file, layer, area, format, statement_timeout(request))
+    return FileResponse(
+        path,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        filename=f"{layer.name}_{area.slug()}{EXPORT_EXTENSIONS[format]}",
+        background=BackgroundTask(os.remove, path),
+    )
@@ -0,0 +1,84 @@
+"""
+MAJIC router.
+
+Property owner lookups (personnes morales only) through the Sogefi Open
+MAJIC API, with batching and caching handled by services/majic.py.
+"""
+
+from typing import List
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+
+from config import PARCELLE_BATCH_MAX_ITEMS
+from services.majic import MajicError, majic_client
+
+# =============================================================================
+# ROUTER SETUP
+# =============================================================================
+
+router = APIRouter(
+    prefix="/majic",
+    tags=["MAJIC"],
+)
+
+
+# =============================================================================
+# SCHEMAS
+# =============================================================================
+
+class MajicBatchRequest(BaseModel):
+    """
+    Body of a batch owner lookup.
+    """
+    
+    idus: List[str] = Field(
+        ...,
+        description="Parcelle unique identifiers (IDU)",
+        max_length=PARCELLE_BATCH_MAX_ITEMS
+    )
+
+
+# =============================================================================
+# ENDPOINTS
+# =============================================================================
+
+@router.get("/stats")
+async def get_majic_stats():
+    """
+    Get MAJIC client statistics (API requests, cache hits/misses).
+    """
+    return majic_client.info()
+
+
+@router.get("/{idu}")
+async def get_owners(idu: str):
+    """
+    Get the owners of a parcelle.
+    
+    Returns:
+        IDU and list of owner records
+    """
+    if not majic_client.configured:
+        raise HTTPException(status_code=503, detail="MAJIC API token not configured")
+    
+    try:
+        owners = await majic_client.get_owners(idu)
+    except MajicError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    return {"idu": idu, "proprietaires": owners}
+
+
+@router.post("/batch")
+async def get_owners_batch(request: MajicBatchRequest):
+    """
+    Get the owners of many parcelles.
+    
+    Returns:
+        Mapping of IDU to owner records (null when the lookup failed)
+    """
+    if not majic_client.configured:
+        raise HTTPException(status_code=503, detail="MAJIC API token not configured")
+    
+    return await majic_client.get_owners_batch(request.idus)
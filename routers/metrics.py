@@ -0,0 +1,40 @@
+"""
+Metrics router.
+
+Exposes the per-endpoint request histograms (duration, SQL time and rows,
+pool wait, serialization time, response size) in the Prometheus text format,
+the state of the databases serving reads (primary and replicas) and of the
+admission limiter.
+"""
+
+from fastapi import APIRouter, Response
+
+from services.admission import admission
+from services.metrics import PROMETHEUS_MEDIA_TYPE, render_metrics
+from services.replicas import replica_set
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Get request metrics in the Prometheus text exposition format.
+    
+    Counters are kept per worker process.
+    """
+    return Response(content=render_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+@router.get("/metrics/databases")
+def get_database_status():
+    """
+    Get the state of the primary, of the read replicas and of the admission
+    limiter.
+    
+    Returns:
+        Balancing policy, failovers to the primary, and for each database
+        its health, replay lag, replayed data change and open sessions;
+        admitted, queued and rejected requests
+    """
+    return {**replica_set.info(), "admission": admission.info()}
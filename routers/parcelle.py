@@ -5,19 +5,49 @@ Provides endpoints to query cadastral parcels with support for:
 - Bounding box filtering (spatial queries)
 - Geometry simplification (for performance at low zoom levels)
 - Result limiting (to prevent browser overload)
+- Mapbox Vector Tiles (z/x/y tiles clipped and quantized by PostGIS)
+- Pre-simplified geometries (parcelle_pyramid) for the map's zoom levels
+- Keyset pagination (continuation cursor) for bulk consumers
+- Batch lookup by IDU / section+numero, with an in-process hot cache
+- Point-in-parcelle lookup from an in-memory spatial index
 """
 
 import json
-from typing import Optional
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import func
-from sqlalchemy.orm import Session
-from geoalchemy2.functions import ST_AsGeoJSON
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from pydantic import BaseModel, Field
+from sqlalchemy import String, Text, and_, any_, cast, func, literal, literal_column, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
 from models.parcelle import Parcelle
-from config import SOURCE_SRID, TARGET_SRID
+from models.parcelle_aggregate import ParcelleAggregate, level_literal
+from models.parcelle_pyramid import ParcellePyramid, tolerance_literal
+from config import (
+    AGGREGATE_LEVELS,
+    MVT_BUFFER,
+    MVT_EXTENT,
+    PARCELLE_BATCH_MAX_ITEMS,
+    POINT_LOOKUP_MAX_POINTS,
+    PYRAMID_ENABLED,
+    PYRAMID_TOLERANCES,
+    SOURCE_SRID,
+    TARGET_SRID,
+    TILE_MAX_ZOOM,
+    WEB_MERCATOR_SRID,
+)
+from services.cache import cached_response, parcelle_lookup_cache, parcelle_lookup_stats
+from services.geojson import GEOJSON_MEDIA_TYPE, OutputFormat, feature_columns, feature_expression, features_response
+from services.layers import register_layer
+from services.metrics import serialization_timer
+from services.pagination import decode_cursor, encode_cursor
+from services.point_index import point_index, point_index_available
+from services.replicas import get_read_db
+from services.schema import derived_schema
+from services.spatial import EXCLUDE_QUERY, SpatialParams, bbox_native, exclude_boxes, output_geometry, parse_boxes
+from services.tiles import aggregate_level, is_valid_tile, tile_bounds, tile_simplify_tolerance, tile_width
+from services.versioning import data_version
 
 # =============================================================================
 # ROUTER SETUP
@@ -28,14 +58,109 @@ router = APIRouter(
     tags=["Parcelle"],
 )
 
+# Registered with the layer engine for generic access (the endpoints below
+# have their own optimized query paths)
+PARCELLE_LAYER = register_layer(Parcelle)
+
+# Aggregation levels served by /parcelle/aggregate
+AGGREGATE_LEVEL_NAMES = [level for _, level, _ in AGGREGATE_LEVELS]
+
+
+# =============================================================================
+# SCHEMAS
+# =============================================================================
+
+class ParcelleReference(BaseModel):
+    """
+    Parcelle reference by section and number, optionally narrowed to a
+    department and/or commune.
+    """
+    
+    section: str = Field(..., description="Cadastral section (e.g., AB)")
+    numero: str = Field(..., description="Parcel number within the section (e.g., 0123)")
+    code_dep: Optional[str] = Field(None, description="Department code (e.g., 02)")
+    nom_com: Optional[str] = Field(None, description="Commune name")
+
+
+class ParcelleBatchRequest(BaseModel):
+    """
+    Body of a batch parcelle lookup.
+    """
+    
+    idus: List[str] = Field(
+        default_factory=list,
+        description="Parcelle unique identifiers (IDU)",
+        max_length=PARCELLE_BATCH_MAX_ITEMS
+    )
+    references: List[ParcelleReference] = Field(
+        default_factory=list,
+        description="Section + numero references",
+        max_length=PARCELLE_BATCH_MAX_ITEMS
+    )
+    geometry: bool = Field(False, description="Include geometries (WGS84)")
+    simplify: Optional[float] = Field(None, description="Geometry simplification tolerance in meters", ge=0)
+    precision: int = Field(6, description="Coordinate decimal digits (6 is about 0.1 m)", ge=0, le=15)
+
+
+class ParcelleAtRequest(BaseModel):
+    """
+    Body of a bulk point-in-parcelle lookup.
+    """
+    
+    points: List[Tuple[float, float]] = Field(
+        ...,
+        description="[longitude, latitude] points (WGS84)",
+        max_length=POINT_LOOKUP_MAX_POINTS
+    )
+    code_dep: Optional[str] = Field(None, description="Department of all the points (skips the department search)")
+
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+def parcelle_properties() -> dict:
+    """
+    GeoJSON properties of a parcelle feature (name -> column).
+    """
+    return {
+        "idu": Parcelle.idu,
+        "numero": Parcelle.numero,
+        "section": Parcelle.section,
+        "feuille": Parcelle.feuille,
+        "code_dep": Parcelle.code_dep,
+        "nom_com": Parcelle.nom_com,
+        "contenance": Parcelle.contenance,
+    }
+
+
+def pyramid_level(simplify: Optional[float], available: bool = True) -> Optional[float]:
+    """
+    Pyramid level matching a simplification tolerance.
+    
+    Args:
+        simplify: Requested simplification tolerance
+        available: The parcelle_pyramid table exists
+    
+    Returns:
+        The tolerance if parcelle_pyramid holds geometries for it, else None
+    """
+    if not PYRAMID_ENABLED or not available or not simplify:
+        return None
+    for tolerance in PYRAMID_TOLERANCES:
+        if float(tolerance) == float(simplify):
+            return tolerance
+    return None
+
 
 # =============================================================================
 # ENDPOINTS
 # =============================================================================
 
 @router.get("/")
-def get_parcelles(
-    db: Session = Depends(get_db),
+async def get_parcelles(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
     # Pagination
     limit: Optional[int] = Query(
         None,
@@ -53,48 +178,64 @@ def get_parcelles(
         None,
         description="Geometry simplification tolerance in meters (e.g., 5 for zoom 14, 20 for zoom 12)"
     ),
+    # Delta loading
+    exclude: Optional[str] = EXCLUDE_QUERY,
+    # Output
+    format: OutputFormat = Query(OutputFormat.GEOJSON, description="Output format"),
 ):
     """
     Get cadastral parcels as GeoJSON FeatureCollection.
     
     Supports spatial filtering by bounding box and geometry simplification
     for better performance when displaying many parcels at low zoom levels.
+    Large results can be streamed with format=geojson-stream or ndjson;
+    format=topojson returns a much smaller quantized TopoJSON Topology.
+    
+    After a pan, pass the bboxes already loaded (same simplify) in `exclude`
+    to get only the parcelles new to the view.
     
     Returns:
         GeoJSON FeatureCollection with parcelle geometries and properties
     """
     
+    # Bbox snapped to the canonical grid: similar views share one response
+    params = SpatialParams(limit, xmin, ymin, xmax, ymax, simplify, parse_boxes(exclude)).snapped()
+    schema = await derived_schema.get(db)
+    
     # -------------------------------------------------------------------------
     # Build geometry expression
     # -------------------------------------------------------------------------
     
-    if simplify and simplify > 0:
-        # Simplify geometry in native SRID (meters) for accurate tolerance,
-        # then transform to WGS84 for web display
-        # preserve_collapsed=True keeps the topology intact
-        geom_expr = func.ST_Transform(
-            func.ST_Simplify(Parcelle.geom, simplify, True),
-            TARGET_SRID
-        )
+    level = pyramid_level(simplify, schema.pyramid)
+    
+    if level is not None:
+        # OPTIMIZATION: Use the pre-simplified WGS84 geometry of the pyramid
+        # level: no per-row simplification or transformation
+        geom_expr = ParcellePyramid.geom
     else:
-        # No simplification, just transform to WGS84
-        geom_expr = func.ST_Transform(Parcelle.geom, TARGET_SRID)
+        # Simplify in native SRID (meters), then transform to WGS84 for web display
+        geom_expr = output_geometry(Parcelle.geom, simplify)
     
     # -------------------------------------------------------------------------
     # Build query with selected columns
     # -------------------------------------------------------------------------
     
-    query = db.query(
-        Parcelle.gid,
-        Parcelle.idu,
-        Parcelle.numero,
-        Parcelle.section,
-        Parcelle.feuille,
-        Parcelle.code_dep,
-        Parcelle.nom_com,
-        Parcelle.contenance,
-        ST_AsGeoJSON(geom_expr).label("geometry"),
-    )
+    # Each row is a complete GeoJSON Feature built by PostGIS (or the parts
+    # of a TopoJSON geometry)
+    query = select(
+        *feature_columns(Parcelle.gid, geom_expr, parcelle_properties(), format)
+    ).select_from(Parcelle)
+    
+    if level is not None:
+        # Tolerance compared with a constant so that the partial spatial
+        # index of the level is used
+        query = query.join(
+            ParcellePyramid,
+            and_(
+                ParcellePyramid.gid == Parcelle.gid,
+                ParcellePyramid.tolerance == tolerance_literal(level)
+            )
+        )
     
     # -------------------------------------------------------------------------
     # Apply bounding box filter (if provided)
@@ -102,21 +243,33 @@ def get_parcelles(
     
     bbox_center_native = None
     
-    if all(v is not None for v in [xmin, ymin, xmax, ymax]):
-        # OPTIMIZATION: Transform the bounding box to native SRID once,
-        # instead of transforming every geometry to WGS84.
-        # This allows PostGIS to use the spatial index on the native geometry.
-        bbox_native = func.ST_Transform(
-            func.ST_MakeEnvelope(xmin, ymin, xmax, ymax, TARGET_SRID),
-            SOURCE_SRID
-        )
-        query = query.filter(
-            func.ST_Intersects(Parcelle.geom, bbox_native)
-        )
+    if params.bbox is not None:
+        if level is not None:
+            # Pyramid geometries are already in WGS84 and have their own index
+            query = query.where(
+                func.ST_Intersects(
+                    ParcellePyramid.geom,
+                    func.ST_MakeEnvelope(*params.bbox, TARGET_SRID)
+                )
+            )
+        else:
+            # OPTIMIZATION: Transform the bounding box to native SRID once,
+            # instead of transforming every geometry to WGS84.
+            # This allows PostGIS to use the spatial index on the native geometry.
+            query = query.where(
+                func.ST_Intersects(Parcelle.geom, bbox_native(*params.bbox))
+            )
+        
+        # Delta loading: leave out the parcelles the client already holds
+        # (same test as the bbox filter above)
+        if level is not None:
+            query = exclude_boxes(query, ParcellePyramid.geom, params.exclude, TARGET_SRID)
+        else:
+            query = exclude_boxes(query, Parcelle.geom, params.exclude)
         
         # Calculate center of bounding box for distance ordering
-        center_x = (xmin + xmax) / 2
-        center_y = (ymin + ymax) / 2
+        center_x = (params.xmin + params.xmax) / 2
+        center_y = (params.ymin + params.ymax) / 2
         bbox_center_native = func.ST_Transform(
             func.ST_SetSRID(func.ST_MakePoint(center_x, center_y), TARGET_SRID),
             SOURCE_SRID
@@ -126,11 +279,21 @@ def get_parcelles(
     # Order by distance from center (prioritize parcelles in center of screen)
     # -------------------------------------------------------------------------
     
-    if bbox_center_native is not None:
-        # Order by distance from parcelle centroid to screen center
-        query = query.order_by(
-            func.ST_Distance(func.ST_Centroid(Parcelle.geom), bbox_center_native)
-        )
+    # Only needed to pick the `limit` parcelles to return
+    if bbox_center_native is not None and limit is not None:
+        if schema.centroid:
+            # OPTIMIZATION: KNN ordering (<->) on the stored, indexed centroid:
+            # PostGIS walks the spatial index from the center and stops after
+            # `limit` rows, instead of computing and sorting every distance
+            query = query.order_by(
+                Parcelle.centroid.distance_centroid(bbox_center_native)
+            )
+        else:
+            # Centroids not built yet: order by distance from the computed
+            # parcelle centroid to screen center
+            query = query.order_by(
+                func.ST_Distance(func.ST_Centroid(Parcelle.geom), bbox_center_native)
+            )
     
     # -------------------------------------------------------------------------
     # Apply limit
@@ -140,28 +303,427 @@ def get_parcelles(
         query = query.limit(limit)
     
     # -------------------------------------------------------------------------
-    # Execute query and build GeoJSON response
+    # Execute query (cached) or stream results
+    # -------------------------------------------------------------------------
+    
+    # OPTIMIZATION: The FeatureCollection is aggregated by PostGIS and sent
+    # as-is, without parsing or re-encoding geometries in Python.
+    return await features_response(
+        db, "parcelle", query, format, bounds=params.bbox, request=request, **params.cache_params()
+    )
+
+
+@router.get("/scan")
+async def scan_parcelles(
+    db: AsyncSession = Depends(get_read_db),
+    # Pagination
+    cursor: Optional[str] = Query(
+        None,
+        description="Continuation token (next_cursor of the previous page)"
+    ),
+    limit: int = Query(1000, description="Page size", ge=1, le=10000),
+    # Attribute filters
+    code_dep: Optional[str] = Query(None, description="Department code (e.g., 02)"),
+    section: Optional[str] = Query(None, description="Cadastral section (e.g., AB)"),
+    # Bounding box filter (WGS84 coordinates)
+    xmin: Optional[float] = Query(None, description="Bounding box min longitude (WGS84)"),
+    ymin: Optional[float] = Query(None, description="Bounding box min latitude (WGS84)"),
+    xmax: Optional[float] = Query(None, description="Bounding box max longitude (WGS84)"),
+    ymax: Optional[float] = Query(None, description="Bounding box max latitude (WGS84)"),
+    # Performance options
+    simplify: Optional[float] = Query(None, description="Geometry simplification tolerance in meters", ge=0),
+):
+    """
+    Scan cadastral parcels page by page (keyset pagination on gid).
+    
+    Intended for batch jobs reading a whole commune or department. Pass the
+    `next_cursor` of each page to get the following one; it is null on the
+    last page. Every page costs the same, however deep the scan goes.
+    
+    Returns:
+        GeoJSON FeatureCollection with an extra `next_cursor` member
+    """
+    
+    params = SpatialParams(limit, xmin, ymin, xmax, ymax, simplify)
+    filters = {"code_dep": code_dep, "section": section, "bbox": params.bbox, "simplify": simplify}
+    
+    # -------------------------------------------------------------------------
+    # Build query
     # -------------------------------------------------------------------------
     
-    rows = query.all()
+    geom_expr = output_geometry(Parcelle.geom, simplify)
     
-    return {
-        "type": "FeatureCollection",
-        "features": [
-            {
-                "type": "Feature",
-                "id": row.gid,
-                "geometry": json.loads(row.geometry),
-                "properties": {
-                    "idu": row.idu,
-                    "numero": row.numero,
-                    "section": row.section,
-                    "feuille": row.feuille,
-                    "code_dep": row.code_dep,
-                    "nom_com": row.nom_com,
-                    "contenance": row.contenance,
-                }
-            }
-            for row in rows
+    query = select(
+        Parcelle.gid,
+        feature_expression(Parcelle.gid, geom_expr, parcelle_properties()).label("feature"),
+    )
+    
+    if cursor is not None:
+        try:
+            after = decode_cursor(cursor, filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(Parcelle.gid > after)
+    
+    if code_dep is not None:
+        query = query.where(Parcelle.code_dep == code_dep)
+    if section is not None:
+        query = query.where(Parcelle.section == section)
+    if params.bbox is not None:
+        query = query.where(func.ST_Intersects(Parcelle.geom, bbox_native(*params.bbox)))
+    
+    # OPTIMIZATION: Index range scan on the primary key, no OFFSET
+    page = query.order_by(Parcelle.gid).limit(limit).subquery("page")
+    
+    # -------------------------------------------------------------------------
+    # Execute query: features aggregated by PostGIS, plus the last key
+    # -------------------------------------------------------------------------
+    
+    row = (await db.execute(
+        select(
+            cast(
+                func.coalesce(
+                    func.json_agg(aggregate_order_by(page.c.feature, page.c.gid)),
+                    literal_column("'[]'::json")
+                ),
+                Text
+            ).label("features"),
+            func.max(page.c.gid).label("last_gid"),
+            func.count().label("count"),
+        )
+    )).one()
+    
+    next_cursor = None
+    if row.count == limit:
+        next_cursor = encode_cursor(row.last_gid, filters)
+    
+    with serialization_timer():
+        content = (
+            '{"type":"FeatureCollection","next_cursor":' + json.dumps(next_cursor)
+            + ',"features":' + row.features + "}"
+        ).encode("utf-8")
+    return Response(content=content, media_type=GEOJSON_MEDIA_TYPE)
+
+
+@router.post("/batch")
+async def batch_parcelles(
+    request: ParcelleBatchRequest,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Resolve many parcelles at once by IDU and/or section + numero.
+    
+    All lookups that are not in the hot cache are resolved in a single query
+    (`idu = ANY(...)` on the indexed IDU column). Resolved parcelles are kept
+    in a bounded in-memory LRU, so repeated lookups skip the database.
+    
+    Returns:
+        GeoJSON FeatureCollection (IDU matches first, in request order, then
+        reference matches) with an extra `not_found` member
+    """
+    
+    version = await data_version.get(db)
+    
+    # Cache entries depend on the data version and the output options
+    variant = f"{version}|{request.geometry}|{request.simplify}|{request.precision}"
+    
+    # -------------------------------------------------------------------------
+    # Serve IDUs from the hot cache
+    # -------------------------------------------------------------------------
+    
+    idus = list(dict.fromkeys(request.idus))
+    found = {}
+    missing = []
+    
+    for idu in idus:
+        feature = parcelle_lookup_cache.get(f"{variant}|{idu}")
+        if feature is not None:
+            parcelle_lookup_stats.memory_hits += 1
+            found[idu] = feature
+        else:
+            parcelle_lookup_stats.misses += 1
+            missing.append(idu)
+    
+    # -------------------------------------------------------------------------
+    # Resolve everything else in one round trip
+    # -------------------------------------------------------------------------
+    
+    pairs = list(dict.fromkeys((ref.section, ref.numero) for ref in request.references))
+    
+    conditions = []
+    if missing:
+        conditions.append(Parcelle.idu == any_(literal(missing, ARRAY(String))))
+    if pairs:
+        conditions.append(tuple_(Parcelle.section, Parcelle.numero).in_(pairs))
+    
+    rows = []
+    if conditions:
+        geom_expr = output_geometry(Parcelle.geom, request.simplify) if request.geometry else None
+        feature = feature_expression(
+            Parcelle.gid, geom_expr, parcelle_properties(), request.precision
+        )
+        query = select(
+            Parcelle.idu,
+            Parcelle.section,
+            Parcelle.numero,
+            Parcelle.code_dep,
+            Parcelle.nom_com,
+            cast(feature, Text).label("feature"),
+        ).where(or_(*conditions))
+        rows = (await db.execute(query)).all()
+    
+    by_reference = {}
+    for row in rows:
+        feature = row.feature.encode("utf-8")
+        parcelle_lookup_stats.memory_evictions += parcelle_lookup_cache.put(f"{variant}|{row.idu}", feature)
+        found.setdefault(row.idu, feature)
+        by_reference.setdefault((row.section, row.numero), []).append(row)
+    
+    # -------------------------------------------------------------------------
+    # Build response
+    # -------------------------------------------------------------------------
+    
+    features = [found[idu] for idu in idus if idu in found]
+    returned = {idu for idu in idus if idu in found}
+    not_found = {
+        "idus": [idu for idu in idus if idu not in found],
+        "references": [],
+    }
+    
+    for ref in request.references:
+        matches = [
+            row for row in by_reference.get((ref.section, ref.numero), [])
+            if (ref.code_dep is None or row.code_dep == ref.code_dep)
+            and (ref.nom_com is None or row.nom_com == ref.nom_com)
         ]
+        if not matches:
+            not_found["references"].append(ref.model_dump(exclude_none=True))
+        for row in matches:
+            if row.idu not in returned:
+                returned.add(row.idu)
+                features.append(found[row.idu])
+    
+    with serialization_timer():
+        content = (
+            b'{"type":"FeatureCollection","features":[' + b",".join(features)
+            + b'],"not_found":' + json.dumps(not_found).encode("utf-8") + b"}"
+        )
+    return Response(content=content, media_type=GEOJSON_MEDIA_TYPE)
+
+
+def require_point_index():
+    if not point_index_available():
+        raise HTTPException(status_code=501, detail="Point lookups require shapely")
+
+
+@router.get("/at")
+async def get_parcelle_at(
+    db: AsyncSession = Depends(get_read_db),
+    lon: float = Query(..., description="Longitude (WGS84)", ge=-180, le=180),
+    lat: float = Query(..., description="Latitude (WGS84)", ge=-90, le=90),
+    code_dep: Optional[str] = Query(None, description="Department code (e.g., 02), if known"),
+):
+    """
+    Find the parcel containing a point (click-to-identify).
+    
+    Answered from an in-memory spatial index of the department's parcels
+    (see services/point_index.py), loaded on its first lookup: no database
+    round trip afterwards.
+    
+    Returns:
+        IDU of the parcel (404 if the point is outside every parcel)
+    """
+    
+    require_point_index()
+    idu = (await point_index.lookup(db, [lon], [lat], code_dep))[0]
+    if idu is None:
+        raise HTTPException(status_code=404, detail="No parcelle at this point")
+    return {"lon": lon, "lat": lat, "idu": idu}
+
+
+@router.post("/at")
+async def post_parcelle_at(
+    request: ParcelleAtRequest,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Find the parcels containing many points at once (geocoding jobs).
+    
+    Points are looked up together, department by department, in the
+    in-memory spatial index.
+    
+    Returns:
+        `idus`: IDU of the parcel containing each point, in request order
+        (null outside parcels)
+    """
+    
+    require_point_index()
+    lons = [point[0] for point in request.points]
+    lats = [point[1] for point in request.points]
+    return {"idus": await point_index.lookup(db, lons, lats, request.code_dep)}
+
+
+@router.get("/aggregate")
+async def get_parcelle_aggregates(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    # Aggregation level, or zoom level selecting it
+    zoom: Optional[int] = Query(
+        None,
+        description="Map zoom level (selects the aggregation level)",
+        ge=0,
+        le=TILE_MAX_ZOOM
+    ),
+    level: Optional[str] = Query(
+        None,
+        description="Aggregation level: " + ", ".join(AGGREGATE_LEVEL_NAMES)
+    ),
+    # Bounding box filter (WGS84 coordinates)
+    xmin: Optional[float] = Query(None, description="Bounding box min longitude (WGS84)"),
+    ymin: Optional[float] = Query(None, description="Bounding box min latitude (WGS84)"),
+    xmax: Optional[float] = Query(None, description="Bounding box max longitude (WGS84)"),
+    ymax: Optional[float] = Query(None, description="Bounding box max latitude (WGS84)"),
+):
+    """
+    Get parcelle summaries per cell, for zoomed-out map views.
+    
+    Cells are feuilles, communes or square grid cells depending on the level.
+    Each feature holds the number of parcelles, their total contenance and
+    the dominant section. Summaries are pre-aggregated (parcelle_aggregate
+    table), so a zoomed-out view is a small indexed lookup instead of a
+    capped scan of thousands of parcelle geometries. Answers 503 until the
+    summaries have been built.
+    
+    Returns:
+        GeoJSON FeatureCollection of cells
+    """
+    if level is None:
+        if zoom is None:
+            raise HTTPException(status_code=400, detail="Either zoom or level is required")
+        level = aggregate_level(zoom)
+    elif level not in AGGREGATE_LEVEL_NAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown aggregation level: {level}")
+    
+    params = SpatialParams(xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax).snapped()
+    
+    if not (await derived_schema.get(db)).aggregate:
+        raise HTTPException(
+            status_code=503,
+            detail="Parcelle summaries not built (run python -m scripts.refresh_derived)"
+        )
+    
+    # -------------------------------------------------------------------------
+    # Build query
+    # -------------------------------------------------------------------------
+    
+    properties = {
+        "level": ParcelleAggregate.level,
+        "parcelles": ParcelleAggregate.parcelles,
+        "contenance": ParcelleAggregate.contenance,
+        "dominant_section": ParcelleAggregate.dominant_section,
     }
+    
+    # Level compared with a constant so that its partial spatial index is used
+    query = select(
+        feature_expression(ParcelleAggregate.cell, ParcelleAggregate.geom, properties).label("feature")
+    ).where(ParcelleAggregate.level == level_literal(level))
+    
+    if params.bbox is not None:
+        # Cell geometries are stored in WGS84
+        query = query.where(
+            func.ST_Intersects(
+                ParcelleAggregate.geom,
+                func.ST_MakeEnvelope(*params.bbox, TARGET_SRID)
+            )
+        )
+    
+    return await features_response(
+        db, "parcelle_aggregate", query, request=request, level=level, **params.cache_params()
+    )
+
+
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+async def get_parcelle_tile(
+    request: Request,
+    z: int = Path(..., description="Zoom level", ge=0, le=TILE_MAX_ZOOM),
+    x: int = Path(..., description="Tile column", ge=0),
+    y: int = Path(..., description="Tile row", ge=0),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Get cadastral parcels as a Mapbox Vector Tile.
+    
+    The tile is built entirely by PostGIS: geometries are simplified according
+    to the zoom level (same tolerances as the web map), clipped to the tile
+    (plus a small buffer) and quantized to the MVT integer grid. There is no
+    feature limit: the tile always contains every parcelle it intersects.
+    
+    Returns:
+        Binary MVT tile with a single "parcelle" layer (empty if no parcelle)
+    """
+    
+    if not is_valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    
+    # -------------------------------------------------------------------------
+    # Tile envelope
+    # -------------------------------------------------------------------------
+    
+    # Tile bounds in Web Mercator, used by ST_AsMVTGeom for clipping/quantizing
+    tile_envelope = func.ST_TileEnvelope(z, x, y)
+    
+    # OPTIMIZATION: Filter in native SRID on the (buffered) tile envelope
+    # so that the spatial index on Parcelle.geom is used.
+    margin = tile_width(z) * MVT_BUFFER / MVT_EXTENT
+    envelope_native = func.ST_Transform(
+        func.ST_Expand(tile_envelope, margin),
+        SOURCE_SRID
+    )
+    
+    # -------------------------------------------------------------------------
+    # Build geometry expression
+    # -------------------------------------------------------------------------
+    
+    tolerance = tile_simplify_tolerance(z)
+    
+    geom_native = Parcelle.geom
+    if tolerance > 0:
+        # Simplify in native SRID (meters), preserving collapsed geometries
+        geom_native = func.ST_Simplify(Parcelle.geom, tolerance, True)
+    
+    mvt_geom = func.ST_AsMVTGeom(
+        func.ST_Transform(geom_native, WEB_MERCATOR_SRID),
+        tile_envelope,
+        MVT_EXTENT,
+        MVT_BUFFER,
+        True
+    )
+    
+    # -------------------------------------------------------------------------
+    # Build and execute tile query
+    # -------------------------------------------------------------------------
+    
+    features = (
+        select(
+            Parcelle.gid,
+            *[column.label(name) for name, column in parcelle_properties().items()],
+            mvt_geom.label("geom"),
+        )
+        .where(func.ST_Intersects(Parcelle.geom, envelope_native))
+        .subquery("tile")
+    )
+    
+    query = (
+        select(func.ST_AsMVT(features.table_valued(), "parcelle", MVT_EXTENT, "geom", "gid"))
+        .select_from(features)
+        .where(features.c.geom.is_not(None))
+    )
+    
+    async def build():
+        tile = (await db.execute(query)).scalar()
+        return bytes(tile) if tile else b""
+    
+    return await cached_response(
+        request, db, "parcelle_mvt", build, "application/vnd.mapbox-vector-tile",
+        bounds=tile_bounds(z, x, y), z=z, x=x, y=y
+    )
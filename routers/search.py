@@ -0,0 +1,42 @@
+"""
+Search router.
+
+Autocomplete search to jump to a commune, a section or a parcelle
+(see services/search.py).
+"""
+
+import json
+
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import SEARCH_MAX_RESULTS
+from services.cache import cached_response
+from services.replicas import get_read_db
+from services.search import normalize, search
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+
+@router.get("/")
+async def search_places(
+    request: Request,
+    q: str = Query(..., description="Commune, section and parcelle number (e.g. laon ab 123), or IDU", min_length=1),
+    limit: int = Query(10, description="Maximum number of results", ge=1, le=SEARCH_MAX_RESULTS),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Autocomplete search over communes (name or INSEE code), sections and
+    parcelle references, case- and accent-insensitive, on prefixes.
+    
+    Returns:
+        Results (`type`, `label`, identifiers and a WGS84 `bbox` to zoom to),
+        best first
+    """
+    
+    text = normalize(q)
+    
+    async def build() -> bytes:
+        return json.dumps({"results": await search(db, text, limit)}).encode("utf-8")
+    
+    return await cached_response(request, db, "search", build, "application/json", q=text, limit=limit)
@@ -0,0 +1,6 @@
+"""
+Scripts package.
+
+Command-line tools for database maintenance. Run them from the project root
+with `python -m scripts.<name>`.
+"""
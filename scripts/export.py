@@ -0,0 +1,89 @@
+"""
+Export a layer to FlatGeobuf or GeoParquet.
+
+Same files as GET /export/{layer} (see services/export.py), written directly
+to disk: suited to whole départements.
+
+The format is taken from the output extension (.fgb, .parquet) unless
+--format is given. GeoParquet requires pyarrow.
+
+Usage:
+    python -m scripts.export parcelle -o parcelles_02.fgb --code-dep 02
+    python -m scripts.export batiments -o laon.parquet --insee 02408
+    python -m scripts.export commune -o communes.fgb --bbox 3.5 49.5 3.7 49.6
+"""
+
+import argparse
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+# Layer routers register their layers
+import routers.batiments  # noqa: F401
+import routers.borne_limite_propriete  # noqa: F401
+import routers.commune  # noqa: F401
+import routers.emprise  # noqa: F401
+import routers.feuille  # noqa: F401
+import routers.localisant  # noqa: F401
+import routers.parcelle  # noqa: F401
+import routers.subdivision_fiscale  # noqa: F401
+from config import DATABASE_URL
+from services.export import EXPORT_EXTENSIONS, ExportArea, ExportFormat, export_layer, geoparquet_available
+from services.layers import layer_registry
+
+logger = logging.getLogger(__name__)
+
+
+def output_format(path: str, name: Optional[str] = None) -> ExportFormat:
+    """
+    Format given by name, or by the extension of the output file.
+    """
+    if name:
+        return ExportFormat(name)
+    for fmt, extension in EXPORT_EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return fmt
+    raise ValueError(f"Unknown extension for {path} (use --format)")
+
+
+def main():
+    layers = sorted(name for name, layer in layer_registry.items() if layer.geometry_column is not None)
+
+    parser = argparse.ArgumentParser(description="Export a layer to FlatGeobuf or GeoParquet.")
+    parser.add_argument("layer", choices=layers, help="Layer to export")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.fgb or .parquet)")
+    parser.add_argument("--format", choices=[fmt.value for fmt in ExportFormat], help="File format")
+    parser.add_argument("--code-dep", help="Département code (e.g. 02)")
+    parser.add_argument("--insee", help="Commune INSEE code (e.g. 02001)")
+    parser.add_argument("--nom-com", help="Commune name")
+    parser.add_argument(
+        "--bbox", nargs=4, type=float, metavar=("XMIN", "YMIN", "XMAX", "YMAX"), help="WGS84 bounding box"
+    )
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Source database (sync driver)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    try:
+        fmt = output_format(args.output, args.format)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if fmt == ExportFormat.GEOPARQUET and not geoparquet_available():
+        parser.error("GeoParquet export requires pyarrow")
+
+    area = ExportArea(args.code_dep, args.insee, args.nom_com, tuple(args.bbox) if args.bbox else None)
+    if area.is_empty():
+        logger.warning("No area given: exporting the whole layer")
+
+    engine = create_engine(args.database_url, poolclass=NullPool)
+    started = time.perf_counter()
+    with engine.connect() as conn, open(args.output, "wb") as output:
+        count = export_layer(conn, layer_registry[args.layer], area, fmt, output)
+    logger.info("Exported %d features to %s in %.1fs", count, args.output, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
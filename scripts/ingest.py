@@ -0,0 +1,243 @@
+"""
+Bulk ingest of Parcellaire Express deliveries.
+
+Loads the cadastral layers (see LAYERS in services/ingest.py) from source
+files into PostGIS:
+1. secondary indexes (B-tree and GiST) of the loaded tables are dropped
+2. source files are partitioned per file (one per layer and département)
+   and per INGEST_PARTITION_SIZE features, and loaded in parallel by a
+   process pool, each partition streamed in binary COPY batches
+3. indexes are rebuilt in parallel, tables analyzed, derived tables refreshed
+
+Requires pyogrio to read the source files.
+
+Usage:
+    python -m scripts.ingest /data/PARCELLAIRE-EXPRESS_1-1__SHP_LAMB93_D002_2024-01-01
+    python -m scripts.ingest /data/PCI --layers parcelle batiments --workers 8 --append
+"""
+
+import argparse
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from config import (
+    DATABASE_URL,
+    INGEST_BATCH_SIZE,
+    INGEST_MAINTENANCE_WORK_MEM,
+    INGEST_PARTITION_SIZE,
+    INGEST_WORKERS,
+)
+from database import Base
+from services.derived import refresh_all
+from services.ingest import LAYERS, copy_rows, feature_count, find_sources, read_batches
+from services.versioning import record_data_change
+
+logger = logging.getLogger(__name__)
+
+# One engine per worker process
+_engine = None
+
+
+def _worker_engine(database_url: str):
+    global _engine
+    if _engine is None:
+        _engine = create_engine(database_url, poolclass=NullPool)
+    return _engine
+
+
+# =============================================================================
+# WORKER TASKS
+# =============================================================================
+
+def load_partition(
+    database_url: str,
+    layer: str,
+    path: str,
+    start: int,
+    count: int,
+    batch_size: int,
+    table: Optional[str] = None,
+) -> tuple:
+    """
+    Load a slice of a source file (runs in a worker process), into the
+    layer table or another `table` with the same columns.
+
+    Returns:
+        (layer, rows loaded)
+    """
+    engine = _worker_engine(database_url)
+    rows = 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SET synchronous_commit = off")
+        for batch in read_batches(layer, path, start, count, batch_size):
+            rows += copy_rows(cursor, layer, batch, table)
+        connection.commit()
+    finally:
+        connection.close()
+    return layer, rows
+
+
+def create_index(database_url: str, table_name: str, index_name: str) -> str:
+    """
+    Build one index of a loaded table (runs in a worker process).
+    """
+    engine = _worker_engine(database_url)
+    index = next(i for i in Base.metadata.tables[table_name].indexes if i.name == index_name)
+    with engine.begin() as conn:
+        conn.execute(text(f"SET maintenance_work_mem = '{INGEST_MAINTENANCE_WORK_MEM}'"))
+        index.create(conn, checkfirst=True)
+    return index_name
+
+
+# =============================================================================
+# INGEST
+# =============================================================================
+
+def partitions(sources: list, partition_size: int) -> list:
+    """
+    Split source files into (layer, path, start, count) partitions.
+    """
+    result = []
+    for source in sources:
+        total = feature_count(source.path)
+        for start in range(0, total, partition_size):
+            result.append((source.layer, str(source.path), start, min(partition_size, total - start)))
+    # Largest partitions first, for a better balance between workers
+    return sorted(result, key=lambda p: -p[3])
+
+
+def ingest(
+    database_url: str,
+    directories: list,
+    layers: list,
+    workers: int,
+    append: bool,
+    refresh: bool,
+):
+    """
+    Load the given layers from delivery directories.
+    """
+    engine = create_engine(database_url, poolclass=NullPool)
+    tables = [LAYERS[name].table for name in layers]
+
+    sources = find_sources(directories, layers)
+    if not sources:
+        logger.warning("No source files found for %s", ", ".join(layers))
+        return
+    departements = sorted({s.departement for s in sources if s.departement})
+    logger.info(
+        "%d source files (départements: %s)",
+        len(sources), ", ".join(departements) or "unknown"
+    )
+
+    # -------------------------------------------------------------------------
+    # Prepare tables: deferred indexes
+    # -------------------------------------------------------------------------
+
+    loaded_layers = sorted({s.layer for s in sources}, key=layers.index)
+    loaded_tables = [LAYERS[name].table for name in loaded_layers]
+    # Indexes of derived columns are built by refresh_all (services/derived.py)
+    loaded_indexes = [(LAYERS[name].table, LAYERS[name].indexes()) for name in loaded_layers]
+
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn, tables=tables)
+        for table, indexes in loaded_indexes:
+            if not append:
+                conn.execute(text(f"TRUNCATE {table.name} RESTART IDENTITY"))
+            for index in indexes:
+                index.drop(conn, checkfirst=True)
+
+    # -------------------------------------------------------------------------
+    # Parallel load
+    # -------------------------------------------------------------------------
+
+    rows = defaultdict(int)
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(load_partition, database_url, *partition, INGEST_BATCH_SIZE)
+            for partition in partitions(sources, INGEST_PARTITION_SIZE)
+        ]
+        for future in as_completed(futures):
+            layer, count = future.result()
+            rows[layer] += count
+
+        load_seconds = time.perf_counter() - started
+
+        # ---------------------------------------------------------------------
+        # Indexes, statistics
+        # ---------------------------------------------------------------------
+
+        index_started = time.perf_counter()
+        futures = [
+            pool.submit(create_index, database_url, table.name, index.name)
+            for table, indexes in loaded_indexes
+            for index in indexes
+        ]
+        for future in as_completed(futures):
+            logger.info("Index %s built", future.result())
+
+    with engine.begin() as conn:
+        for table in loaded_tables:
+            conn.execute(text(f"ANALYZE {table.name}"))
+    index_seconds = time.perf_counter() - index_started
+
+    # -------------------------------------------------------------------------
+    # Report
+    # -------------------------------------------------------------------------
+
+    total = sum(rows.values())
+    for layer in loaded_layers:
+        logger.info("%-24s %12d rows", layer, rows[layer])
+    logger.info(
+        "Loaded %d rows in %.1fs (%.0f rows/s), indexes and ANALYZE in %.1fs",
+        total, load_seconds, total / load_seconds if load_seconds else 0, index_seconds
+    )
+
+    with engine.begin() as conn:
+        if refresh and "parcelle" in loaded_layers:
+            refresh_all(conn)
+        else:
+            # Invalidate every cached response (refresh_all records it otherwise)
+            record_data_change(conn, "ingest")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load Parcellaire Express layers with COPY.")
+    parser.add_argument("directories", nargs="+", help="Delivery directories (searched recursively)")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Target database (sync driver)")
+    parser.add_argument(
+        "--layers",
+        nargs="+",
+        choices=list(LAYERS),
+        default=list(LAYERS),
+        help="Layers to load (default: all)",
+    )
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Worker processes")
+    parser.add_argument("--append", action="store_true", help="Keep existing rows (default: replace)")
+    parser.add_argument("--skip-derived", action="store_true", help="Do not refresh the derived tables")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    ingest(
+        args.database_url,
+        args.directories,
+        [name for name in LAYERS if name in args.layers],
+        args.workers,
+        args.append,
+        not args.skip_derived,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Local MAJIC API stub.
+
+Serves the owner lookup contract expected by services/majic.py with
+deterministic fake records, for tests and benchmarks without an API token.
+
+Usage:
+    uvicorn scripts.majic_stub:app --port 8001
+    MAJIC_API_BASE_URL=http://localhost:8001 MAJIC_API_TOKEN=stub uvicorn main:app
+
+Environment:
+    MAJIC_STUB_LATENCY: Simulated latency per request in seconds (default 0.05)
+"""
+
+import asyncio
+import hashlib
+import os
+
+from fastapi import FastAPI, HTTPException, Query
+
+from config import MAJIC_OWNERS_PATH
+
+LATENCY = float(os.getenv("MAJIC_STUB_LATENCY", "0.05"))
+
+app = FastAPI(title="MAJIC API stub")
+
+# Number of requests served (useful to check batching and caching)
+stats = {"requests": 0, "idus": 0}
+
+
+def fake_owners(idu: str) -> list:
+    """
+    Deterministic owner records for an IDU (about one parcelle in three
+    has no personne morale owner).
+    """
+    digest = int(hashlib.sha1(idu.encode("utf-8")).hexdigest(), 16)
+    if digest % 3 == 0:
+        return []
+    return [
+        {
+            "denomination": f"SCI STUB {digest % 1000:03d}",
+            "siren": f"{digest % 10**9:09d}",
+            "droit": "Propriétaire",
+        }
+    ]
+
+
+@app.get(MAJIC_OWNERS_PATH)
+async def get_parcelles(
+    idu: str = Query(..., description="Comma-separated IDUs"),
+    token: str = Query(..., description="API token (any value accepted)"),
+):
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing token")
+
+    await asyncio.sleep(LATENCY)
+
+    idus = [value for value in idu.split(",") if value]
+    stats["requests"] += 1
+    stats["idus"] += len(idus)
+
+    return {
+        "parcelles": [
+            {"idu": value, "proprietaires": fake_owners(value)}
+            for value in idus
+        ]
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
@@ -0,0 +1,36 @@
+"""
+Refresh derived data tables.
+
+Rebuilds the data computed from the cadastral layers (parcelle centroids,
+geometry pyramid...) after the data has been reloaded.
+
+Usage:
+    python -m scripts.refresh_derived
+    python -m scripts.refresh_derived --only centroids pyramid
+"""
+
+import argparse
+import logging
+
+from database import engine
+from services.derived import REFRESH_STEPS, refresh_all
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh derived data tables.")
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=list(REFRESH_STEPS),
+        help="Refresh only these tables (default: all)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    with engine.begin() as conn:
+        refresh_all(conn, only=args.only)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Incremental update from a new Parcellaire Express edition.
+
+Compares a delivery with the loaded data feuille by feuille and only
+rewrites the feuilles whose content changed (see services/updates.py):
+1. the delivery is loaded into staging tables in parallel (binary COPY, as
+   scripts/ingest.py)
+2. feuilles are compared by edition, then by hash of their row, parcelles,
+   subdivisions and buildings
+3. each changed feuille is applied in its own transaction
+4. derived data of the affected parcelles is refreshed and a data change is
+   recorded, so that cached responses outside the changed area stay valid
+
+Requires pyogrio to read the source files.
+
+Usage:
+    python -m scripts.update_edition /data/PARCELLAIRE-EXPRESS_1-1__SHP_LAMB93_D002_2024-07-01
+    python -m scripts.update_edition /data/PCI --dry-run
+    python -m scripts.update_edition /data/PCI --full-compare --workers 8
+"""
+
+import argparse
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from config import DATABASE_URL, INGEST_BATCH_SIZE, INGEST_PARTITION_SIZE, INGEST_WORKERS
+from database import Base
+from scripts.ingest import load_partition, partitions
+from services.derived import aggregate_cells
+from services.ingest import LAYERS, find_sources
+from services.versioning import record_baseline
+from services.updates import (
+    UPDATE_INDEXES,
+    UPDATE_LAYERS,
+    apply_editions,
+    apply_feuille,
+    create_staging,
+    diff_feuilles,
+    drop_staging,
+    finish_update,
+    index_staging,
+    parcelles_of,
+    staging_table,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def load_staging(database_url: str, directories: list, workers: int) -> bool:
+    """
+    Load the delivery into the staging tables.
+
+    Returns:
+        False if the delivery has no feuille source file
+    """
+    sources = find_sources(directories, UPDATE_LAYERS)
+    if not any(source.layer == "feuille" for source in sources):
+        logger.warning("No FEUILLE source file found")
+        return False
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                load_partition, database_url, layer, path, start, count,
+                INGEST_BATCH_SIZE, staging_table(layer)
+            )
+            for layer, path, start, count in partitions(sources, INGEST_PARTITION_SIZE)
+        ]
+        rows = sum(future.result()[1] for future in as_completed(futures))
+    logger.info("Staged %d rows in %.1fs", rows, time.perf_counter() - started)
+    return True
+
+
+def update(database_url: str, directories: list, workers: int, full_compare: bool, dry_run: bool):
+    """
+    Apply a delivery to the changed feuilles only.
+    """
+    engine = create_engine(database_url, poolclass=NullPool)
+    tables = [LAYERS[name].table for name in UPDATE_LAYERS]
+
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn, tables=tables)
+        for table in tables:
+            for index in table.indexes:
+                if index.name in UPDATE_INDEXES:
+                    index.create(conn, checkfirst=True)
+        create_staging(conn)
+
+    try:
+        if not load_staging(database_url, directories, workers):
+            return
+
+        # ---------------------------------------------------------------------
+        # Compare
+        # ---------------------------------------------------------------------
+
+        with engine.begin() as conn:
+            index_staging(conn)
+            changes, edition_only = diff_feuilles(conn, full_compare)
+
+        for change in changes:
+            logger.info("Feuille %s: %s", change.key, ", ".join(change.layers) or "added or removed")
+
+        if dry_run or not (changes or edition_only):
+            return
+
+        # ---------------------------------------------------------------------
+        # Apply, one transaction per feuille
+        # ---------------------------------------------------------------------
+
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            # Cached entries outside the changed area must stay valid
+            record_baseline(conn)
+            stale_cells = aggregate_cells(conn, parcelles_of(conn, changes))
+
+        deleted, changed = [], []
+        for change in changes:
+            with engine.begin() as conn:
+                feuille_deleted, feuille_changed = apply_feuille(conn, change)
+            deleted += feuille_deleted
+            changed += feuille_changed
+
+        with engine.begin() as conn:
+            editions = apply_editions(conn)
+            stamp = finish_update(conn, deleted, changed, stale_cells, len(changes))
+
+        logger.info(
+            "Applied %d feuilles (%d parcelles changed, %d deleted), %d editions, "
+            "data change %d, in %.1fs",
+            len(changes), len(changed), len(deleted), editions, stamp, time.perf_counter() - started
+        )
+    finally:
+        with engine.begin() as conn:
+            drop_staging(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a new Parcellaire Express edition to the changed feuilles.")
+    parser.add_argument("directories", nargs="+", help="Delivery directories (searched recursively)")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Target database (sync driver)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Worker processes loading the delivery")
+    parser.add_argument(
+        "--full-compare",
+        action="store_true",
+        help="Compare the content of every feuille, not only those with a new edition",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Only report the changed feuilles")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    update(args.database_url, args.directories, args.workers, args.full_compare, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
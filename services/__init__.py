@@ -0,0 +1,5 @@
+"""
+Services package.
+
+Contains the query builders, caches and helpers shared by the API routers.
+"""
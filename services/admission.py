@@ -0,0 +1,215 @@
+"""
+Query deadlines, cancellation and load shedding.
+
+Keeps a burst of map panning from saturating the database:
+- every API query runs with a statement timeout, set per route path
+  (STATEMENT_TIMEOUTS_MS); a query hitting it fails with 504
+- a request whose client disconnects (the map aborts the fetch of a view it
+  has left) is cancelled, and asyncpg cancels its running query on the
+  server (CancelOnDisconnectMiddleware)
+- the database endpoints go through an admission limiter: at most
+  ADMISSION_MAX_ACTIVE requests run at once, ADMISSION_MAX_QUEUED wait for a
+  slot, the others (and those waiting longer than ADMISSION_QUEUE_TIMEOUT)
+  get 503 with Retry-After
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy.exc import DBAPIError
+
+from config import (
+    ADMISSION_MAX_ACTIVE,
+    ADMISSION_MAX_QUEUED,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_RETRY_AFTER,
+    CANCEL_ON_DISCONNECT,
+    STATEMENT_TIMEOUT_MS,
+    STATEMENT_TIMEOUTS_MS,
+)
+
+# SQLSTATE of statements cancelled by statement_timeout (or pg_cancel_backend)
+QUERY_CANCELED = "57014"
+
+
+# =============================================================================
+# STATEMENT TIMEOUTS
+# =============================================================================
+
+def statement_timeout(request: Optional[Request]) -> int:
+    """
+    Statement timeout (ms) of the queries of a request, from its route path.
+    """
+    route = request.scope.get("route") if request is not None else None
+    return STATEMENT_TIMEOUTS_MS.get(getattr(route, "path", None), STATEMENT_TIMEOUT_MS)
+
+
+def is_query_timeout(exc: DBAPIError) -> bool:
+    return getattr(exc.orig, "sqlstate", None) == QUERY_CANCELED
+
+
+# =============================================================================
+# ADMISSION CONTROL
+# =============================================================================
+
+class AdmissionStats:
+    """
+    Counters of an AdmissionLimiter.
+    """
+
+    def __init__(self):
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class Overloaded(Exception):
+    """
+    Request refused by the admission limiter.
+    """
+
+
+class AdmissionLimiter:
+    """
+    Concurrency limit with a bounded waiting queue.
+
+    Attributes:
+        max_active: Requests admitted at once
+        max_queued: Requests waiting for a slot
+        queue_timeout: Seconds a request may wait for a slot
+        active: Requests admitted
+        waiting: Requests waiting
+    """
+
+    def __init__(
+        self,
+        max_active: int = ADMISSION_MAX_ACTIVE,
+        max_queued: int = ADMISSION_MAX_QUEUED,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.stats = AdmissionStats()
+        self._slots = asyncio.Semaphore(max_active)
+
+    def info(self) -> dict:
+        return {
+            "max_active": self.max_active,
+            "max_queued": self.max_queued,
+            "active": self.active,
+            "waiting": self.waiting,
+            **self.stats.as_dict(),
+        }
+
+    async def _acquire(self):
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return
+        if self.waiting >= self.max_queued:
+            self.stats.rejected += 1
+            raise Overloaded()
+
+        self.waiting += 1
+        self.stats.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats.timed_out += 1
+            raise Overloaded()
+        finally:
+            self.waiting -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Hold a slot for the enclosed block.
+
+        Raises:
+            Overloaded: No slot and the queue is full, or no slot freed in
+                time
+        """
+        await self._acquire()
+        self.active += 1
+        self.stats.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+
+# Limiter of the database endpoints
+admission = AdmissionLimiter()
+
+
+@asynccontextmanager
+async def admitted():
+    """
+    admission.admit(), answering 503 with Retry-After when overloaded.
+    """
+    try:
+        async with admission.admit():
+            yield
+    except Overloaded:
+        raise HTTPException(
+            status_code=503,
+            detail="Server overloaded, retry later",
+            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+        )
+
+
+# =============================================================================
+# CANCELLATION
+# =============================================================================
+
+class CancelOnDisconnectMiddleware:
+    """
+    ASGI middleware cancelling a request when its client disconnects.
+
+    Starlette keeps running a request whose client went away until its
+    response is ready. The request runs in a task instead, while the
+    incoming messages are watched; on http.disconnect the task is
+    cancelled, which cancels its running query and frees its connection
+    and admission slot.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not CANCEL_ON_DISCONNECT:
+            await self.app(scope, receive, send)
+            return
+
+        messages = asyncio.Queue()
+        disconnected = False
+
+        async def watch():
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    disconnected = True
+                    task.cancel()
+                    return
+
+        task = asyncio.get_running_loop().create_task(self.app(scope, messages.get, send))
+        watcher = asyncio.get_running_loop().create_task(watch())
+        try:
+            await task
+        except asyncio.CancelledError:
+            if not disconnected:
+                raise
+        finally:
+            watcher.cancel()
+            task.cancel()
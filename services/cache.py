@@ -0,0 +1,612 @@
+"""
+Two-tier tile/response cache.
+
+Serialized responses (GeoJSON bytes, MVT tiles) are cached in two tiers:
+- an in-process LRU bounded by a byte budget (first tier)
+- an on-disk store shared by all workers and kept across restarts (second tier)
+
+Entries are keyed by layer and request parameters (tile z/x/y or quantized
+bbox, simplification, limit...) and stamped with the data version they were
+built with (see services/versioning.py). A full reload drops every entry; an
+incremental update only invalidates the entries whose area intersects the
+changed area.
+
+Responses also carry HTTP validators (see cached_response): a strong ETag
+made of the data generation, the entry stamp and the cache key, and a
+Cache-Control max-age, so that browsers and reverse proxies can cache them
+and revalidate with If-None-Match (304 without rebuilding anything). Request
+bboxes are snapped to a grid (snap_bbox) so that similar views share a URL.
+
+Concurrent misses of the same entry are coalesced (see services/coalescing.py):
+the response is built by a single database query, shared by all of them.
+"""
+
+import hashlib
+import math
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    BBOX_SNAP_DIVISIONS,
+    CACHE_BBOX_DECIMALS,
+    CACHE_DIR,
+    CACHE_DISK_MAX_BYTES,
+    CACHE_ENABLED,
+    CACHE_MEMORY_MAX_BYTES,
+    HTTP_CACHE_MAX_AGE,
+    PARCELLE_LOOKUP_CACHE_MAX_BYTES,
+)
+from services.coalescing import SingleFlight
+from services.versioning import DataVersion, data_version
+
+
+# =============================================================================
+# CACHE KEYS
+# =============================================================================
+
+def quantize_bbox(xmin: float, ymin: float, xmax: float, ymax: float) -> tuple:
+    """
+    Round a WGS84 bounding box for use in a cache key.
+
+    Returns:
+        Tuple of rounded coordinates (CACHE_BBOX_DECIMALS decimal places)
+    """
+    return tuple(round(v, CACHE_BBOX_DECIMALS) for v in (xmin, ymin, xmax, ymax))
+
+
+def snap_bbox(xmin: float, ymin: float, xmax: float, ymax: float) -> tuple:
+    """
+    Snap a WGS84 bounding box outward to a canonical grid.
+
+    The grid step is the power of two (in degrees) giving about
+    BBOX_SNAP_DIVISIONS cells across the larger side of the bbox: it follows
+    the zoom level, and views that differ by less than a cell (small pans,
+    other screen sizes) get the same bbox. Snapped coordinates are exact
+    binary fractions, identical in Python and JavaScript.
+
+    Returns:
+        Snapped (xmin, ymin, xmax, ymax), or the bbox itself if snapping is
+        disabled or the bbox is empty
+    """
+    span = max(xmax - xmin, ymax - ymin)
+    if BBOX_SNAP_DIVISIONS <= 0 or span <= 0:
+        return xmin, ymin, xmax, ymax
+    step = 2.0 ** math.floor(math.log2(span / BBOX_SNAP_DIVISIONS))
+    return (
+        math.floor(xmin / step) * step,
+        math.floor(ymin / step) * step,
+        math.ceil(xmax / step) * step,
+        math.ceil(ymax / step) * step,
+    )
+
+
+def make_key(layer: str, **params) -> str:
+    """
+    Build a canonical cache key.
+
+    Parameters are sorted by name so that the key does not depend on the
+    order in which they are given.
+
+    Args:
+        layer: Layer name (e.g. "parcelle")
+        **params: Request parameters identifying the response
+
+    Returns:
+        Cache key string
+    """
+    parts = [f"{name}={params[name]}" for name in sorted(params)]
+    return "|".join([layer, *parts])
+
+
+class CacheEntry(bytes):
+    """
+    Cached response bytes, with the stamp of the data version they were
+    built with (attribute `stamp`).
+    """
+
+
+def cache_entry(value: bytes, stamp: int) -> CacheEntry:
+    entry = CacheEntry(value)
+    entry.stamp = stamp
+    return entry
+
+
+# =============================================================================
+# STATISTICS
+# =============================================================================
+
+class CacheStats:
+    """
+    Hit/miss/eviction counters of a TieredCache.
+    """
+
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+        self.invalidations = 0
+        self.stale = 0
+        self.not_modified = 0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+# =============================================================================
+# FIRST TIER: IN-PROCESS LRU
+# =============================================================================
+
+class MemoryLRU:
+    """
+    Least-recently-used cache bounded by the total size of its values.
+
+    Attributes:
+        max_bytes: Byte budget for all cached values
+        size: Current total size of cached values
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: bytes) -> int:
+        """
+        Store a value, evicting least recently used entries if needed.
+
+        Values larger than the whole budget are not stored.
+
+        Returns:
+            Number of evicted entries
+        """
+        if len(value) > self.max_bytes:
+            return 0
+
+        evicted = 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = value
+            self.size += len(value)
+
+            while self.size > self.max_bytes:
+                _, oldest = self._entries.popitem(last=False)
+                self.size -= len(oldest)
+                evicted += 1
+        return evicted
+
+    def pop(self, key: str):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self.size -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+# =============================================================================
+# SECOND TIER: ON-DISK STORE
+# =============================================================================
+
+class DiskStore:
+    """
+    File-based key/value store, one directory per data generation.
+
+    Each file starts with the stamp of the data version the value was built
+    with, on its own line.
+
+    Files are written atomically (temporary file + rename) so that several
+    workers can share the same directory.
+
+    Attributes:
+        directory: Root directory of the store
+        max_bytes: Approximate byte budget; oldest files are removed beyond it
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, generation: str, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, _safe_name(generation), digest[:2], digest)
+
+    def get(self, generation: str, key: str) -> Optional[Tuple[int, bytes]]:
+        """
+        Read a stored value.
+
+        Returns:
+            (stamp, value), or None if not stored
+        """
+        try:
+            with open(self._path(generation, key), "rb") as f:
+                stamp = int(f.readline())
+                return stamp, f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, generation: str, key: str, stamp: int, value: bytes) -> int:
+        """
+        Store a value on disk.
+
+        Returns:
+            Number of files removed to stay within the byte budget
+        """
+        path = self._path(generation, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"%d\n" % stamp)
+            f.write(value)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            self._size += len(value)
+            if self._size > self.max_bytes:
+                return self._evict_oldest()
+        return 0
+
+    def purge_except(self, generation: str):
+        """
+        Remove every generation directory other than `generation`.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        keep = _safe_name(generation)
+        for name in os.listdir(self.directory):
+            if name != keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        with self._lock:
+            self._size = None
+
+    def clear(self):
+        """
+        Remove every stored file.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+        with self._lock:
+            self._size = None
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _disk_usage(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+    def _evict_oldest(self) -> int:
+        # Remove oldest files until the store is back under 90% of its budget
+        files = sorted(self._files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._size = total
+        return removed
+
+
+def _safe_name(generation: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in generation) or "_"
+
+
+# =============================================================================
+# TWO-TIER CACHE
+# =============================================================================
+
+class TieredCache:
+    """
+    In-process LRU backed by an optional on-disk store.
+
+    Lookups check memory first, then disk (promoting disk hits to memory).
+    The cache follows the data version: the first lookup with a new
+    generation drops every entry of the previous one, and entries built
+    before an incremental change of their area are treated as misses.
+
+    Attributes:
+        memory: First tier (MemoryLRU)
+        disk: Second tier (DiskStore) or None
+        stats: Hit/miss/eviction counters
+    """
+
+    def __init__(self, memory_max_bytes: int, directory: Optional[str], disk_max_bytes: int):
+        self.memory = MemoryLRU(memory_max_bytes)
+        self.disk = DiskStore(directory, disk_max_bytes) if directory else None
+        self.stats = CacheStats()
+        self._version = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: DataVersion):
+        with self._lock:
+            self._version = version
+            if version.generation == self._generation:
+                return
+            changed = self._generation is not None
+            self._generation = version.generation
+
+        if changed:
+            self.stats.invalidations += 1
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.purge_except(version.generation)
+
+    def get(self, version: DataVersion, key: str, bounds: Optional[tuple] = None) -> Optional[bytes]:
+        """
+        Look up a cached value in memory, then on disk.
+
+        Args:
+            version: Current data version
+            key: Cache key (see make_key)
+            bounds: WGS84 (xmin, ymin, xmax, ymax) the value depends on, or
+                None if it depends on all the data
+
+        Returns:
+            Cached bytes, or None on miss
+        """
+        value = self.get_memory(version, key, bounds)
+        if value is None:
+            value = self.get_disk(version, key, bounds)
+        return value
+
+    def get_memory(self, version: DataVersion, key: str, bounds: Optional[tuple] = None) -> Optional[bytes]:
+        """
+        Look up a cached value in the first tier only (no I/O).
+
+        A miss here is not counted: the caller is expected to try get_disk().
+        """
+        self._check_version(version)
+
+        value = self.memory.get(key)
+        if value is not None and version.changed_since(value.stamp, bounds):
+            # Built before a change of its area
+            self.memory.pop(key)
+            self.stats.stale += 1
+            return None
+        if value is not None:
+            self.stats.memory_hits += 1
+        return value
+
+    def get_disk(self, version: DataVersion, key: str, bounds: Optional[tuple] = None) -> Optional[bytes]:
+        """
+        Look up a cached value in the second tier, promoting hits to memory.
+        """
+        if self.disk is not None:
+            stored = self.disk.get(version.generation, key)
+            if stored is not None and version.changed_since(stored[0], bounds):
+                self.stats.stale += 1
+            elif stored is not None:
+                value = cache_entry(stored[1], stored[0])
+                self.stats.disk_hits += 1
+                self.stats.memory_evictions += self.memory.put(key, value)
+                return value
+
+        self.stats.misses += 1
+        return None
+
+    def put(self, version: DataVersion, key: str, value: bytes):
+        """
+        Store a value in both tiers, stamped with the data version.
+        """
+        self._check_version(version)
+        self.stats.memory_evictions += self.memory.put(key, cache_entry(value, version.stamp))
+        if self.disk is not None:
+            self.stats.disk_evictions += self.disk.put(version.generation, key, version.stamp, value)
+
+    def clear(self):
+        """
+        Drop every cached entry (memory and disk).
+        """
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def info(self) -> dict:
+        """
+        Cache counters and sizes, for monitoring.
+        """
+        return {
+            "enabled": CACHE_ENABLED,
+            "data_version": str(self._version) if self._version is not None else None,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.size,
+            "memory_max_bytes": self.memory.max_bytes,
+            "disk_enabled": self.disk is not None,
+            **self.stats.as_dict(),
+        }
+
+
+# Shared response cache used by the layer endpoints
+response_cache = TieredCache(CACHE_MEMORY_MAX_BYTES, CACHE_DIR, CACHE_DISK_MAX_BYTES)
+
+# Responses being built, shared by concurrent identical requests
+response_flights = SingleFlight()
+
+# Hot cache of serialized parcelle features resolved by IDU
+parcelle_lookup_cache = MemoryLRU(PARCELLE_LOOKUP_CACHE_MAX_BYTES)
+parcelle_lookup_stats = CacheStats()
+
+
+async def cached(
+    db: AsyncSession,
+    layer: str,
+    build: Callable[[], Awaitable[bytes]],
+    bounds: Optional[tuple] = None,
+    **params,
+) -> bytes:
+    """
+    Get a serialized response from the cache, building it on miss.
+
+    Memory hits are served directly; disk access runs in the threadpool so
+    that it does not block the event loop. Concurrent misses of the same
+    entry wait for a single disk lookup and build (response_flights).
+
+    Usage in a router:
+        content = await cached(db, "parcelle", build_response, bounds=bounds, z=z, x=x, y=y)
+
+    Args:
+        db: Database session (used to read the data version)
+        layer: Layer name
+        build: Coroutine function building the serialized response on miss
+        bounds: WGS84 (xmin, ymin, xmax, ymax) the response depends on, so
+            that incremental updates elsewhere keep it valid (None: any change
+            invalidates it)
+        **params: Request parameters identifying the response
+
+    Returns:
+        Serialized response bytes
+    """
+    key = make_key(layer, **params)
+    if not CACHE_ENABLED:
+        return await response_flights.do(key, build)
+
+    version = await data_version.get(db)
+    content = response_cache.get_memory(version, key, bounds)
+    if content is not None:
+        return content
+
+    async def load() -> bytes:
+        content = await run_in_threadpool(response_cache.get_disk, version, key, bounds)
+        if content is None:
+            content = await build()
+            await run_in_threadpool(response_cache.put, version, key, content)
+        return content
+
+    return await response_flights.do(f"{version}|{key}", load)
+
+
+# =============================================================================
+# HTTP CACHING
+# =============================================================================
+
+def _key_digest(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:20]
+
+
+def make_etag(version: DataVersion, key: str, stamp: int) -> str:
+    """
+    Strong ETag of a response: data generation, stamp of the data version
+    the response was built with, and digest of its cache key.
+    """
+    return f'"{_safe_name(version.generation)}:{stamp}:{_key_digest(key)}"'
+
+
+def _valid_etag(
+    if_none_match: Optional[str],
+    version: DataVersion,
+    key: str,
+    bounds: Optional[tuple],
+) -> Optional[str]:
+    """
+    ETag of If-None-Match still matching the current data, if any.
+
+    The ETag matches if it was made for the same key and generation, and no
+    change of the response area happened since its stamp.
+    """
+    if not if_none_match:
+        return None
+    prefix = f"{_safe_name(version.generation)}:"
+    suffix = f":{_key_digest(key)}"
+    for etag in if_none_match.split(","):
+        value = etag.strip().removeprefix("W/").strip('"')
+        if not (value.startswith(prefix) and value.endswith(suffix)):
+            continue
+        try:
+            stamp = int(value[len(prefix):-len(suffix)])
+        except ValueError:
+            continue
+        if not version.changed_since(stamp, bounds):
+            return f'"{value}"'
+    return None
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={HTTP_CACHE_MAX_AGE}"}
+
+
+async def cached_response(
+    request: Optional[Request],
+    db: AsyncSession,
+    layer: str,
+    build: Callable[[], Awaitable[bytes]],
+    media_type: str,
+    bounds: Optional[tuple] = None,
+    **params,
+) -> Response:
+    """
+    HTTP response of a cached endpoint, with ETag and Cache-Control headers.
+
+    If the request carries an ETag of the same response that is still valid
+    (If-None-Match), the answer is 304 Not Modified without looking up or
+    building the content. Otherwise the content comes from cached().
+
+    Usage in a router:
+        return await cached_response(request, db, "search", build, "application/json", q=text, limit=limit)
+
+    Args:
+        request: Incoming request (None: no conditional request handling)
+        db: Database session (used to read the data version)
+        layer: Layer name
+        build: Coroutine function building the serialized response on miss
+        media_type: Response media type
+        bounds: WGS84 (xmin, ymin, xmax, ymax) the response depends on
+        **params: Request parameters identifying the response
+
+    Returns:
+        200 response with the content, or empty 304 response
+    """
+    version = await data_version.get(db)
+    key = make_key(layer, **params)
+
+    if request is not None:
+        etag = _valid_etag(request.headers.get("if-none-match"), version, key, bounds)
+        if etag is not None:
+            response_cache.stats.not_modified += 1
+            return Response(status_code=304, headers=cache_headers(etag))
+
+    content = await cached(db, layer, build, bounds=bounds, **params)
+    etag = make_etag(version, key, getattr(content, "stamp", version.stamp))
+    return Response(content=content, media_type=media_type, headers=cache_headers(etag))
@@ -0,0 +1,97 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When many users open the same view at once (default map center, shared
+link), the same query would run once per request. A SingleFlight runs the
+first call for a key and makes the concurrent calls with the same key wait
+for it and share its result (or its error), so the database executes the
+query once.
+
+Used by services/cache.py: on a memory cache miss, the disk lookup, the
+query and the serialization of a response run once per cache key and data
+version.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class CoalescingStats:
+    """
+    Counters of a SingleFlight.
+
+    Attributes:
+        executions: Calls that ran the build function
+        coalesced: Calls that waited for the result of another call
+            (queries saved)
+    """
+
+    def __init__(self):
+        self.executions = 0
+        self.coalesced = 0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class SingleFlight:
+    """
+    Shares the result of a running call with concurrent calls for the same
+    key.
+
+    Nothing is kept once the call is done: results are reused only while
+    they are being built (caching them is the job of the caller).
+    """
+
+    def __init__(self):
+        self.stats = CoalescingStats()
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def info(self) -> dict:
+        return {"in_flight": len(self._calls), **self.stats.as_dict()}
+
+    async def do(self, key: str, build: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run build(), or wait for the running call with the same key.
+
+        If the running call is cancelled (its request went away), one of the
+        waiting calls runs build() itself.
+
+        Args:
+            key: Identifier of the result (same key, same result)
+            build: Coroutine function computing the result
+
+        Returns:
+            Result of build()
+        """
+        while key in self._calls:
+            future = self._calls[key]
+            self.stats.coalesced += 1
+            try:
+                # Shielded: a waiter going away does not cancel the others
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                self.stats.coalesced -= 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.stats.executions += 1
+        try:
+            result = await build()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Retrieved, so that no warning is logged when nobody waited
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
@@ -0,0 +1,320 @@
+"""
+Derived data.
+
+Data computed from the cadastral layers to speed up the API:
+- parcelle.centroid: indexed point on surface of each parcelle (KNN ordering)
+- parcelle_pyramid: pre-simplified, pre-transformed parcelle geometries
+- parcelle_aggregate: parcelle summaries per feuille, commune and grid cell
+  (zoomed-out map views)
+
+They must be refreshed whenever the cadastral data is reloaded, either
+entirely or for a set of parcelles (gids).
+
+These functions are synchronous and meant for scripts (sync engine).
+"""
+
+import logging
+import time
+from typing import Optional, Sequence
+
+from sqlalchemy import Integer, String, cast, delete, func, insert, literal, select, text, update
+from sqlalchemy.engine import Connection
+
+from config import AGGREGATE_LEVELS, PYRAMID_TOLERANCES, SOURCE_SRID, TARGET_SRID
+from models.commune import Commune
+from models.feuille import Feuille
+from models.parcelle import Parcelle
+from models.parcelle_aggregate import ParcelleAggregate
+from models.parcelle_pyramid import ParcellePyramid
+from services.versioning import record_data_change
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_centroids(conn: Connection, gids: Optional[Sequence[int]] = None):
+    """
+    Fill parcelle.centroid with the point on surface of each parcelle.
+
+    ST_PointOnSurface is used rather than ST_Centroid because it always lies
+    inside the parcelle (the centroid of a concave parcelle may not).
+    The column and its spatial index are created if missing.
+
+    Args:
+        conn: Database connection (inside a transaction)
+        gids: Parcelles to refresh, or None to refresh every parcelle
+    """
+    started = time.perf_counter()
+
+    conn.execute(text(
+        f"ALTER TABLE {Parcelle.__tablename__} "
+        f"ADD COLUMN IF NOT EXISTS centroid geometry(Point, {SOURCE_SRID})"
+    ))
+
+    statement = update(Parcelle).values(centroid=func.ST_PointOnSurface(Parcelle.geom))
+    if gids is not None:
+        statement = statement.where(Parcelle.gid.in_(gids))
+    result = conn.execute(statement)
+
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS idx_{Parcelle.__tablename__}_centroid "
+        f"ON {Parcelle.__tablename__} USING gist (centroid)"
+    ))
+    conn.execute(text(f"ANALYZE {Parcelle.__tablename__}"))
+
+    logger.info(
+        "parcelle.centroid: %d rows in %.1fs",
+        result.rowcount, time.perf_counter() - started
+    )
+
+
+def refresh_pyramid(conn: Connection, gids: Optional[Sequence[int]] = None):
+    """
+    Rebuild the parcelle geometry pyramid.
+
+    A full rebuild drops the spatial indexes, reloads every level and creates
+    the indexes again (much faster than inserting into indexed tables).
+    A partial rebuild only replaces the rows of the given parcelles.
+
+    Args:
+        conn: Database connection (inside a transaction)
+        gids: Parcelles to refresh, or None to rebuild everything
+    """
+    table = ParcellePyramid.__table__
+    table.create(conn, checkfirst=True)
+
+    if gids is None:
+        conn.execute(text(f"TRUNCATE {table.name}"))
+        for index in table.indexes:
+            index.drop(conn, checkfirst=True)
+    else:
+        conn.execute(delete(ParcellePyramid).where(ParcellePyramid.gid.in_(gids)))
+
+    for tolerance in PYRAMID_TOLERANCES:
+        started = time.perf_counter()
+
+        simplified = func.ST_Multi(func.ST_Transform(
+            func.ST_Simplify(Parcelle.geom, tolerance, True),
+            TARGET_SRID
+        ))
+        source = select(Parcelle.gid, literal(float(tolerance)), simplified).where(Parcelle.geom.is_not(None))
+        if gids is not None:
+            source = source.where(Parcelle.gid.in_(gids))
+
+        result = conn.execute(
+            insert(ParcellePyramid).from_select(["gid", "tolerance", "geom"], source)
+        )
+        logger.info(
+            "parcelle_pyramid: level %g m, %d rows in %.1fs",
+            tolerance, result.rowcount, time.perf_counter() - started
+        )
+
+    if gids is None:
+        for index in table.indexes:
+            index.create(conn)
+
+    conn.execute(text(f"ANALYZE {table.name}"))
+
+
+# Polygon layers usable as aggregation cells
+AGGREGATE_POLYGONS = {
+    "feuille": Feuille,
+    "commune": Commune,
+}
+
+
+def _aggregate_measures() -> list:
+    # Summary columns of the parcelles of a cell
+    return [
+        func.count().label("parcelles"),
+        func.coalesce(func.sum(Parcelle.contenance), 0).label("contenance"),
+        func.mode().within_group(Parcelle.section).label("dominant_section"),
+    ]
+
+
+def _display_geometry(geom, simplify: float):
+    # Cell geometry as stored: simplified in meters, then in WGS84
+    if simplify:
+        geom = func.ST_SimplifyPreserveTopology(geom, simplify)
+    return func.ST_Multi(func.ST_Transform(geom, TARGET_SRID))
+
+
+def _parcelle_cell(level: str, query):
+    """
+    Cell id of each parcelle at an aggregation level.
+
+    Parcelles are assigned to the cell containing their point on surface
+    (parcelle.centroid), so that each parcelle is counted once.
+
+    Args:
+        level: Aggregation level
+        query: Select over Parcelle (joined with the cell layer if needed)
+
+    Returns:
+        (cell id expression, query)
+    """
+    if level.startswith("grid_"):
+        size = float(level[len("grid_"):])
+        i = cast(func.floor(func.ST_X(Parcelle.centroid) / size), Integer)
+        j = cast(func.floor(func.ST_Y(Parcelle.centroid) / size), Integer)
+        return func.concat(i, "_", j), query
+
+    model = AGGREGATE_POLYGONS[level]
+    return cast(model.id, String), query.join_from(Parcelle, model, func.ST_Intersects(model.geom, Parcelle.centroid))
+
+
+def aggregate_cells(conn: Connection, gids: Sequence[int]) -> dict:
+    """
+    Cells containing the given parcelles, per aggregation level.
+
+    Read before parcelles are moved or deleted, the result tells
+    refresh_aggregates() which cells lose parcelles.
+
+    Returns:
+        Level -> set of cell ids
+    """
+    cells = {}
+    for _, level, _ in AGGREGATE_LEVELS:
+        cell, query = _parcelle_cell(level, select())
+        query = query.add_columns(cell).where(Parcelle.gid.in_(gids)).distinct()
+        cells[level] = set(conn.execute(query).scalars())
+    return cells
+
+
+def _aggregate_level(level: str, simplify: float, cells: Optional[Sequence[str]]):
+    """
+    Rows of an aggregation level (only the given cells if not None).
+    """
+    if level.startswith("grid_"):
+        size = float(level[len("grid_"):])
+        i = cast(func.floor(func.ST_X(Parcelle.centroid) / size), Integer)
+        j = cast(func.floor(func.ST_Y(Parcelle.centroid) / size), Integer)
+
+        stats = select(i.label("i"), j.label("j"), *_aggregate_measures()).group_by(i, j)
+        if cells is not None:
+            # Extent of the cells first, so that the centroid index is used
+            ij = [tuple(int(v) for v in cell.split("_")) for cell in cells] or [(0, 0)]
+            extent = func.ST_MakeEnvelope(
+                min(c[0] for c in ij) * size, min(c[1] for c in ij) * size,
+                (max(c[0] for c in ij) + 1) * size, (max(c[1] for c in ij) + 1) * size,
+                SOURCE_SRID
+            )
+            stats = stats.where(
+                func.ST_Intersects(Parcelle.centroid, extent),
+                func.concat(i, "_", j).in_(cells),
+            )
+        stats = stats.subquery("stats")
+
+        cell = func.ST_MakeEnvelope(
+            stats.c.i * size, stats.c.j * size,
+            (stats.c.i + 1) * size, (stats.c.j + 1) * size,
+            SOURCE_SRID
+        )
+        return select(
+            literal(level),
+            func.concat(stats.c.i, "_", stats.c.j),
+            stats.c.parcelles,
+            stats.c.contenance,
+            stats.c.dominant_section,
+            _display_geometry(cell, simplify),
+        )
+
+    model = AGGREGATE_POLYGONS[level]
+    inside = func.ST_Intersects(model.geom, Parcelle.centroid)
+
+    stats = select(model.id.label("id"), *_aggregate_measures()).join_from(Parcelle, model, inside).group_by(model.id)
+    if cells is not None:
+        stats = stats.where(model.id.in_([int(cell) for cell in cells]))
+    stats = stats.subquery("stats")
+
+    return select(
+        literal(level),
+        cast(stats.c.id, String),
+        stats.c.parcelles,
+        stats.c.contenance,
+        stats.c.dominant_section,
+        _display_geometry(model.geom, simplify),
+    ).join_from(stats, model, model.id == stats.c.id)
+
+
+def refresh_aggregates(
+    conn: Connection,
+    gids: Optional[Sequence[int]] = None,
+    cells: Optional[dict] = None,
+):
+    """
+    Rebuild the parcelle summaries of every aggregation level.
+
+    Requires parcelle.centroid (see refresh_centroids). A partial rebuild
+    recomputes the cells containing the given parcelles, and the extra
+    `cells` (cells of parcelles since moved or deleted, see aggregate_cells).
+
+    Args:
+        conn: Database connection (inside a transaction)
+        gids: Parcelles to refresh, or None to rebuild everything
+        cells: Extra cells to recompute, per level (partial rebuild only)
+    """
+    table = ParcelleAggregate.__table__
+    table.create(conn, checkfirst=True)
+
+    affected = None
+    if gids is None:
+        conn.execute(text(f"TRUNCATE {table.name}"))
+        for index in table.indexes:
+            index.drop(conn, checkfirst=True)
+    else:
+        affected = aggregate_cells(conn, gids)
+        for level, extra in (cells or {}).items():
+            affected[level] |= set(extra)
+
+    for _, level, simplify in AGGREGATE_LEVELS:
+        started = time.perf_counter()
+
+        level_cells = None
+        if affected is not None:
+            level_cells = sorted(affected[level])
+            conn.execute(delete(ParcelleAggregate).where(
+                ParcelleAggregate.level == level,
+                ParcelleAggregate.cell.in_(level_cells)
+            ))
+
+        result = conn.execute(insert(ParcelleAggregate).from_select(
+            ["level", "cell", "parcelles", "contenance", "dominant_section", "geom"],
+            _aggregate_level(level, simplify, level_cells)
+        ))
+        logger.info(
+            "parcelle_aggregate: level %s, %d cells in %.1fs",
+            level, result.rowcount, time.perf_counter() - started
+        )
+
+    if gids is None:
+        for index in table.indexes:
+            index.create(conn)
+
+    conn.execute(text(f"ANALYZE {table.name}"))
+
+
+# Derived data refresh steps, in dependency order
+REFRESH_STEPS = {
+    "centroids": refresh_centroids,
+    "pyramid": refresh_pyramid,
+    "aggregates": refresh_aggregates,
+}
+
+
+def refresh_all(conn: Connection, gids: Optional[Sequence[int]] = None, only: Optional[Sequence[str]] = None):
+    """
+    Run every refresh step (or only the given ones).
+
+    Args:
+        conn: Database connection (inside a transaction)
+        gids: Parcelles to refresh, or None for a full rebuild
+        only: Names of the steps to run (see REFRESH_STEPS), or None for all
+    """
+    for name, step in REFRESH_STEPS.items():
+        if only is None or name in only:
+            logger.info("Refreshing %s", name)
+            step(conn, gids)
+
+    if gids is None:
+        # Full rebuild: cached responses of every area are stale
+        record_data_change(conn, "full refresh")
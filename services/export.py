@@ -0,0 +1,290 @@
+"""
+Bulk export of a layer to FlatGeobuf or GeoParquet.
+
+Extracts whole communes or départements without going through GeoJSON:
+- rows are read from a server-side cursor, EXPORT_BATCH_SIZE at a time, so
+  memory does not grow with the extract
+- FlatGeobuf files carry a packed Hilbert R-tree (see services/flatgeobuf.py),
+  so clients can read a bbox without scanning the file
+- GeoParquet files store WKB geometries and a bbox covering column, in row
+  groups of EXPORT_ROW_GROUP_SIZE rows ordered along the PostGIS geometry
+  sort order (Hilbert curve), so row group statistics prune spatial queries
+
+Geometries are exported in WGS84 (EPSG:4326), like the API responses.
+
+GeoParquet requires pyarrow.
+
+These functions are synchronous (sync engine), shared by GET /export/ and
+scripts/export.py.
+"""
+
+import importlib.util
+import json
+import re
+from dataclasses import dataclass
+from enum import Enum
+from typing import BinaryIO, List, Optional
+
+from sqlalchemy import BigInteger, Float, Integer, and_, func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+
+from config import EXPORT_BATCH_SIZE, EXPORT_INDEX_NODE_SIZE, EXPORT_ROW_GROUP_SIZE, TARGET_SRID
+from models.commune import Commune
+from services.flatgeobuf import DOUBLE, GEOMETRY_TYPES, INT, LONG, STRING, FlatGeobufWriter
+from services.layers import Layer
+from services.spatial import bbox_native
+
+# Layer columns holding the département code and the commune name
+DEPARTEMENT_COLUMNS = ("code_dep", "code_departement")
+COMMUNE_NAME_COLUMNS = ("nom_com", "nom_commune")
+
+# GeoParquet geometry type names and FlatGeobuf codes, by PostGIS type
+GEOMETRY_TYPE_NAMES = {name.upper(): name for name in GEOMETRY_TYPES.values()}
+GEOMETRY_TYPE_CODES = {name.upper(): code for code, name in GEOMETRY_TYPES.items()}
+
+
+class ExportFormat(str, Enum):
+    """
+    Export file formats.
+    """
+
+    FLATGEOBUF = "flatgeobuf"
+    GEOPARQUET = "geoparquet"
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.FLATGEOBUF: "application/flatgeobuf",
+    ExportFormat.GEOPARQUET: "application/vnd.apache.parquet",
+}
+
+EXPORT_EXTENSIONS = {
+    ExportFormat.FLATGEOBUF: ".fgb",
+    ExportFormat.GEOPARQUET: ".parquet",
+}
+
+
+def geoparquet_available() -> bool:
+    """
+    Check that pyarrow is installed.
+    """
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+@dataclass
+class ExportArea:
+    """
+    Area of an export (all given criteria apply).
+
+    Attributes:
+        code_dep: Département code (e.g. "02")
+        insee: Commune INSEE code (e.g. "02001")
+        nom_com: Commune name
+        bbox: WGS84 (xmin, ymin, xmax, ymax)
+    """
+
+    code_dep: Optional[str] = None
+    insee: Optional[str] = None
+    nom_com: Optional[str] = None
+    bbox: Optional[tuple] = None
+
+    def is_empty(self) -> bool:
+        return not (self.code_dep or self.insee or self.nom_com or self.bbox)
+
+    def slug(self) -> str:
+        """
+        Short description for file names (e.g. "02001").
+        """
+        parts = [self.code_dep, self.insee, self.nom_com]
+        if self.bbox is not None:
+            parts.append("bbox")
+        text = "_".join(part for part in parts if part) or "all"
+        return re.sub(r"[^A-Za-z0-9_-]+", "-", text)
+
+
+# =============================================================================
+# QUERY
+# =============================================================================
+
+def _column(layer: Layer, names: tuple):
+    return next((layer.columns[name] for name in names if name in layer.columns), None)
+
+
+def export_query(layer: Layer, area: ExportArea, with_bbox: bool = False) -> Select:
+    """
+    Query of the rows of an export: properties, then the WKB geometry
+    ("wkb", WGS84) and optionally its bounds.
+
+    Criteria use the layer columns when it has them (département, commune
+    name, INSEE code or IDU prefix). Otherwise features are matched with the
+    communes through their point on surface.
+    """
+    geometry = layer.geometry_column
+    output = func.ST_Transform(geometry, TARGET_SRID)
+    columns = [*layer.attributes.values(), func.ST_AsBinary(output).label("wkb")]
+    if with_bbox:
+        box = func.Box2D(output)
+        columns += [
+            func.ST_XMin(box).label("xmin"), func.ST_YMin(box).label("ymin"),
+            func.ST_XMax(box).label("xmax"), func.ST_YMax(box).label("ymax"),
+        ]
+    query = select(*columns).select_from(layer.model).where(geometry.is_not(None))
+
+    departement = _column(layer, DEPARTEMENT_COLUMNS)
+    commune_name = _column(layer, COMMUNE_NAME_COLUMNS)
+    commune_conditions = []
+
+    if area.code_dep:
+        if departement is not None:
+            query = query.where(departement == area.code_dep)
+        else:
+            commune_conditions.append(Commune.code_departement == area.code_dep)
+
+    if area.insee:
+        if "code_insee" in layer.columns:
+            query = query.where(layer.columns["code_insee"] == area.insee)
+        elif "idu" in layer.columns:
+            # IDUs start with the INSEE code; the département column is
+            # indexed and narrows the scan first
+            if departement is not None:
+                query = query.where(departement == area.insee[:2])
+            query = query.where(func.left(layer.columns["idu"], 5) == area.insee)
+        else:
+            commune_conditions.append(Commune.code_insee == area.insee)
+
+    if area.nom_com:
+        if commune_name is not None:
+            query = query.where(commune_name == area.nom_com)
+        else:
+            commune_conditions.append(Commune.nom_commune == area.nom_com)
+
+    if commune_conditions:
+        query = query.join(Commune, and_(
+            Commune.geom.op("&&")(geometry),
+            func.ST_Intersects(Commune.geom, func.ST_PointOnSurface(geometry)),
+        )).where(*commune_conditions)
+
+    if area.bbox is not None:
+        query = query.where(func.ST_Intersects(geometry, bbox_native(*area.bbox)))
+
+    return query
+
+
+# =============================================================================
+# WRITERS
+# =============================================================================
+
+def _flatgeobuf_type(column) -> int:
+    if isinstance(column.type, BigInteger):
+        return LONG
+    if isinstance(column.type, Integer):
+        return INT
+    if isinstance(column.type, Float):
+        return DOUBLE
+    return STRING
+
+
+def _write_flatgeobuf(layer: Layer, partitions, output: BinaryIO) -> int:
+    columns = list(layer.attributes.values())
+    writer = FlatGeobufWriter(
+        layer.name,
+        [(column.name, _flatgeobuf_type(column)) for column in columns],
+        srid=TARGET_SRID,
+        node_size=EXPORT_INDEX_NODE_SIZE,
+        geometry_type=GEOMETRY_TYPE_CODES.get(layer.geometry_column.type.geometry_type.upper(), 0),
+    )
+    try:
+        for rows in partitions:
+            for row in rows:
+                writer.add(row.wkb, tuple(row)[:len(columns)])
+        writer.finish(output)
+    finally:
+        writer.close()
+    return writer.count
+
+
+def _arrow_type(pa, column):
+    if isinstance(column.type, BigInteger):
+        return pa.int64()
+    if isinstance(column.type, Integer):
+        return pa.int32()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    return pa.string()
+
+
+def _write_geoparquet(layer: Layer, partitions, output: BinaryIO) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = list(layer.attributes.values())
+    bbox_type = pa.struct([(name, pa.float64()) for name in ("xmin", "ymin", "xmax", "ymax")])
+    geo = {
+        "version": "1.1.0",
+        "primary_column": "geometry",
+        "columns": {
+            "geometry": {
+                "encoding": "WKB",
+                "geometry_types": [GEOMETRY_TYPE_NAMES[layer.geometry_column.type.geometry_type.upper()]],
+                "covering": {"bbox": {name: ["bbox", name] for name in ("xmin", "ymin", "xmax", "ymax")}},
+            }
+        },
+    }
+    schema = pa.schema(
+        [(column.name, _arrow_type(pa, column)) for column in columns]
+        + [("geometry", pa.binary()), ("bbox", bbox_type)],
+        metadata={"geo": json.dumps(geo)},
+    )
+
+    count = 0
+    pending: List = []
+
+    def flush(writer):
+        arrays = [
+            pa.array([row[i] for row in pending], type=schema.field(i).type)
+            for i in range(len(columns))
+        ]
+        arrays.append(pa.array([bytes(row.wkb) for row in pending], type=pa.binary()))
+        arrays.append(pa.StructArray.from_arrays(
+            [pa.array([getattr(row, name) for row in pending], type=pa.float64()) for name in ("xmin", "ymin", "xmax", "ymax")],
+            names=["xmin", "ymin", "xmax", "ymax"],
+        ))
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        pending.clear()
+
+    with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+        for rows in partitions:
+            for row in rows:
+                pending.append(row)
+                count += 1
+                if len(pending) >= EXPORT_ROW_GROUP_SIZE:
+                    flush(writer)
+        if pending:
+            flush(writer)
+    return count
+
+
+def export_layer(conn: Connection, layer: Layer, area: ExportArea, output_format: ExportFormat, output: BinaryIO) -> int:
+    """
+    Write an export file.
+
+    Args:
+        conn: Database connection (sync engine)
+        layer: Layer to export (with a geometry column)
+        area: Export criteria
+        output_format: File format
+        output: Binary file object (seekable output not required)
+
+    Returns:
+        Number of features written
+    """
+    parquet = output_format == ExportFormat.GEOPARQUET
+    query = export_query(layer, area, with_bbox=parquet)
+    if parquet:
+        # PostGIS sorts geometries along a Hilbert curve: compact row groups
+        query = query.order_by(layer.geometry_column)
+
+    result = conn.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(query)
+    if parquet:
+        return _write_geoparquet(layer, result.partitions(), output)
+    return _write_flatgeobuf(layer, result.partitions(), output)
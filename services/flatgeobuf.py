@@ -0,0 +1,508 @@
+"""
+FlatGeobuf writer.
+
+Writes FlatGeobuf files (https://flatgeobuf.org) with their packed Hilbert
+R-tree spatial index, without GDAL:
+1. features are encoded as they are read (add()) and appended to a
+   temporary file; only their bounding box, offset and size are kept in
+   memory (48 bytes per feature)
+2. finish() sorts the features along a Hilbert curve, writes the header and
+   the index, then copies the features from the temporary file in index order
+
+Geometries are given as 2D WKB (Point, LineString, Polygon and their Multi*
+types). Properties are encoded according to the column types.
+
+The FlatBuffers tables are laid out front to back by a minimal encoder:
+each table is preceded by its vtable and followed by its children.
+"""
+
+import struct
+import tempfile
+from array import array
+from typing import BinaryIO, List, Optional, Tuple
+
+MAGIC = b"fgb\x03fgb\x00"
+
+# GeometryType
+GEOMETRY_TYPES = {
+    1: "Point", 2: "LineString", 3: "Polygon",
+    4: "MultiPoint", 5: "MultiLineString", 6: "MultiPolygon",
+}
+
+# ColumnType
+INT = 5
+LONG = 7
+DOUBLE = 10
+STRING = 11
+
+# Packed R-tree node: min x, min y, max x, max y, offset
+NODE = struct.Struct("<ddddQ")
+DEFAULT_NODE_SIZE = 16
+
+
+# =============================================================================
+# FLATBUFFERS ENCODING
+# =============================================================================
+
+class _Table:
+    """
+    FlatBuffers table: fields by index, as (format, value) for scalars or
+    (None, child) for strings, vectors and tables.
+    """
+
+    def __init__(self, fields: dict):
+        self.fields = fields
+
+
+class _Vector:
+    """
+    FlatBuffers vector of scalars (struct format of one item) or tables.
+    """
+
+    def __init__(self, item_format: Optional[str], items):
+        self.item_format = item_format
+        self.items = items
+
+
+def _pad(buffer: bytearray, alignment: int, extra: int = 0):
+    # Pad so that what is written `extra` bytes from here is aligned
+    buffer.extend(b"\x00" * ((-(len(buffer) + extra)) % alignment))
+
+
+def _write_child(buffer: bytearray, child) -> int:
+    # Write a string, vector or table; return its position
+    if isinstance(child, _Table):
+        return _write_table(buffer, child)
+
+    if isinstance(child, (str, bytes)):
+        data = child.encode("utf-8") if isinstance(child, str) else child
+        _pad(buffer, 4)
+        position = len(buffer)
+        buffer.extend(struct.pack("<I", len(data)))
+        buffer.extend(data)
+        if isinstance(child, str):
+            buffer.append(0)
+        return position
+
+    if child.item_format is None:
+        # Vector of tables: offsets, then the tables
+        _pad(buffer, 4)
+        position = len(buffer)
+        buffer.extend(struct.pack("<I", len(child.items)))
+        slots = len(buffer)
+        buffer.extend(b"\x00" * (4 * len(child.items)))
+        for i, table in enumerate(child.items):
+            table_position = _write_table(buffer, table)
+            slot = slots + 4 * i
+            struct.pack_into("<I", buffer, slot, table_position - slot)
+        return position
+
+    size = struct.calcsize("<" + child.item_format)
+    _pad(buffer, max(size, 4), 4)
+    position = len(buffer)
+    buffer.extend(struct.pack("<I", len(child.items)))
+    if isinstance(child.items, array):
+        buffer.extend(child.items.tobytes())
+    else:
+        buffer.extend(struct.pack(f"<{len(child.items)}{child.item_format}", *child.items))
+    return position
+
+
+def _write_table(buffer: bytearray, table: _Table) -> int:
+    # Layout of the inline part: soffset to the vtable, then the fields
+    # sorted by decreasing size so that each one is aligned
+    fields = sorted(
+        table.fields.items(),
+        key=lambda item: -struct.calcsize("<" + (item[1][0] or "I"))
+    )
+    field_count = max(table.fields) + 1 if table.fields else 0
+    alignment = max([4] + [struct.calcsize("<" + (f or "I")) for _, (f, _) in fields])
+
+    offsets = {}
+    inline_size = 4
+    for index, (item_format, _) in fields:
+        size = struct.calcsize("<" + (item_format or "I"))
+        inline_size += (-inline_size) % size
+        offsets[index] = inline_size
+        inline_size += size
+
+    vtable = struct.pack(
+        f"<{2 + field_count}H",
+        4 + 2 * field_count, inline_size,
+        *[offsets.get(i, 0) for i in range(field_count)]
+    )
+    _pad(buffer, 2)
+    # The table start (after the vtable) must be aligned
+    _pad(buffer, alignment, len(vtable))
+    vtable_position = len(buffer)
+    buffer.extend(vtable)
+    table_position = len(buffer)
+
+    inline = bytearray(inline_size)
+    struct.pack_into("<i", inline, 0, table_position - vtable_position)
+    for index, (item_format, value) in fields:
+        if item_format is not None:
+            struct.pack_into("<" + item_format, inline, offsets[index], value)
+    buffer.extend(inline)
+
+    for index, (item_format, value) in fields:
+        if item_format is None:
+            child_position = _write_child(buffer, value)
+            slot = table_position + offsets[index]
+            struct.pack_into("<I", buffer, slot, child_position - slot)
+    return table_position
+
+
+def encode(root: _Table) -> bytes:
+    """
+    Encode a root table as a FlatBuffers buffer.
+    """
+    buffer = bytearray(4)
+    position = _write_table(buffer, root)
+    struct.pack_into("<I", buffer, 0, position)
+    _pad(buffer, 8)
+    return bytes(buffer)
+
+
+# =============================================================================
+# GEOMETRIES
+# =============================================================================
+
+def _read_points(wkb: bytes, offset: int, order: str, xy: array) -> int:
+    (count,) = struct.unpack_from(order + "I", wkb, offset)
+    offset += 4
+    values = array("d", wkb[offset:offset + 16 * count])
+    if order == ">":
+        values.byteswap()
+    xy.extend(values)
+    return offset + 16 * count
+
+
+def _read_geometry(wkb: bytes, offset: int) -> Tuple[_Table, int, int]:
+    """
+    Parse one 2D WKB geometry.
+
+    Returns:
+        (Geometry table, geometry type, offset after the geometry)
+    """
+    order = "<" if wkb[offset] == 1 else ">"
+    (geometry_type,) = struct.unpack_from(order + "I", wkb, offset + 1)
+    offset += 5
+    xy = array("d")
+    ends = array("I")
+
+    if geometry_type == 1:
+        xy.extend(struct.unpack_from(order + "dd", wkb, offset))
+        offset += 16
+    elif geometry_type == 2:
+        offset = _read_points(wkb, offset, order, xy)
+    elif geometry_type == 3:
+        (rings,) = struct.unpack_from(order + "I", wkb, offset)
+        offset += 4
+        for _ in range(rings):
+            offset = _read_points(wkb, offset, order, xy)
+            ends.append(len(xy) // 2)
+    elif geometry_type in (4, 5, 6):
+        (count,) = struct.unpack_from(order + "I", wkb, offset)
+        offset += 4
+        parts = []
+        for _ in range(count):
+            part, _, offset = _read_geometry(wkb, offset)
+            parts.append(part)
+        if geometry_type == 6:
+            return _Table({6: ("B", 6), 7: (None, _Vector(None, parts))}), 6, offset
+        # MultiPoint / MultiLineString: flat coordinates (and line ends)
+        for part in parts:
+            xy.extend(part.fields[1][1].items)
+            if geometry_type == 5:
+                ends.append(len(xy) // 2)
+    else:
+        raise ValueError(f"Unsupported WKB geometry type {geometry_type}")
+
+    fields = {1: (None, _Vector("d", xy)), 6: ("B", geometry_type)}
+    if len(ends) > 1:
+        fields[0] = (None, _Vector("I", ends))
+    return _Table(fields), geometry_type, offset
+
+
+def _bounds(geometry: _Table) -> tuple:
+    if 7 in geometry.fields:
+        boxes = [_bounds(part) for part in geometry.fields[7][1].items]
+        return (
+            min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes),
+        )
+    xy = geometry.fields[1][1].items
+    xs, ys = xy[0::2], xy[1::2]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+# =============================================================================
+# PACKED HILBERT R-TREE
+# =============================================================================
+
+def hilbert(x: int, y: int) -> int:
+    """
+    Hilbert curve index of 16-bit coordinates.
+    """
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C ^= (a & (c >> 2)) ^ (b & (d >> 2))
+    D ^= (b & (c >> 2)) ^ ((a ^ b) & (d >> 2))
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C ^= (a & (c >> 4)) ^ (b & (d >> 4))
+    D ^= (b & (c >> 4)) ^ ((a ^ b) & (d >> 4))
+
+    a, b, c, d = A, B, C, D
+    C ^= (a & (c >> 8)) ^ (b & (d >> 8))
+    D ^= (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+
+    i0 = (i0 | (i0 << 8)) & 0x00FF00FF
+    i0 = (i0 | (i0 << 4)) & 0x0F0F0F0F
+    i0 = (i0 | (i0 << 2)) & 0x33333333
+    i0 = (i0 | (i0 << 1)) & 0x55555555
+
+    i1 = (i1 | (i1 << 8)) & 0x00FF00FF
+    i1 = (i1 | (i1 << 4)) & 0x0F0F0F0F
+    i1 = (i1 | (i1 << 2)) & 0x33333333
+    i1 = (i1 | (i1 << 1)) & 0x55555555
+
+    return ((i1 << 1) | i0) & 0xFFFFFFFF
+
+
+def level_bounds(count: int, node_size: int) -> List[Tuple[int, int]]:
+    """
+    Node ranges of each tree level, leaves first (root stored first).
+    """
+    level_nodes = [count]
+    n = count
+    total = count
+    while True:
+        n = (n + node_size - 1) // node_size
+        total += n
+        level_nodes.append(n)
+        if n == 1:
+            break
+
+    bounds = []
+    end = total
+    for nodes in level_nodes:
+        end -= nodes
+        bounds.append((end, end + nodes))
+    return bounds
+
+
+def build_index(boxes: List[tuple], offsets: List[int], node_size: int) -> bytes:
+    """
+    Packed R-tree of features already sorted along the Hilbert curve.
+
+    Args:
+        boxes: Feature bounding boxes, in file order
+        offsets: Feature byte offsets within the feature section
+        node_size: Children per node
+
+    Returns:
+        Serialized index
+    """
+    bounds = level_bounds(len(boxes), node_size)
+    nodes = [None] * bounds[0][1]
+
+    leaves_start = bounds[0][0]
+    for i, (box, offset) in enumerate(zip(boxes, offsets)):
+        nodes[leaves_start + i] = (*box, offset)
+
+    for (start, end), (parent, _) in zip(bounds, bounds[1:]):
+        position = start
+        while position < end:
+            first = position
+            children = nodes[position:min(position + node_size, end)]
+            position += len(children)
+            nodes[parent] = (
+                min(n[0] for n in children), min(n[1] for n in children),
+                max(n[2] for n in children), max(n[3] for n in children),
+                first,
+            )
+            parent += 1
+
+    return b"".join(NODE.pack(*node) for node in nodes)
+
+
+# =============================================================================
+# WRITER
+# =============================================================================
+
+class FlatGeobufWriter:
+    """
+    Two-pass FlatGeobuf writer (see module docstring).
+
+    Columns are given as (name, column type) with the INT, LONG, DOUBLE and
+    STRING constants of this module.
+
+    Usage:
+        writer = FlatGeobufWriter("parcelle", [("idu", STRING), ("contenance", INT)], srid=4326)
+        for wkb, values in rows:
+            writer.add(wkb, values)
+        writer.finish(output_file)
+
+    Attributes:
+        count: Number of features added
+    """
+
+    def __init__(
+        self,
+        name: str,
+        columns: List[Tuple[str, int]],
+        srid: int,
+        node_size: int = DEFAULT_NODE_SIZE,
+        geometry_type: int = 0,
+    ):
+        self.name = name
+        self.columns = list(columns)
+        self.srid = srid
+        self.node_size = node_size
+        self.geometry_type = geometry_type
+        self.count = 0
+        self._features = tempfile.TemporaryFile()
+        self._boxes = array("d")
+        self._sizes = array("Q")
+
+    def _properties(self, values) -> bytes:
+        data = bytearray()
+        for i, ((_, column_type), value) in enumerate(zip(self.columns, values)):
+            if value is None:
+                continue
+            data.extend(struct.pack("<H", i))
+            if column_type == INT:
+                value = int(value)
+                if not -2 ** 31 <= value < 2 ** 31:
+                    raise ValueError(f"{self.columns[i][0]}: {value} does not fit in 32 bits")
+                data.extend(struct.pack("<i", value))
+            elif column_type == LONG:
+                data.extend(struct.pack("<q", int(value)))
+            elif column_type == DOUBLE:
+                data.extend(struct.pack("<d", float(value)))
+            else:
+                encoded = str(value).encode("utf-8")
+                data.extend(struct.pack("<I", len(encoded)))
+                data.extend(encoded)
+        return bytes(data)
+
+    def add(self, wkb: Optional[bytes], values: tuple):
+        """
+        Encode and append one feature.
+
+        Args:
+            wkb: 2D WKB geometry (features without geometry are skipped)
+            values: Property values, in column order
+        """
+        if wkb is None:
+            return
+        geometry, geometry_type, _ = _read_geometry(bytes(wkb), 0)
+        if self.count == 0 and not self.geometry_type:
+            self.geometry_type = geometry_type
+        elif geometry_type != self.geometry_type:
+            # Mixed geometry types: declared as Unknown, typed per feature
+            self.geometry_type = 0
+
+        fields = {0: (None, geometry)}
+        properties = self._properties(values)
+        if properties:
+            fields[1] = (None, _Vector("B", array("B", properties)))
+        feature = encode(_Table(fields))
+
+        self._features.write(struct.pack("<I", len(feature)))
+        self._features.write(feature)
+        self._boxes.extend(_bounds(geometry))
+        self._sizes.append(4 + len(feature))
+        self.count += 1
+
+    def _header(self, envelope: Optional[tuple]) -> bytes:
+        columns = _Vector(None, [
+            _Table({0: (None, name), 1: ("B", column_type)})
+            for name, column_type in self.columns
+        ])
+        fields = {
+            0: (None, self.name),
+            2: ("B", self.geometry_type),
+            7: (None, columns),
+            8: ("Q", self.count),
+            9: ("H", self.node_size if self.count else 0),
+            10: (None, _Table({0: (None, "EPSG"), 1: ("i", self.srid)})),
+        }
+        if envelope is not None:
+            fields[1] = (None, _Vector("d", list(envelope)))
+        return encode(_Table(fields))
+
+    def finish(self, output: BinaryIO):
+        """
+        Write the file (header, index, features in Hilbert order).
+        """
+        boxes = [tuple(self._boxes[4 * i:4 * i + 4]) for i in range(self.count)]
+        envelope = None
+        order = list(range(self.count))
+
+        if boxes:
+            envelope = (
+                min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes),
+            )
+            width = (envelope[2] - envelope[0]) or 1.0
+            height = (envelope[3] - envelope[1]) or 1.0
+            keys = [
+                hilbert(
+                    int(0xFFFF * ((b[0] + b[2]) / 2 - envelope[0]) / width),
+                    int(0xFFFF * ((b[1] + b[3]) / 2 - envelope[1]) / height),
+                )
+                for b in boxes
+            ]
+            order.sort(key=keys.__getitem__)
+
+        header = self._header(envelope)
+        output.write(MAGIC)
+        output.write(struct.pack("<I", len(header)))
+        output.write(header)
+
+        # Position of each feature in the temporary file
+        positions = array("Q", [0]) * self.count
+        position = 0
+        for i, size in enumerate(self._sizes):
+            positions[i] = position
+            position += size
+
+        if self.count:
+            offsets = []
+            offset = 0
+            for i in order:
+                offsets.append(offset)
+                offset += self._sizes[i]
+            output.write(build_index([boxes[i] for i in order], offsets, self.node_size))
+
+        self._features.flush()
+        for i in order:
+            self._features.seek(positions[i])
+            output.write(self._features.read(self._sizes[i]))
+
+        self._features.close()
+
+    def close(self):
+        self._features.close()
@@ -0,0 +1,232 @@
+"""
+GeoJSON helpers.
+
+Builds GeoJSON features and FeatureCollections inside PostGIS
+(json_build_object / json_agg / ST_AsGeoJSON), so that the API returns the
+serialized text as-is, without parsing and re-encoding geometries in Python.
+
+Large results can also be streamed (chunked FeatureCollection or NDJSON)
+from a server-side cursor, with constant memory on the server, or sent as
+quantized TopoJSON with shared arcs (see services/topojson.py).
+"""
+
+from enum import Enum
+from itertools import chain
+from typing import AsyncIterator, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import JSON, Text, cast, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from starlette.concurrency import run_in_threadpool
+
+from config import STREAM_BATCH_SIZE
+from services.cache import cached_response
+from services.metrics import serialization_timer
+from services.topojson import TOPOJSON_MEDIA_TYPE, encode_topology, topology_columns
+
+# Media type of GeoJSON responses (RFC 7946)
+GEOJSON_MEDIA_TYPE = "application/geo+json"
+
+# Media type of newline-delimited GeoJSON features
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class OutputFormat(str, Enum):
+    """
+    Output formats of the layer endpoints.
+    
+    - geojson: FeatureCollection aggregated by PostGIS (cached)
+    - geojson-stream: FeatureCollection streamed in chunks
+    - ndjson: one GeoJSON Feature per line, streamed
+    - topojson: quantized TopoJSON Topology with shared arcs (cached)
+    """
+    
+    GEOJSON = "geojson"
+    GEOJSON_STREAM = "geojson-stream"
+    NDJSON = "ndjson"
+    TOPOJSON = "topojson"
+
+
+def feature_expression(id_expr, geom_expr, properties: dict, max_decimal_digits: Optional[int] = None):
+    """
+    SQL expression building a GeoJSON Feature object.
+
+    Args:
+        id_expr: Column used as feature id
+        geom_expr: Geometry expression, already in the output SRID
+            (None for features without geometry)
+        properties: Mapping of property name to column/expression
+        max_decimal_digits: Coordinate precision (None for the PostGIS default)
+
+    Returns:
+        SQL json expression
+    """
+    if geom_expr is None:
+        geometry = literal_column("NULL::json")
+    elif max_decimal_digits is None:
+        geometry = cast(func.ST_AsGeoJSON(geom_expr), JSON)
+    else:
+        geometry = cast(func.ST_AsGeoJSON(geom_expr, max_decimal_digits), JSON)
+
+    return func.json_build_object(
+        "type", "Feature",
+        "id", id_expr,
+        "geometry", geometry,
+        "properties", func.json_build_object(*chain.from_iterable(properties.items())),
+    )
+
+
+def feature_columns(
+    id_expr,
+    geom_expr,
+    properties: dict,
+    output_format: OutputFormat = OutputFormat.GEOJSON,
+) -> list:
+    """
+    Columns of a feature query for an output format: a single "feature"
+    column (see feature_expression), or the id / properties / wkb columns
+    encoded by encode_topology() for TopoJSON.
+
+    Usage in a router:
+        query = select(*feature_columns(Commune.id, geom_expr, properties, format))
+    """
+    if output_format == OutputFormat.TOPOJSON:
+        return topology_columns(id_expr, geom_expr, properties)
+    return [feature_expression(id_expr, geom_expr, properties).label("feature")]
+
+
+def feature_collection_query(features: Select) -> Select:
+    """
+    Wrap a query of features into a query returning one FeatureCollection.
+
+    The features query must select a single column labelled "feature"
+    (see feature_expression). Features are aggregated in the order of the
+    features query, so ORDER BY / LIMIT should be applied to it.
+
+    Args:
+        features: Query selecting the "feature" column
+
+    Returns:
+        Query returning the FeatureCollection as text (one row, one column)
+    """
+    subquery = features.subquery("features")
+
+    collection = func.json_build_object(
+        "type", "FeatureCollection",
+        "features", func.coalesce(
+            func.json_agg(subquery.c.feature),
+            literal_column("'[]'::json")
+        ),
+    )
+    return select(cast(collection, Text))
+
+
+# =============================================================================
+# STREAMING
+# =============================================================================
+
+async def stream_features(db: AsyncSession, features: Select, separator: bytes) -> AsyncIterator[bytes]:
+    """
+    Stream serialized features from a server-side cursor.
+
+    The request's read session is used: it stays open until the response has
+    been sent (FastAPI 0.118+), with its admission slot and statement timeout
+    (see get_read_db in services/replicas.py).
+
+    Args:
+        db: Database session of the request
+        features: Query selecting the "feature" column
+        separator: Bytes placed between features
+
+    Yields:
+        Chunks of serialized features, STREAM_BATCH_SIZE features at a time
+    """
+    subquery = features.subquery("features")
+    query = select(cast(subquery.c.feature, Text))
+
+    first = True
+    result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+    async for batch in result.scalars().partitions():
+        with serialization_timer():
+            chunk = separator.join(feature.encode("utf-8") for feature in batch)
+        yield chunk if first else separator + chunk
+        first = False
+
+
+async def stream_feature_collection(db: AsyncSession, features: Select) -> AsyncIterator[bytes]:
+    """
+    Stream a GeoJSON FeatureCollection in chunks.
+    """
+    yield b'{"type":"FeatureCollection","features":['
+    async for chunk in stream_features(db, features, b","):
+        yield chunk
+    yield b"]}"
+
+
+async def stream_ndjson(db: AsyncSession, features: Select) -> AsyncIterator[bytes]:
+    """
+    Stream newline-delimited GeoJSON features.
+    """
+    empty = True
+    async for chunk in stream_features(db, features, b"\n"):
+        yield chunk
+        empty = False
+    if not empty:
+        yield b"\n"
+
+
+# =============================================================================
+# RESPONSES
+# =============================================================================
+
+async def features_response(
+    db: AsyncSession,
+    layer: str,
+    features: Select,
+    output_format: OutputFormat = OutputFormat.GEOJSON,
+    bounds: Optional[tuple] = None,
+    request: Optional[Request] = None,
+    **cache_params,
+) -> Response:
+    """
+    Build the HTTP response of a layer endpoint.
+
+    Args:
+        db: Database session
+        layer: Layer name (cache namespace)
+        features: Query selecting the feature_columns() of the format
+        output_format: Requested output format
+        bounds: WGS84 (xmin, ymin, xmax, ymax) the features are selected
+            from, or None if the response depends on all the data
+        request: Incoming request, for conditional requests (If-None-Match)
+        **cache_params: Request parameters identifying the response in the cache
+
+    Returns:
+        Raw GeoJSON or TopoJSON response (cached, with ETag), 304 response,
+        or streaming response
+    """
+    if output_format == OutputFormat.NDJSON:
+        return StreamingResponse(stream_ndjson(db, features), media_type=NDJSON_MEDIA_TYPE)
+
+    if output_format == OutputFormat.GEOJSON_STREAM:
+        return StreamingResponse(stream_feature_collection(db, features), media_type=GEOJSON_MEDIA_TYPE)
+
+    if output_format == OutputFormat.TOPOJSON:
+        async def build_topology():
+            rows = (await db.execute(features)).all()
+            with serialization_timer():
+                return await run_in_threadpool(encode_topology, layer, rows, bounds)
+
+        return await cached_response(
+            request, db, layer, build_topology, TOPOJSON_MEDIA_TYPE,
+            bounds=bounds, format=output_format.value, **cache_params
+        )
+
+    async def build():
+        collection = (await db.execute(feature_collection_query(features))).scalar()
+        with serialization_timer():
+            return collection.encode("utf-8")
+
+    return await cached_response(request, db, layer, build, GEOJSON_MEDIA_TYPE, bounds=bounds, **cache_params)
@@ -0,0 +1,331 @@
+"""
+Bulk ingest helpers.
+
+Reads Parcellaire Express source files (shapefiles or any OGR format, via
+pyogrio) in batches and loads them with binary COPY:
+- LAYERS maps each table in models/ to its source file name and field aliases
+- read_batches() streams rows from a slice of a source file
+- copy_rows() encodes rows in the PostgreSQL binary COPY format and sends
+  them through a psycopg2 connection
+
+Geometries are sent as EWKB (SRID added, single polygons promoted to
+MultiPolygon to match the model columns), so PostGIS parses them without any
+per-row SQL.
+
+These functions are synchronous and meant for scripts (see scripts/ingest.py).
+"""
+
+import io
+import re
+import struct
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from geoalchemy2 import Geometry
+from sqlalchemy import BigInteger, Float, Integer, Table
+
+from config import SOURCE_SRID
+from models.batiments import Batiment
+from models.borne_limite_propriete import BorneLimitePropriete
+from models.commune import Commune
+from models.emprise import Emprise
+from models.feuille import Feuille
+from models.localisant import Localisant
+from models.parcelle import Parcelle
+from models.subdivision_fiscale import SubdivisionFiscale
+
+# Source file extensions recognized when scanning a delivery
+SOURCE_EXTENSIONS = (".shp", ".gpkg", ".geojson", ".fgb")
+
+# Département code in delivery paths (e.g. PARCELLAIRE-EXPRESS_..._D002_...)
+DEPARTEMENT_PATTERN = re.compile(r"_D(\d{2}[\dAB])(?:_|$)")
+
+# Binary COPY framing
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+COPY_NULL = struct.pack(">i", -1)
+
+# EWKB flag: an SRID follows the geometry type
+EWKB_SRID_FLAG = 0x20000000
+
+
+@dataclass
+class IngestLayer:
+    """
+    Source description of a cadastral table.
+
+    Attributes:
+        model: SQLAlchemy model of the table
+        source: Source file name without extension (case-insensitive)
+        aliases: Table column -> source field, when the names differ
+            (other columns are matched by name, case-insensitive)
+        derived: Columns computed after the load (see services/derived.py)
+    """
+
+    model: type
+    source: str
+    aliases: Dict[str, str] = field(default_factory=dict)
+    derived: tuple = ()
+
+    @property
+    def table(self) -> Table:
+        return self.model.__table__
+
+    def columns(self) -> list:
+        """
+        Table columns filled from the source (primary key left to its sequence).
+        """
+        return [
+            column for column in self.table.columns
+            if not column.primary_key and column.name not in self.derived
+        ]
+
+    def indexes(self) -> list:
+        """
+        Model indexes rebuilt around a load: those of derived columns are
+        left to services/derived.py, which creates the columns first (they
+        may be missing from tables created by ogr2ogr or shp2pgsql).
+        """
+        return [
+            index for index in self.table.indexes
+            if not any(column.name in self.derived for column in index.columns)
+        ]
+
+
+# Commune fields are abbreviated in Parcellaire Express
+_COMMUNE_ALIASES = {
+    "code_departement": "code_dep",
+    "nom_commune": "nom_com",
+    "code_commune": "code_com",
+    "commune_abs": "com_abs",
+    "code_arret": "code_arr",
+}
+
+# Loadable layers, by table name
+LAYERS = {
+    "commune": IngestLayer(Commune, "COMMUNE", _COMMUNE_ALIASES),
+    "feuille": IngestLayer(Feuille, "FEUILLE", _COMMUNE_ALIASES),
+    "parcelle": IngestLayer(Parcelle, "PARCELLE", derived=("centroid",)),
+    "batiments": IngestLayer(Batiment, "BATIMENT", {"type_batiment": "type"}),
+    "localisant": IngestLayer(Localisant, "LOCALISANT", _COMMUNE_ALIASES),
+    "subdivision_fiscale": IngestLayer(SubdivisionFiscale, "SUBDIVISION_FISCALE", {"idu_parcelle": "idu"}),
+    "borne_limite_propriete": IngestLayer(BorneLimitePropriete, "BORNE_LIMITE_PROPRIETE"),
+    "emprise": IngestLayer(Emprise, "EMPRISE"),
+}
+
+
+# =============================================================================
+# SOURCE FILES
+# =============================================================================
+
+@dataclass
+class SourceFile:
+    """
+    Source file of a layer in a delivery.
+
+    Attributes:
+        layer: Table name (key of LAYERS)
+        path: File path
+        departement: Département code found in the path, if any
+    """
+
+    layer: str
+    path: Path
+    departement: Optional[str]
+
+
+def find_sources(directories: List[str], layers: List[str]) -> List[SourceFile]:
+    """
+    Find the source files of the given layers under delivery directories.
+
+    Args:
+        directories: Delivery directories (searched recursively)
+        layers: Table names (keys of LAYERS)
+
+    Returns:
+        Source files, sorted by layer and path
+    """
+    by_stem = {LAYERS[name].source.upper(): name for name in layers}
+    sources = []
+    for directory in directories:
+        for path in sorted(Path(directory).rglob("*")):
+            name = by_stem.get(path.stem.upper())
+            if name is None or path.suffix.lower() not in SOURCE_EXTENSIONS:
+                continue
+            match = None
+            for part in path.parts:
+                match = DEPARTEMENT_PATTERN.search(part) or match
+            sources.append(SourceFile(name, path, match.group(1) if match else None))
+    return sorted(sources, key=lambda s: (layers.index(s.layer), str(s.path)))
+
+
+def feature_count(path: Path) -> int:
+    """
+    Number of features of a source file.
+    """
+    import pyogrio
+
+    return pyogrio.read_info(path)["features"]
+
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def _source_fields(layer: IngestLayer, fields: list) -> list:
+    # Source field index of each loaded column (None if missing)
+    positions = {name.lower(): i for i, name in enumerate(fields)}
+    indexes = []
+    for column in layer.columns():
+        if isinstance(column.type, Geometry):
+            indexes.append("geometry")
+        else:
+            source = layer.aliases.get(column.name, column.name).lower()
+            indexes.append(positions.get(source, positions.get(column.name)))
+    return indexes
+
+
+def to_ewkb(wkb: bytes, srid: int, multi: bool) -> bytes:
+    """
+    Convert 2D WKB to EWKB with an SRID, promoting single geometries to
+    their Multi* type if `multi` is set.
+    """
+    order = "<" if wkb[0] == 1 else ">"
+    (geometry_type,) = struct.unpack(order + "I", wkb[1:5])
+    if multi and geometry_type in (1, 2, 3):
+        # Point/LineString/Polygon -> one-element MultiPoint/...
+        header = struct.pack(order + "III", (geometry_type + 3) | EWKB_SRID_FLAG, srid, 1)
+        return wkb[:1] + header + wkb
+    return wkb[:1] + struct.pack(order + "II", geometry_type | EWKB_SRID_FLAG, srid) + wkb[5:]
+
+
+def read_batches(
+    layer_name: str,
+    path: Path,
+    start: int = 0,
+    count: Optional[int] = None,
+    batch_size: int = 50000,
+) -> Iterator[list]:
+    """
+    Read a slice of a source file as rows of the layer table.
+
+    Args:
+        layer_name: Table name (key of LAYERS)
+        path: Source file
+        start: Index of the first feature
+        count: Number of features (None: up to the end)
+        batch_size: Features per yielded batch
+
+    Yields:
+        Lists of rows (tuples in the order of IngestLayer.columns())
+
+    Raises:
+        ValueError: If the source is not in SOURCE_SRID
+    """
+    import pyogrio.raw
+
+    layer = LAYERS[layer_name]
+    end = None if count is None else start + count
+    multi = [
+        isinstance(column.type, Geometry) and column.type.geometry_type.upper().startswith("MULTI")
+        for column in layer.columns()
+    ]
+
+    position = start
+    while end is None or position < end:
+        size = batch_size if end is None else min(batch_size, end - position)
+        meta, _, geometries, field_data = pyogrio.raw.read(
+            path, skip_features=position, max_features=size, force_2d=True
+        )
+        if position == start:
+            crs = meta.get("crs") or ""
+            if crs and crs.upper() != f"EPSG:{SOURCE_SRID}":
+                raise ValueError(f"{path}: CRS {crs} (expected EPSG:{SOURCE_SRID})")
+            sources = _source_fields(layer, list(meta["fields"]))
+
+        rows = []
+        for i in range(len(geometries)):
+            row = []
+            for source, is_multi in zip(sources, multi):
+                if source == "geometry":
+                    wkb = geometries[i]
+                    row.append(to_ewkb(wkb, SOURCE_SRID, is_multi) if wkb is not None else None)
+                elif source is None:
+                    row.append(None)
+                else:
+                    row.append(field_data[source][i])
+            rows.append(row)
+
+        if not rows:
+            return
+        yield rows
+        position += len(rows)
+
+
+# =============================================================================
+# BINARY COPY
+# =============================================================================
+
+def _encoder(column):
+    # Binary COPY encoder of a column type
+    if isinstance(column.type, Geometry):
+        return bytes
+    if isinstance(column.type, BigInteger):
+        return lambda value: struct.pack(">q", int(value))
+    if isinstance(column.type, Integer):
+        return lambda value: struct.pack(">i", int(value))
+    if isinstance(column.type, Float):
+        return lambda value: struct.pack(">d", float(value))
+    return lambda value: str(value).encode("utf-8")
+
+
+def _is_null(value) -> bool:
+    # None, empty string, or NaN for missing numeric values
+    if isinstance(value, str):
+        return not value
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def encode_copy(rows: list, encoders: list) -> io.BytesIO:
+    """
+    Encode rows in the PostgreSQL binary COPY format.
+    """
+    buffer = io.BytesIO()
+    buffer.write(COPY_HEADER)
+    field_count = struct.pack(">h", len(encoders))
+    for row in rows:
+        buffer.write(field_count)
+        for value, encode in zip(row, encoders):
+            if _is_null(value):
+                buffer.write(COPY_NULL)
+            else:
+                data = encode(value)
+                buffer.write(struct.pack(">i", len(data)))
+                buffer.write(data)
+    buffer.write(COPY_TRAILER)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_rows(cursor, layer_name: str, rows: list, table: Optional[str] = None) -> int:
+    """
+    Load rows into a layer table with binary COPY.
+
+    Args:
+        cursor: psycopg2 cursor
+        layer_name: Table name (key of LAYERS)
+        rows: Rows in the order of IngestLayer.columns()
+        table: Target table with the same columns (default: the layer table)
+
+    Returns:
+        Number of rows loaded
+    """
+    layer = LAYERS[layer_name]
+    columns = layer.columns()
+    names = ", ".join(column.name for column in columns)
+    cursor.copy_expert(
+        f"COPY {table or layer.table.name} ({names}) FROM STDIN WITH (FORMAT binary)",
+        encode_copy(rows, [_encoder(column) for column in columns])
+    )
+    return len(rows)
@@ -0,0 +1,312 @@
+"""
+Generic layer engine.
+
+Builds the endpoint of a cadastral layer from its SQLAlchemy model: the
+primary key is the feature id, the Geometry column is the feature geometry,
+and every other column is a property that can be projected (`fields=`) or
+filtered on (`?code_departement=02,59`).
+
+Queries follow the same path as /parcelle/:
+- bbox filtering in the native SRID (spatial index on the stored geometry)
+- optional clipping to the bbox (ST_ClipByBox2D), so that large polygons such
+  as communes only send the part inside the viewport
+- simplification in meters, then transformation of the returned geometries
+- GeoJSON built by PostGIS, cached or streamed (see services/geojson.py)
+
+Layers are registered in `layer_registry` (register_layer, layer_router).
+"""
+
+import inspect
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from geoalchemy2 import Geometry
+from sqlalchemy import Integer, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from services.geojson import OutputFormat, feature_columns, features_response
+from services.replicas import get_read_db
+from services.spatial import SpatialParams, apply_spatial_filters, bbox_native, output_geometry, spatial_params
+
+# Query parameters of the layer endpoints (not usable as attribute filters)
+RESERVED_PARAMS = {"limit", "xmin", "ymin", "xmax", "ymax", "simplify", "exclude", "fields", "clip", "format"}
+
+
+@dataclass
+class Layer:
+    """
+    Layer served by the engine.
+
+    Attributes:
+        name: Layer name (URL prefix and cache namespace)
+        model: SQLAlchemy model of the table
+        clip: Clip geometries to the bbox unless the request says otherwise
+    """
+
+    name: str
+    model: type
+    clip: bool = False
+    columns: dict = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.columns = {column.name: column for column in self.model.__table__.columns}
+
+    @property
+    def id_column(self):
+        return next(iter(self.model.__table__.primary_key.columns))
+
+    @property
+    def geometry_column(self):
+        """
+        Geometry column of the layer (None for tables without geometry).
+        """
+        return next(
+            (column for column in self.columns.values() if isinstance(column.type, Geometry)),
+            None
+        )
+
+    @property
+    def attributes(self) -> dict:
+        """
+        Property columns: every column except the primary key and geometries.
+        """
+        return {
+            name: column for name, column in self.columns.items()
+            if not column.primary_key and not isinstance(column.type, Geometry)
+        }
+
+    @property
+    def filterable(self) -> dict:
+        """
+        Columns usable as attribute filters: the primary key and the properties.
+        """
+        return {self.id_column.name: self.id_column, **self.attributes}
+
+    @property
+    def clippable(self) -> bool:
+        geometry = self.geometry_column
+        return geometry is not None and "POINT" not in geometry.type.geometry_type.upper()
+
+
+@dataclass
+class LayerParams:
+    """
+    Query parameters of a layer endpoint.
+
+    Attributes:
+        spatial: Limit, bbox and simplification
+        fields: Properties to return (None for all)
+        filters: Attribute filters, column name -> accepted values
+        clip: Clip geometries to the bbox
+    """
+
+    spatial: SpatialParams
+    fields: Optional[List[str]] = None
+    filters: Dict[str, list] = field(default_factory=dict)
+    clip: bool = False
+
+    def cache_params(self) -> dict:
+        """
+        Parameters identifying a response in the cache.
+        """
+        return {
+            **self.spatial.cache_params(),
+            "fields": ",".join(self.fields) if self.fields is not None else None,
+            "filters": ";".join(
+                f"{name}={','.join(map(str, values))}" for name, values in sorted(self.filters.items())
+            ),
+            "clip": self.clip,
+        }
+
+
+# Registered layers, by name
+layer_registry: Dict[str, Layer] = {}
+
+
+def register_layer(model: type, name: Optional[str] = None, clip: bool = False) -> Layer:
+    """
+    Register a layer (without endpoint, see layer_router).
+
+    Args:
+        model: SQLAlchemy model of the layer table
+        name: Layer name (default: table name)
+        clip: Clip geometries to the bbox by default (large polygons)
+
+    Returns:
+        Registered layer
+    """
+    layer = Layer(name or model.__tablename__, model, clip)
+    layer_registry[layer.name] = layer
+    return layer
+
+
+# =============================================================================
+# QUERY BUILDING
+# =============================================================================
+
+def _parse_values(layer: Layer, name: str, raw: str) -> list:
+    # Comma-separated filter values, typed like the column
+    values = [value.strip() for value in raw.split(",")]
+    if isinstance(layer.columns[name].type, Integer):
+        try:
+            return [int(value) for value in values]
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{name} expects integers")
+    return values
+
+
+def _parse_fields(layer: Layer, raw: Optional[str]) -> Optional[List[str]]:
+    if raw is None:
+        return None
+    fields = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in layer.attributes]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)} (available: {', '.join(layer.attributes)})"
+        )
+    return fields
+
+
+def layer_geometry(layer: Layer, params: LayerParams):
+    """
+    Output geometry expression: clipped to the bbox, simplified, in WGS84.
+
+    Clipping happens first, in the native SRID: simplification then only
+    processes the visible part of large polygons.
+    """
+    geom = layer.geometry_column
+    if params.clip and params.spatial.bbox is not None and layer.clippable:
+        geom = func.ST_ClipByBox2D(geom, func.Box2D(bbox_native(*params.spatial.bbox)))
+    return output_geometry(geom, params.spatial.simplify)
+
+
+def layer_query(layer: Layer, params: LayerParams, output_format: OutputFormat = OutputFormat.GEOJSON) -> Select:
+    """
+    Query selecting the features of a layer (feature_columns of the format).
+
+    Args:
+        layer: Layer
+        params: Request parameters
+        output_format: Output format
+
+    Returns:
+        Query for features_response()
+    """
+    names = params.fields if params.fields is not None else list(layer.attributes)
+    properties = {name: layer.columns[name] for name in names}
+
+    geometry = layer.geometry_column
+    geom_expr = layer_geometry(layer, params) if geometry is not None else None
+
+    query = select(
+        *feature_columns(layer.id_column, geom_expr, properties, output_format)
+    ).select_from(layer.model)
+
+    for name, values in params.filters.items():
+        column = layer.columns[name]
+        query = query.where(column == values[0] if len(values) == 1 else column.in_(values))
+
+    if geometry is not None:
+        query = apply_spatial_filters(query, geometry, params.spatial)
+    elif params.spatial.limit is not None:
+        query = query.order_by(layer.id_column).limit(params.spatial.limit)
+
+    return query
+
+
+# =============================================================================
+# ENDPOINTS
+# =============================================================================
+
+def _filters_dependency(layer: Layer):
+    """
+    FastAPI dependency with one optional query parameter per attribute.
+
+    The signature is generated from the model so that the filters appear in
+    the OpenAPI documentation.
+    """
+    names = [name for name in layer.filterable if name not in RESERVED_PARAMS]
+
+    def dependency(**values) -> Dict[str, list]:
+        return {
+            name: _parse_values(layer, name, value)
+            for name, value in values.items() if value is not None
+        }
+
+    dependency.__signature__ = inspect.Signature([
+        inspect.Parameter(
+            name,
+            inspect.Parameter.KEYWORD_ONLY,
+            default=Query(None, description=f"Filter on {name} (comma-separated values: any of them)"),
+            annotation=Optional[str],
+        )
+        for name in names
+    ])
+    return dependency
+
+
+def layer_router(model: type, tags: List[str], name: Optional[str] = None, clip: bool = False) -> APIRouter:
+    """
+    Register a layer and build its router.
+
+    Usage in a router module:
+        router = layer_router(Commune, tags=["Commune"], clip=True)
+
+    Args:
+        model: SQLAlchemy model of the layer table
+        tags: OpenAPI tags
+        name: Layer name (default: table name)
+        clip: Clip geometries to the bbox by default (large polygons)
+
+    Returns:
+        Router serving GET /{name}/
+    """
+    layer = register_layer(model, name, clip)
+
+    router = APIRouter(prefix=f"/{layer.name}", tags=tags)
+    filters_dependency = _filters_dependency(layer)
+
+    @router.get("/", summary=f"Get {layer.name} features")
+    async def get_features(
+        request: Request,
+        db: AsyncSession = Depends(get_read_db),
+        spatial: SpatialParams = Depends(spatial_params),
+        fields: Optional[str] = Query(
+            None,
+            description="Comma-separated properties to return (default: all, empty: none)"
+        ),
+        clip: Optional[bool] = Query(
+            None,
+            description=f"Clip geometries to the bounding box (default: {str(layer.clip).lower()})"
+        ),
+        filters: dict = Depends(filters_dependency),
+        format: OutputFormat = Query(OutputFormat.GEOJSON, description="Output format"),
+    ):
+        """
+        Get the features of the layer, optionally filtered by bounding box
+        (WGS84) and attributes, with projected properties and simplified or
+        clipped geometries.
+        """
+
+        if layer.geometry_column is None and (spatial.bbox is not None or spatial.simplify or spatial.exclude or clip):
+            raise HTTPException(status_code=400, detail=f"{layer.name} has no geometry")
+
+        params = LayerParams(
+            spatial=spatial,
+            fields=_parse_fields(layer, fields),
+            filters=filters,
+            clip=(clip if clip is not None else layer.clip) and spatial.bbox is not None,
+        )
+        if params.clip and spatial.exclude:
+            # Features already loaded were clipped to the previous view
+            raise HTTPException(status_code=400, detail="exclude cannot be combined with clipping (use clip=false)")
+        query = layer_query(layer, params, format)
+
+        return await features_response(
+            db, layer.name, query, format, bounds=spatial.bbox, request=request, **params.cache_params()
+        )
+
+    return router
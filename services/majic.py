@@ -0,0 +1,338 @@
+"""
+MAJIC API client.
+
+Async client for the Sogefi Open MAJIC API (property owners, personnes
+morales only). Designed so that owner enrichment adds little latency on top
+of parcel queries:
+- one shared HTTP connection pool (keep-alive)
+- concurrency limit and rate limiting towards the API
+- request batching: lookups made at the same time are grouped into requests
+  of up to MAJIC_BATCH_SIZE IDUs, and concurrent lookups of the same IDU share
+  one request
+- TTL cache of owner records keyed by IDU
+
+The API contract assumed here: `GET {MAJIC_API_BASE_URL}{MAJIC_OWNERS_PATH}`
+with `idu` (comma-separated IDUs) and `token` query parameters, returning
+`{"parcelles": [{"idu": ..., "proprietaires": [...]}, ...]}`.
+scripts/majic_stub.py serves the same contract locally for tests.
+
+Requires httpx (optional dependency): without it, the MAJIC endpoints are
+not served.
+"""
+
+import asyncio
+import importlib.util
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from config import (
+    MAJIC_API_BASE_URL,
+    MAJIC_API_TOKEN,
+    MAJIC_BATCH_SIZE,
+    MAJIC_BATCH_WINDOW,
+    MAJIC_CACHE_MAX_ENTRIES,
+    MAJIC_CACHE_TTL,
+    MAJIC_MAX_CONCURRENCY,
+    MAJIC_MAX_CONNECTIONS,
+    MAJIC_OWNERS_PATH,
+    MAJIC_RATE_LIMIT,
+    MAJIC_TIMEOUT,
+)
+
+
+class MajicError(Exception):
+    """
+    Raised when the MAJIC API cannot be queried or returns an error.
+    """
+
+
+def majic_available() -> bool:
+    """
+    Check that httpx is installed.
+    """
+    return importlib.util.find_spec("httpx") is not None
+
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+class TTLCache:
+    """
+    Bounded cache whose entries expire after a fixed time.
+
+    Attributes:
+        ttl: Entry lifetime in seconds
+        max_entries: Maximum number of entries (least recently used evicted)
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the number of operations per second.
+
+    Attributes:
+        rate: Operations allowed per second (also the burst size)
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# =============================================================================
+# CLIENT
+# =============================================================================
+
+class MajicClient:
+    """
+    Pooled, batched and cached MAJIC owner lookup client.
+
+    Usage:
+        owners = await majic_client.get_owners("02408000AB0123")
+        by_idu = await majic_client.get_owners_batch(idus)
+
+    Attributes:
+        base_url: API base URL
+        token: API token
+        batch_size: Maximum IDUs per API request
+        batch_window: Seconds to wait for more lookups before sending a batch
+        cache: TTL cache of owner records keyed by IDU
+    """
+
+    def __init__(
+        self,
+        base_url: str = MAJIC_API_BASE_URL,
+        token: str = MAJIC_API_TOKEN,
+        max_connections: int = MAJIC_MAX_CONNECTIONS,
+        max_concurrency: int = MAJIC_MAX_CONCURRENCY,
+        rate_limit: float = MAJIC_RATE_LIMIT,
+        timeout: float = MAJIC_TIMEOUT,
+        batch_size: int = MAJIC_BATCH_SIZE,
+        batch_window: float = MAJIC_BATCH_WINDOW,
+        cache_ttl: float = MAJIC_CACHE_TTL,
+        cache_max_entries: int = MAJIC_CACHE_MAX_ENTRIES,
+        transport=None,  # httpx transport (e.g. httpx.ASGITransport in tests)
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.cache = TTLCache(cache_ttl, cache_max_entries)
+        self.requests = 0
+
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._transport = transport
+        self._http = None
+        self._concurrency = max_concurrency
+        self._semaphore = None
+        self._rate_limiter = RateLimiter(rate_limit)
+
+        # Lookups waiting for the next batch, and lookups being fetched
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._flush_task = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.token)
+
+    def _client(self):
+        # Created lazily, inside the running event loop
+        if self._http is None:
+            import httpx
+
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self._max_connections,
+                    max_keepalive_connections=self._max_connections,
+                ),
+                timeout=self._timeout,
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        return self._http
+
+    async def aclose(self):
+        """
+        Close the connection pool.
+        """
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    async def get_owners(self, idu: str) -> List[dict]:
+        """
+        Get the owners of a parcelle.
+
+        Args:
+            idu: Parcelle unique identifier
+
+        Returns:
+            Owner records (empty list if the API knows no owner)
+
+        Raises:
+            MajicError: If the API request fails
+        """
+        owners = self.cache.get(idu)
+        if owners is not None:
+            return owners
+
+        future = self._in_flight.get(idu) or self._pending.get(idu)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[idu] = future
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_later())
+
+        # Shielded: a cancelled caller must not cancel a lookup shared
+        # with other callers
+        return await asyncio.shield(future)
+
+    async def get_owners_batch(self, idus: Sequence[str]) -> Dict[str, Optional[List[dict]]]:
+        """
+        Get the owners of many parcelles.
+
+        Lookups are grouped into API requests of up to `batch_size` IDUs,
+        sent concurrently within the concurrency and rate limits.
+
+        Args:
+            idus: Parcelle unique identifiers
+
+        Returns:
+            Mapping of IDU to owner records (None if the lookup failed)
+        """
+        idus = list(dict.fromkeys(idus))
+        results = await asyncio.gather(
+            *(self.get_owners(idu) for idu in idus),
+            return_exceptions=True
+        )
+        return {
+            idu: None if isinstance(result, Exception) else result
+            for idu, result in zip(idus, results)
+        }
+
+    def info(self) -> dict:
+        """
+        Client counters, for monitoring.
+        """
+        return {
+            "configured": self.configured,
+            "api_requests": self.requests,
+            "cache_entries": len(self.cache),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "pending": len(self._pending),
+            "in_flight": len(self._in_flight),
+        }
+
+    # -------------------------------------------------------------------------
+    # Batching
+    # -------------------------------------------------------------------------
+
+    async def _flush_later(self):
+        # Let concurrent lookups join the batch, then send everything pending
+        await asyncio.sleep(self.batch_window)
+        self._flush_task = None
+
+        pending, self._pending = self._pending, {}
+        self._in_flight.update(pending)
+
+        idus = list(pending)
+        batches = [idus[i:i + self.batch_size] for i in range(0, len(idus), self.batch_size)]
+        await asyncio.gather(*(self._fetch_batch(batch, pending) for batch in batches))
+
+    async def _fetch_batch(self, idus: List[str], futures: Dict[str, asyncio.Future]):
+        try:
+            owners_by_idu = await self._request(idus)
+        except Exception as e:
+            error = e if isinstance(e, MajicError) else MajicError(str(e))
+            for idu in idus:
+                self._in_flight.pop(idu, None)
+                if not futures[idu].done():
+                    futures[idu].set_exception(error)
+            return
+
+        for idu in idus:
+            owners = owners_by_idu.get(idu, [])
+            self.cache.put(idu, owners)
+            self._in_flight.pop(idu, None)
+            if not futures[idu].done():
+                futures[idu].set_result(owners)
+
+    async def _request(self, idus: List[str]) -> Dict[str, List[dict]]:
+        if not self.configured:
+            raise MajicError("MAJIC_API_TOKEN is not configured")
+
+        import httpx
+
+        client = self._client()
+        async with self._semaphore:
+            await self._rate_limiter.acquire()
+            self.requests += 1
+            try:
+                response = await client.get(
+                    MAJIC_OWNERS_PATH,
+                    params={"idu": ",".join(idus), "token": self.token},
+                )
+                response.raise_for_status()
+                payload = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                raise MajicError(f"MAJIC API request failed: {e}") from e
+
+        return {
+            record["idu"]: record.get("proprietaires", [])
+            for record in payload.get("parcelles", [])
+            if "idu" in record
+        }
+
+
+# Shared client (one connection pool per process)
+majic_client = MajicClient()
@@ -0,0 +1,359 @@
+"""
+Performance instrumentation.
+
+Records, for each API request:
+- SQL execution time, number of statements and rows (SQLAlchemy cursor events)
+- time waited for a pooled connection (TimedAsyncPool)
+- Python serialization time (serialization_timer, InstrumentedJSONResponse)
+- response size and total duration (MetricsMiddleware)
+
+Per-request figures are sent in a `Server-Timing` response header (measured
+up to the response headers, so streamed bodies are not included) and
+aggregated per endpoint into histograms exposed in the Prometheus text format
+at `GET /metrics` (counters are per worker process).
+
+Queries slower than SLOW_QUERY_THRESHOLD_MS can be logged with their
+EXPLAIN ANALYZE plan (opt-in). The plan is captured in a background task on a
+separate connection, read-only statements only.
+"""
+
+import asyncio
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config import METRICS_ENABLED, SERVER_TIMING_ENABLED, SLOW_QUERY_THRESHOLD_MS
+
+logger = logging.getLogger(__name__)
+
+# Prometheus text exposition format
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram buckets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1 KB to 256 MB
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+# =============================================================================
+# METRIC TYPES
+# =============================================================================
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Prometheus counter with labels.
+    """
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Prometheus histogram with labels.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: tuple, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labels = labels
+        # label values -> [bucket counts..., sum, count]
+        self._values = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._values.get(label_values)
+        if series is None:
+            series = self._values[label_values] = [0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _format_labels(self.labels, label_values, f'le="{bound:g}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {series[-1]}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+REQUESTS = Counter(
+    "api_requests_total", "HTTP requests.", ("endpoint", "method", "status")
+)
+REQUEST_DURATION = Histogram(
+    "api_request_duration_seconds", "Request duration, including the response body.",
+    DURATION_BUCKETS, ("endpoint",)
+)
+RESPONSE_SIZE = Histogram(
+    "api_response_size_bytes", "Response body size.", SIZE_BUCKETS, ("endpoint",)
+)
+SQL_DURATION = Histogram(
+    "api_sql_duration_seconds", "SQL execution time per request.", DURATION_BUCKETS, ("endpoint",)
+)
+SQL_ROWS = Histogram(
+    "api_sql_rows", "Rows returned by SQL statements per request.", ROW_BUCKETS, ("endpoint",)
+)
+POOL_WAIT = Histogram(
+    "api_db_pool_wait_seconds", "Time waited for a pooled connection per request.",
+    DURATION_BUCKETS, ("endpoint",)
+)
+SERIALIZATION_DURATION = Histogram(
+    "api_serialization_duration_seconds", "Python serialization time per request.",
+    DURATION_BUCKETS, ("endpoint",)
+)
+SLOW_QUERIES = Counter(
+    "api_slow_queries_total", "Statements slower than the slow-query threshold.", ("endpoint",)
+)
+
+METRICS = [
+    REQUESTS, REQUEST_DURATION, RESPONSE_SIZE, SQL_DURATION, SQL_ROWS,
+    POOL_WAIT, SERIALIZATION_DURATION, SLOW_QUERIES,
+]
+
+
+def render_metrics() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =============================================================================
+# PER-REQUEST MEASUREMENTS
+# =============================================================================
+
+@dataclass
+class RequestMetrics:
+    """
+    Measurements of the current request (seconds).
+    """
+
+    endpoint: str = "unmatched"
+    sql_time: float = 0.0
+    sql_statements: int = 0
+    sql_rows: int = 0
+    pool_wait: float = 0.0
+    serialization: float = 0.0
+
+    def server_timing(self, total: float) -> str:
+        return ", ".join([
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.sql_statements} statements, {self.sql_rows} rows"',
+            f"pool;dur={self.pool_wait * 1000:.1f}",
+            f"serialize;dur={self.serialization * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+
+# Measurements of the request being served (None outside requests)
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request", default=None)
+
+
+@contextmanager
+def serialization_timer():
+    """
+    Count the enclosed block as serialization time of the current request.
+
+    Usage:
+        with serialization_timer():
+            content = json.dumps(payload).encode("utf-8")
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = current_request.get()
+        if metrics is not None:
+            metrics.serialization += time.perf_counter() - started
+
+
+class InstrumentedJSONResponse(JSONResponse):
+    """
+    JSON response whose rendering counts as serialization time.
+    """
+
+    def render(self, content) -> bytes:
+        with serialization_timer():
+            return super().render(content)
+
+
+# =============================================================================
+# DATABASE HOOKS
+# =============================================================================
+
+class TimedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    Async queue pool recording the time waited for each connection checkout.
+    """
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            metrics = current_request.get()
+            if metrics is not None:
+                metrics.pool_wait += time.perf_counter() - started
+
+
+# Background EXPLAIN ANALYZE tasks (referenced until done)
+_explain_tasks = set()
+
+
+def _is_read_only(statement: str) -> bool:
+    return statement.lstrip().upper().startswith(("SELECT", "WITH"))
+
+
+async def _log_slow_query(engine, statement: str, parameters, duration: float, endpoint: str):
+    # Not part of the request that ran the slow query
+    current_request.set(None)
+    plan = "(no plan: statement is not read-only)"
+    if _is_read_only(statement):
+        try:
+            async with engine.connect() as conn:
+                result = await conn.exec_driver_sql(
+                    "EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters
+                )
+                plan = "\n".join(row[0] for row in result)
+        except Exception as e:
+            plan = f"(EXPLAIN ANALYZE failed: {e})"
+    logger.warning("Slow query on %s (%.0f ms):\n%s\n%s", endpoint, duration * 1000, statement, plan)
+
+
+def instrument_engine(async_engine):
+    """
+    Register the SQL timing hooks (and the slow-query log) on an async engine.
+    """
+    sync_engine = async_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        metrics = current_request.get()
+        if metrics is None:
+            return
+
+        metrics.sql_time += duration
+        metrics.sql_statements += 1
+        if cursor.rowcount > 0:
+            metrics.sql_rows += cursor.rowcount
+
+        if (
+            SLOW_QUERY_THRESHOLD_MS is not None
+            and duration * 1000 >= SLOW_QUERY_THRESHOLD_MS
+            and not statement.startswith("EXPLAIN")
+        ):
+            SLOW_QUERIES.inc(metrics.endpoint)
+            task = asyncio.get_running_loop().create_task(
+                _log_slow_query(async_engine, statement, parameters, duration, metrics.endpoint)
+            )
+            _explain_tasks.add(task)
+            task.add_done_callback(_explain_tasks.discard)
+
+
+# =============================================================================
+# MIDDLEWARE
+# =============================================================================
+
+def _endpoint(scope) -> str:
+    # Route path template, once the request has been routed
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware measuring each HTTP request.
+
+    Adds the Server-Timing header and records the endpoint histograms once
+    the response body has been sent. Endpoints are labelled with their route
+    path template (e.g. /parcelle/tiles/{z}/{x}/{y}.mvt).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                metrics.endpoint = _endpoint(scope)
+                if SERVER_TIMING_ENABLED:
+                    headers = list(message.get("headers", []))
+                    timing = metrics.server_timing(time.perf_counter() - started)
+                    headers.append((b"server-timing", timing.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except asyncio.CancelledError:
+            # Client went away (see services/admission.py)
+            status = 499
+            raise
+        finally:
+            current_request.reset(token)
+            endpoint = metrics.endpoint = _endpoint(scope)
+            REQUESTS.inc(endpoint, scope["method"], str(status))
+            REQUEST_DURATION.observe(time.perf_counter() - started, endpoint)
+            RESPONSE_SIZE.observe(size, endpoint)
+            SQL_DURATION.observe(metrics.sql_time, endpoint)
+            SQL_ROWS.observe(metrics.sql_rows, endpoint)
+            POOL_WAIT.observe(metrics.pool_wait, endpoint)
+            SERIALIZATION_DURATION.observe(metrics.serialization, endpoint)
@@ -0,0 +1,62 @@
+"""
+Keyset pagination helpers.
+
+Pages are requested with an opaque continuation token holding the last key
+of the previous page. Each page is then a `WHERE key > last ORDER BY key
+LIMIT n` index range scan, whose cost does not depend on the page depth
+(unlike OFFSET).
+
+The token also carries a fingerprint of the filters it was issued for, so
+that it cannot be reused with different filters.
+"""
+
+import base64
+import hashlib
+import json
+
+
+def _fingerprint(filters: dict) -> str:
+    canonical = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+def encode_cursor(last_key: int, filters: dict) -> str:
+    """
+    Build the continuation token of the page following `last_key`.
+
+    Args:
+        last_key: Key of the last row of the current page
+        filters: Filters of the paginated query
+
+    Returns:
+        URL-safe opaque token
+    """
+    payload = json.dumps({"k": last_key, "f": _fingerprint(filters)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, filters: dict) -> int:
+    """
+    Read the last key from a continuation token.
+
+    Args:
+        token: Token returned with the previous page
+        filters: Filters of the current request (must match the token's)
+
+    Returns:
+        Key after which the next page starts
+
+    Raises:
+        ValueError: If the token is malformed or was issued for other filters
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_key = int(payload["k"])
+        fingerprint = payload["f"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if fingerprint != _fingerprint(filters):
+        raise ValueError("Cursor does not match the query filters")
+    return last_key
@@ -0,0 +1,325 @@
+"""
+In-memory point-in-parcelle index.
+
+Answers "which parcelle contains this point" (GET/POST /parcelle/at) without
+a database round trip:
+- the parcelle geometries of a département are loaded once (WGS84), prepared
+  and indexed in a Shapely STRtree, on the first lookup in that département
+- the départements of the points are found from the extent of their communes
+- indexes are kept in an LRU bounded by POINT_INDEX_MAX_BYTES (estimated
+  size), so only the busy départements stay in memory
+- an index is rebuilt when the data version reports a change in its
+  département (full reload, or incremental update intersecting it)
+
+A lookup costs an STRtree query (envelope candidates) and a vectorized
+point-in-polygon test on the prepared candidates: a few microseconds per
+point, for single points as well as bulk requests.
+
+Requires shapely>=2.0 (optional dependency).
+"""
+
+import asyncio
+import importlib.util
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from config import POINT_INDEX_MAX_BYTES, STREAM_BATCH_SIZE, TARGET_SRID
+from models.commune import Commune
+from models.parcelle import Parcelle
+from services.versioning import DataVersion, data_version
+
+# GEOS geometries, their prepared index and the tree take about this many
+# times the size of the WKB they are built from
+SIZE_FACTOR = 3
+
+
+def point_index_available() -> bool:
+    """
+    Check that shapely is installed.
+    """
+    return importlib.util.find_spec("shapely") is not None
+
+
+# =============================================================================
+# DÉPARTEMENT INDEX
+# =============================================================================
+
+@dataclass
+class DepartementIndex:
+    """
+    STRtree over the prepared parcelle geometries of a département.
+
+    Attributes:
+        code_dep: Département code
+        tree: Shapely STRtree
+        geometries: Prepared geometries (numpy array, tree order)
+        idus: IDU of each geometry (numpy array)
+        bounds: WGS84 extent of the geometries
+        generation: Data generation the index was built from
+        stamp: Data version stamp the index was built from
+        size: Estimated memory size (bytes)
+    """
+
+    code_dep: str
+    tree: object
+    geometries: object
+    idus: object
+    bounds: tuple
+    generation: str
+    stamp: int
+    size: int
+
+    def is_current(self, version: DataVersion) -> bool:
+        return self.generation == version.generation and not version.changed_since(self.stamp, self.bounds)
+
+    def lookup(self, lons, lats) -> list:
+        """
+        IDU of the parcelle containing each point (None outside parcelles).
+
+        Points on a boundary shared by two parcelles get either of them.
+
+        Args:
+            lons: Longitudes (numpy array)
+            lats: Latitudes (numpy array)
+        """
+        import shapely
+
+        result = [None] * len(lons)
+        point_ids, geometry_ids = self.tree.query(shapely.points(lons, lats))
+        hits = shapely.intersects_xy(self.geometries[geometry_ids], lons[point_ids], lats[point_ids])
+        for point_id, geometry_id in zip(point_ids[hits], geometry_ids[hits]):
+            if result[point_id] is None:
+                result[point_id] = self.idus[geometry_id]
+        return result
+
+
+def build_index(code_dep: str, idus: list, wkbs: list, version: DataVersion) -> DepartementIndex:
+    """
+    Build the index of a département (CPU bound, run in a worker thread).
+    """
+    import numpy as np
+    import shapely
+
+    geometries = shapely.from_wkb(np.array(wkbs, dtype=object))
+    shapely.prepare(geometries)
+    bounds = tuple(float(v) for v in shapely.total_bounds(geometries)) if len(geometries) else (0, 0, 0, 0)
+    return DepartementIndex(
+        code_dep=code_dep,
+        tree=shapely.STRtree(geometries),
+        geometries=geometries,
+        idus=np.array(idus, dtype=object),
+        bounds=bounds,
+        generation=version.generation,
+        stamp=version.stamp,
+        size=sum(len(wkb) for wkb in wkbs) * SIZE_FACTOR,
+    )
+
+
+# =============================================================================
+# INDEX CACHE
+# =============================================================================
+
+class PointIndexStats:
+    """
+    Counters of the point index.
+    """
+
+    def __init__(self):
+        self.lookups = 0
+        self.points = 0
+        self.loads = 0
+        self.rebuilds = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class PointIndex:
+    """
+    Lazily loaded département indexes, in an LRU bounded by their estimated
+    size.
+
+    The index that was just loaded is always kept, even if it alone exceeds
+    the budget.
+
+    Attributes:
+        max_bytes: Memory budget of all indexes
+        size: Estimated size of the loaded indexes
+    """
+
+    def __init__(self, max_bytes: int = POINT_INDEX_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.stats = PointIndexStats()
+        self._indexes: "OrderedDict[str, DepartementIndex]" = OrderedDict()
+        self._extents: Optional[tuple] = None
+        self._loading: Dict[str, asyncio.Lock] = {}
+        self._lock = threading.Lock()
+
+    def info(self) -> dict:
+        with self._lock:
+            departements = {
+                code_dep: {"parcelles": len(index.idus), "bytes": index.size}
+                for code_dep, index in self._indexes.items()
+            }
+        return {
+            "max_bytes": self.max_bytes,
+            "bytes": self.size,
+            "departements": departements,
+            **self.stats.as_dict(),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+            self._extents = None
+            self.size = 0
+
+    # -------------------------------------------------------------------------
+    # Loading
+    # -------------------------------------------------------------------------
+
+    async def departement_extents(self, db: AsyncSession, version: DataVersion) -> Dict[str, tuple]:
+        """
+        WGS84 extent of each département, from its communes (read once per
+        data generation).
+        """
+        if self._extents is not None and self._extents[0] == version.generation:
+            return self._extents[1]
+
+        extent = func.ST_Extent(func.ST_Transform(Commune.geom, TARGET_SRID))
+        rows = (await db.execute(
+            select(
+                Commune.code_departement,
+                func.ST_XMin(extent), func.ST_YMin(extent), func.ST_XMax(extent), func.ST_YMax(extent),
+            )
+            .where(Commune.geom.is_not(None))
+            .group_by(Commune.code_departement)
+        )).all()
+        extents = {code_dep: tuple(box) for code_dep, *box in rows if code_dep}
+        self._extents = (version.generation, extents)
+        return extents
+
+    async def _load(self, db: AsyncSession, code_dep: str, version: DataVersion) -> DepartementIndex:
+        started = time.perf_counter()
+        query = select(
+            Parcelle.idu,
+            func.ST_AsBinary(func.ST_Transform(Parcelle.geom, TARGET_SRID)).label("wkb"),
+        ).where(Parcelle.code_dep == code_dep, Parcelle.geom.is_not(None))
+
+        idus, wkbs = [], []
+        result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for batch in result.partitions():
+            for idu, wkb in batch:
+                idus.append(idu)
+                wkbs.append(bytes(wkb))
+
+        index = await run_in_threadpool(build_index, code_dep, idus, wkbs, version)
+        self.stats.load_seconds += time.perf_counter() - started
+        return index
+
+    async def get(self, db: AsyncSession, code_dep: str, version: DataVersion) -> DepartementIndex:
+        """
+        Index of a département, loaded or rebuilt if needed.
+
+        Concurrent requests for the same département share a single load.
+        """
+        with self._lock:
+            index = self._indexes.get(code_dep)
+            if index is not None and index.is_current(version):
+                self._indexes.move_to_end(code_dep)
+                return index
+            loading = self._loading.setdefault(code_dep, asyncio.Lock())
+
+        async with loading:
+            with self._lock:
+                index = self._indexes.get(code_dep)
+                if index is not None and index.is_current(version):
+                    return index
+                rebuild = index is not None
+
+            index = await self._load(db, code_dep, version)
+
+            with self._lock:
+                previous = self._indexes.pop(code_dep, None)
+                if previous is not None:
+                    self.size -= previous.size
+                self._indexes[code_dep] = index
+                self.size += index.size
+                self.stats.loads += 1
+                if rebuild:
+                    self.stats.rebuilds += 1
+
+                while self.size > self.max_bytes and len(self._indexes) > 1:
+                    _, oldest = self._indexes.popitem(last=False)
+                    self.size -= oldest.size
+                    self.stats.evictions += 1
+            return index
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+
+    async def lookup(
+        self,
+        db: AsyncSession,
+        lons: Sequence[float],
+        lats: Sequence[float],
+        code_dep: Optional[str] = None,
+    ) -> List[Optional[str]]:
+        """
+        IDU of the parcelle containing each WGS84 point.
+
+        Args:
+            db: Database session (used only to load indexes)
+            lons: Longitudes
+            lats: Latitudes
+            code_dep: Département of all the points (default: found from
+                the commune extents)
+
+        Returns:
+            IDU or None, for each point
+        """
+        import numpy as np
+
+        version = await data_version.get(db)
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        self.stats.lookups += 1
+        self.stats.points += len(lons)
+
+        if code_dep is not None:
+            candidates = {code_dep: None}
+        else:
+            candidates = await self.departement_extents(db, version)
+
+        result = [None] * len(lons)
+        pending = np.ones(len(lons), dtype=bool)
+        for dep, box in candidates.items():
+            mask = pending.copy()
+            if box is not None:
+                mask &= (lons >= box[0]) & (lons <= box[2]) & (lats >= box[1]) & (lats <= box[3])
+            if not mask.any():
+                continue
+            positions = np.flatnonzero(mask)
+            index = await self.get(db, dep, version)
+            for position, idu in zip(positions, index.lookup(lons[positions], lats[positions])):
+                if idu is not None:
+                    result[position] = idu
+                    pending[position] = False
+            if not pending.any():
+                break
+        return result
+
+
+# Shared index used by /parcelle/at
+point_index = PointIndex()
@@ -0,0 +1,345 @@
+"""
+Read-replica routing.
+
+The read-only API queries can be spread over PostGIS streaming replicas
+(DB_REPLICA_URLS), each with its own connection pool (see database.py).
+Each read session (get_read_db) is opened on:
+- a usable replica, picked by least outstanding sessions (ties taken in
+  turn) or round robin (DB_REPLICA_BALANCING)
+- the primary when no replica is usable (failover)
+
+A replica is usable while:
+- its last health check succeeded, and no connection failed since (a
+  replica whose connection drops during a request is taken out at once,
+  until a check succeeds again)
+- its replay lag is at most DB_REPLICA_MAX_LAG seconds
+- it has replayed the latest data change known to the API (data version
+  stamp), so that responses built from it are never cached under a newer
+  data version than the data they contain; after a data load, reads go to
+  the primary until the next check sees the replicas caught up
+
+Checks run every DB_REPLICA_CHECK_INTERVAL seconds in a background task
+started with the application.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import Enum
+from typing import AsyncIterator, List, Optional
+
+from fastapi import Request
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from config import (
+    DB_REPLICA_BALANCING,
+    DB_REPLICA_CHECK_INTERVAL,
+    DB_REPLICA_CHECK_TIMEOUT,
+    DB_REPLICA_MAX_LAG,
+)
+from database import AsyncSessionLocal, async_engine, replica_engines
+from models.data_change import DataChange
+from services.admission import admitted, statement_timeout
+from services.versioning import data_version
+
+logger = logging.getLogger(__name__)
+
+# Standby status and replay lag (seconds); no lag when everything received
+# has been replayed (idle primary) or on a primary
+LAG_QUERY = text("""
+    SELECT
+        pg_is_in_recovery(),
+        CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+""")
+
+
+class BalancingPolicy(str, Enum):
+    """
+    Choice of the replica serving a read session.
+    """
+
+    LEAST_OUTSTANDING = "least-outstanding"
+    ROUND_ROBIN = "round-robin"
+
+
+def _is_connection_error(exc: BaseException) -> bool:
+    # Errors meaning the database is unreachable (not query errors)
+    if isinstance(exc, DBAPIError):
+        return exc.connection_invalidated or isinstance(exc, (OperationalError, InterfaceError))
+    return isinstance(exc, OSError)
+
+
+def _set_statement_timeout(milliseconds: int):
+    # Session "after_begin" hook: timeout of the statements of the transaction
+    def after_begin(session, transaction, connection):
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(milliseconds)}")
+    return after_begin
+
+
+# =============================================================================
+# DATABASE NODES
+# =============================================================================
+
+@dataclass
+class DatabaseNode:
+    """
+    A database serving reads, and its last known state.
+
+    Attributes:
+        name: Label (host:port/database)
+        engine: Async engine (own pool)
+        sessions: Session factory bound to the engine
+        healthy: Last check succeeded and no connection failed since
+        in_recovery: The database is a standby
+        lag: Replay lag (seconds) at the last check
+        stamp: Latest data change replayed at the last check (None before
+            the first check)
+        outstanding: Open read sessions
+        sessions_opened: Read sessions opened on this database
+        failures: Failed checks and connection failures
+        error: Last failure
+        checked_at: time.time() of the last check
+    """
+
+    name: str
+    engine: AsyncEngine
+    sessions: async_sessionmaker
+    healthy: bool = True
+    in_recovery: bool = False
+    lag: float = 0.0
+    stamp: Optional[int] = None
+    outstanding: int = 0
+    sessions_opened: int = 0
+    failures: int = 0
+    error: Optional[str] = None
+    checked_at: Optional[float] = None
+
+    @classmethod
+    def from_engine(cls, engine: AsyncEngine, sessions: Optional[async_sessionmaker] = None) -> "DatabaseNode":
+        url = engine.url
+        return cls(
+            name=f"{url.host}:{url.port or 5432}/{url.database}",
+            engine=engine,
+            sessions=sessions or async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False),
+        )
+
+    def mark_down(self, error: BaseException):
+        if self.healthy:
+            logger.warning("Database %s unavailable: %s", self.name, error)
+        self.healthy = False
+        self.failures += 1
+        self.error = str(error).splitlines()[0] if str(error) else type(error).__name__
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "in_recovery": self.in_recovery,
+            "lag": self.lag,
+            "stamp": self.stamp,
+            "outstanding": self.outstanding,
+            "sessions": self.sessions_opened,
+            "failures": self.failures,
+            "error": self.error,
+            "checked_at": self.checked_at,
+        }
+
+
+# =============================================================================
+# READ ROUTING
+# =============================================================================
+
+class ReplicaSet:
+    """
+    Primary and read replicas, with health checks and failover.
+
+    Attributes:
+        primary: Primary database (reads fall back to it)
+        replicas: Read replicas
+        policy: Balancing policy
+        max_lag: Maximum replay lag of a usable replica (seconds)
+        check_interval: Seconds between health checks
+        check_timeout: Timeout of one health check
+        fallbacks: Read sessions sent to the primary while replicas are
+            configured
+    """
+
+    def __init__(
+        self,
+        primary: DatabaseNode,
+        replicas: List[DatabaseNode],
+        policy: BalancingPolicy = BalancingPolicy(DB_REPLICA_BALANCING),
+        max_lag: float = DB_REPLICA_MAX_LAG,
+        check_interval: float = DB_REPLICA_CHECK_INTERVAL,
+        check_timeout: float = DB_REPLICA_CHECK_TIMEOUT,
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.policy = policy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.fallbacks = 0
+        self._turn = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def info(self) -> dict:
+        return {
+            "policy": self.policy.value,
+            "max_lag": self.max_lag,
+            "fallbacks": self.fallbacks,
+            "primary": self.primary.info(),
+            "replicas": [replica.info() for replica in self.replicas],
+        }
+
+    # -------------------------------------------------------------------------
+    # Routing
+    # -------------------------------------------------------------------------
+
+    def is_usable(self, node: DatabaseNode, min_stamp: Optional[int]) -> bool:
+        if not node.healthy or node.lag > self.max_lag:
+            return False
+        return min_stamp is None or (node.stamp is not None and node.stamp >= min_stamp)
+
+    def choose(self) -> DatabaseNode:
+        """
+        Database for a new read session.
+        """
+        if not self.replicas:
+            return self.primary
+
+        version = data_version.current
+        min_stamp = version.stamp if version is not None else None
+        candidates = [node for node in self.replicas if self.is_usable(node, min_stamp)]
+        if not candidates:
+            self.fallbacks += 1
+            return self.primary
+
+        # Candidates rotated on every call: round robin, and fair ties
+        self._turn += 1
+        start = self._turn % len(candidates)
+        candidates = candidates[start:] + candidates[:start]
+        if self.policy == BalancingPolicy.ROUND_ROBIN:
+            return candidates[0]
+        return min(candidates, key=lambda node: node.outstanding)
+
+    @asynccontextmanager
+    async def session(self, statement_timeout: int = 0) -> AsyncIterator[AsyncSession]:
+        """
+        Read-only session on the chosen database.
+
+        A connection failure on a replica takes it out of the read pool (the
+        failing request still fails; the following ones go elsewhere).
+
+        Args:
+            statement_timeout: Statement timeout (ms) of the session's
+                transaction (0: server default)
+        """
+        node = self.choose()
+        node.outstanding += 1
+        node.sessions_opened += 1
+        try:
+            async with node.sessions() as db:
+                if statement_timeout:
+                    event.listen(db.sync_session, "after_begin", _set_statement_timeout(statement_timeout))
+                try:
+                    yield db
+                except Exception as exc:
+                    if node is not self.primary and _is_connection_error(exc):
+                        node.mark_down(exc)
+                    raise
+        finally:
+            node.outstanding -= 1
+
+    # -------------------------------------------------------------------------
+    # Health checks
+    # -------------------------------------------------------------------------
+
+    async def _probe(self, node: DatabaseNode):
+        async with node.engine.connect() as conn:
+            in_recovery, lag = (await conn.execute(LAG_QUERY)).one()
+            stamp = 0
+            table = DataChange.__tablename__
+            if (await conn.execute(text(f"SELECT to_regclass('{table}')"))).scalar() is not None:
+                stamp = (await conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}"))).scalar()
+        node.in_recovery = bool(in_recovery)
+        node.lag = float(lag)
+        node.stamp = int(stamp)
+
+    async def check(self, node: DatabaseNode) -> bool:
+        """
+        Check a database: reachable, replay lag and replayed data changes.
+
+        Returns:
+            True if the database answered
+        """
+        try:
+            await asyncio.wait_for(self._probe(node), self.check_timeout)
+        except Exception as exc:
+            node.mark_down(exc if str(exc) else TimeoutError("health check timed out"))
+            return False
+        finally:
+            node.checked_at = time.time()
+
+        if not node.healthy:
+            logger.info("Database %s available again", node.name)
+        node.healthy = True
+        node.error = None
+        return True
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(node) for node in [self.primary, *self.replicas]))
+
+    async def _run_checks(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.check_interval)
+
+    def start(self):
+        """
+        Start the periodic health checks (when replicas are configured).
+        """
+        if self.replicas and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run_checks())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Primary and replicas of the API
+replica_set = ReplicaSet(
+    DatabaseNode.from_engine(async_engine, AsyncSessionLocal),
+    [DatabaseNode.from_engine(engine) for engine in replica_engines],
+)
+
+
+async def get_read_db(request: Request):
+    """
+    Read-only database session dependency for FastAPI.
+
+    Same as get_async_db (database.py), on a read replica when one is
+    usable, otherwise on the primary. For endpoints that only read.
+
+    The request first goes through admission control (503 when the server
+    is overloaded), and its queries get the statement timeout of its route
+    (see services/admission.py).
+
+    Yields:
+        AsyncSession: SQLAlchemy async database session
+    """
+    async with admitted(), replica_set.session(statement_timeout(request)) as db:
+        yield db
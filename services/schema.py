@@ -0,0 +1,107 @@
+"""
+Derived schema objects.
+
+The derived data (services/derived.py) is stored in schema objects that only
+exist once it has been built, by `python -m scripts.refresh_derived` or
+scripts.ingest (create_all does not add columns to existing tables):
+- parcelle.centroid: KNN ordering of GET /parcelle/
+- parcelle_pyramid: pre-simplified geometries of GET /parcelle/
+- parcelle_aggregate: parcelle summaries of GET /parcelle/aggregate
+
+The API looks them up on first use and again whenever the data version
+changes (building derived data records a data change), and falls back when
+one is missing instead of failing on it.
+"""
+
+import logging
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.parcelle import Parcelle
+from models.parcelle_aggregate import ParcelleAggregate
+from models.parcelle_pyramid import ParcellePyramid
+from services.versioning import DataVersion, data_version
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DerivedSchema:
+    """
+    Derived schema objects present in the database.
+
+    Attributes:
+        centroid: parcelle.centroid column
+        pyramid: parcelle_pyramid table
+        aggregate: parcelle_aggregate table
+    """
+
+    centroid: bool = False
+    pyramid: bool = False
+    aggregate: bool = False
+
+    @property
+    def missing(self) -> list:
+        return [field.name for field in fields(self) if not getattr(self, field.name)]
+
+
+async def _column_exists(db: AsyncSession, table: str, column: str) -> bool:
+    return (await db.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column)"
+    ), {"table": table, "column": column})).scalar()
+
+
+async def _table_exists(db: AsyncSession, table: str) -> bool:
+    return (await db.execute(text(f"SELECT to_regclass('{table}')"))).scalar() is not None
+
+
+class DerivedSchemaTracker:
+    """
+    Cached lookup of the derived schema objects, refreshed when the data
+    version changes.
+    """
+
+    def __init__(self):
+        self._schema: Optional[DerivedSchema] = None
+        self._version: Optional[DataVersion] = None
+
+    async def get(self, db: AsyncSession) -> DerivedSchema:
+        """
+        Get the derived schema objects present in the database.
+
+        Args:
+            db: Database session used when the data version changed since
+                the last lookup
+
+        Returns:
+            Derived schema objects
+        """
+        version = data_version.current
+        if self._schema is not None and version == self._version:
+            return self._schema
+
+        schema = await self._load(db)
+        if schema.missing:
+            logger.warning(
+                "Derived data missing (python -m scripts.refresh_derived): %s",
+                ", ".join(schema.missing)
+            )
+        self._schema = schema
+        self._version = version
+        return schema
+
+    @staticmethod
+    async def _load(db: AsyncSession) -> DerivedSchema:
+        return DerivedSchema(
+            centroid=await _column_exists(db, Parcelle.__tablename__, "centroid"),
+            pyramid=await _table_exists(db, ParcellePyramid.__tablename__),
+            aggregate=await _table_exists(db, ParcelleAggregate.__tablename__),
+        )
+
+
+# Shared tracker used by the endpoints
+derived_schema = DerivedSchemaTracker()
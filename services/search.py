@@ -0,0 +1,310 @@
+"""
+Autocomplete search over communes, sections and parcelle references.
+
+Queries are read as "<commune> [<section> [<numero>]]" (e.g. "laon ab 123",
+"02408 AB") or as an IDU prefix (e.g. "02408000AB"). Matching is case- and
+accent-insensitive, on prefixes, so that results follow each keystroke:
+- communes are matched in memory: a sorted list of normalized names (and of
+  every word of the names, so that "etienne" finds Saint-Étienne) searched by
+  bisection, loaded from the commune table once per data version
+- sections and parcelles are read from the feuille / parcelle tables of the
+  matched communes only, through B-tree indexes on (code_insee, section) and
+  (INSEE prefix of the IDU, section, numero)
+
+Each result carries a WGS84 bbox to zoom to.
+"""
+
+import asyncio
+import bisect
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import String, any_, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import SEARCH_COMMUNE_CANDIDATES, SEARCH_SCAN_LIMIT, SOURCE_SRID, TARGET_SRID
+from models.commune import Commune
+from models.feuille import Feuille
+from models.parcelle import Parcelle
+from services.versioning import DataVersion, data_version
+
+# Complete or partial IDU: INSEE code (5), absorbed commune (3), section (2),
+# numero (4); at least the commune and the absorbed commune
+IDU_PATTERN = re.compile(r"^(?:\d{2}|2A|2B)\d{6}[0-9A-Z]{0,2}\d{0,4}$")
+
+SECTION_PATTERN = re.compile(r"^[0-9A-Z]?[A-Z]$")
+NUMERO_PATTERN = re.compile(r"^\d{1,4}$")
+INSEE_PATTERN = re.compile(r"^(?:\d{2}|2A|2B)\d{0,3}$")
+
+
+def normalize(text: str) -> str:
+    """
+    Search form of a text: lowercase, without accents, words separated by
+    single spaces ("Saint-Étienne" -> "saint etienne").
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text.lower()).split())
+
+
+def _box(geom) -> list:
+    # WGS84 bbox columns of a geometry expression
+    box = func.Box2D(func.ST_Transform(geom, TARGET_SRID))
+    return [func.ST_XMin(box), func.ST_YMin(box), func.ST_XMax(box), func.ST_YMax(box)]
+
+
+@dataclass
+class SearchQuery:
+    """
+    Parsed search text.
+
+    Attributes:
+        commune: Normalized commune name or INSEE code prefix
+        section: Section prefix (upper case)
+        numero: Parcelle number prefix, without leading zeros
+        idu: IDU prefix
+    """
+
+    commune: str = ""
+    section: Optional[str] = None
+    numero: Optional[str] = None
+    idu: Optional[str] = None
+
+
+def parse_query(text: str) -> SearchQuery:
+    """
+    Split a search text into commune, section and numero.
+
+    The section and the numero are recognized at the end of the text only
+    ("laon ab 12", "laon ab"), so that commune names keep all their words.
+    """
+    compact = re.sub(r"\s+", "", text).upper()
+    if IDU_PATTERN.match(compact):
+        return SearchQuery(idu=compact)
+
+    tokens = normalize(text).split()
+    query = SearchQuery()
+    if len(tokens) >= 3 and NUMERO_PATTERN.match(tokens[-1]) and SECTION_PATTERN.match(tokens[-2].upper()):
+        query.numero = tokens.pop().lstrip("0") or "0"
+        query.section = tokens.pop().upper()
+    elif len(tokens) >= 2 and SECTION_PATTERN.match(tokens[-1].upper()):
+        query.section = tokens.pop().upper()
+    query.commune = " ".join(tokens)
+    return query
+
+
+# =============================================================================
+# COMMUNE PREFIX INDEX
+# =============================================================================
+
+@dataclass(frozen=True)
+class CommuneEntry:
+    name: str
+    code_insee: str
+    code_departement: str
+    bbox: tuple
+
+
+class CommuneIndex:
+    """
+    In-memory prefix index of the communes.
+
+    Loaded from the database on first use, and again when the data version
+    changes. Lookups bisect sorted lists of (normalized key, position).
+    """
+
+    def __init__(self):
+        self.version: Optional[str] = None
+        self.communes: List[CommuneEntry] = []
+        self._names: List[tuple] = []
+        self._words: List[tuple] = []
+        self._codes: List[tuple] = []
+        self._lock = asyncio.Lock()
+
+    async def ensure(self, db: AsyncSession, version: DataVersion):
+        if self.version == str(version):
+            return
+        async with self._lock:
+            if self.version == str(version):
+                return
+            rows = (await db.execute(
+                select(
+                    Commune.nom_commune,
+                    Commune.code_insee,
+                    Commune.code_departement,
+                    *_box(func.ST_Envelope(Commune.geom)),
+                ).where(Commune.nom_commune.is_not(None), Commune.geom.is_not(None))
+            )).all()
+            self.load(rows)
+            self.version = str(version)
+
+    def load(self, rows):
+        """
+        Build the index from (name, code_insee, code_departement, xmin, ymin,
+        xmax, ymax) rows.
+        """
+        communes, names, words, codes = [], [], [], []
+        for name, code_insee, code_departement, *bbox in rows:
+            position = len(communes)
+            communes.append(CommuneEntry(name, code_insee, code_departement, tuple(bbox)))
+            key = normalize(name)
+            names.append((key, position))
+            parts = key.split(" ")
+            for i in range(1, len(parts)):
+                words.append((" ".join(parts[i:]), position))
+            if code_insee:
+                codes.append((code_insee.lower(), position))
+        self.communes = communes
+        self._names, self._words, self._codes = sorted(names), sorted(words), sorted(codes)
+
+    @staticmethod
+    def _scan(keys: List[tuple], prefix: str) -> List[int]:
+        # Positions whose key starts with the prefix (at most SEARCH_SCAN_LIMIT)
+        start = bisect.bisect_left(keys, (prefix,))
+        found = []
+        for key, position in keys[start:start + SEARCH_SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            found.append(position)
+        return found
+
+    def search(self, text: str, limit: int) -> List[CommuneEntry]:
+        """
+        Communes whose name (or one of its words) or INSEE code starts with
+        the normalized text.
+
+        Whole-name matches come first, shortest names first ("laon" before
+        "laons"), then matches on a later word of the name.
+        """
+        if not text:
+            return []
+        if INSEE_PATTERN.match(text.upper()):
+            groups = [self._scan(self._codes, text)]
+        else:
+            groups = [self._scan(self._names, text), self._scan(self._words, text)]
+
+        results, seen = [], set()
+        for positions in groups:
+            positions = sorted(
+                set(positions) - seen,
+                key=lambda p: (len(self.communes[p].name), self.communes[p].name)
+            )
+            for position in positions[:limit - len(results)]:
+                seen.add(position)
+                results.append(self.communes[position])
+            if len(results) >= limit:
+                break
+        return results
+
+
+# Shared commune index
+commune_index = CommuneIndex()
+
+
+# =============================================================================
+# SEARCH
+# =============================================================================
+
+def _result(kind: str, label: str, bbox, **extra) -> dict:
+    return {"type": kind, "label": label, **extra, "bbox": [float(v) for v in bbox]}
+
+
+def _commune_result(commune: CommuneEntry) -> dict:
+    return _result(
+        "commune", f"{commune.name} ({commune.code_departement})", commune.bbox, code_insee=commune.code_insee
+    )
+
+
+def _section_condition(column, section: str):
+    # Sections have two characters ("0A", "AB"): a single letter matches
+    # both the padded section and the sections starting with it
+    if len(section) == 1:
+        return or_(column == "0" + section, column.like(section + "%"))
+    return column == section
+
+
+async def search_sections(db: AsyncSession, communes: List[CommuneEntry], section: str, limit: int) -> List[dict]:
+    names = {commune.code_insee: commune.name for commune in communes}
+    query = (
+        select(Feuille.code_insee, Feuille.section, *_box(func.ST_SetSRID(func.ST_Extent(Feuille.geom), SOURCE_SRID)))
+        .where(
+            Feuille.code_insee == any_(literal(list(names), ARRAY(String))),
+            _section_condition(Feuille.section, section),
+        )
+        .group_by(Feuille.code_insee, Feuille.section)
+        .order_by(Feuille.code_insee, Feuille.section)
+        .limit(limit)
+    )
+    return [
+        _result("section", f"{names[code_insee]}, section {section_code}", bbox,
+                code_insee=code_insee, section=section_code)
+        for code_insee, section_code, *bbox in (await db.execute(query)).all()
+    ]
+
+
+async def search_parcelles(
+    db: AsyncSession,
+    communes: List[CommuneEntry],
+    section: Optional[str],
+    numero: Optional[str],
+    idu: Optional[str],
+    limit: int,
+) -> List[dict]:
+    query = select(Parcelle.idu, Parcelle.nom_com, Parcelle.section, Parcelle.numero, *_box(Parcelle.geom))
+    insee = func.left(Parcelle.idu, 5)
+
+    if idu is not None:
+        query = query.where(insee == idu[:5], Parcelle.idu.startswith(idu, autoescape=True))
+        if len(idu) >= 10:
+            # Feuille key index (INSEE, absorbed commune and section)
+            query = query.where(func.left(Parcelle.idu, 10) == idu[:10])
+    else:
+        query = query.where(
+            insee == any_(literal([commune.code_insee for commune in communes], ARRAY(String))),
+            _section_condition(Parcelle.section, section),
+            func.ltrim(Parcelle.numero, "0").startswith(numero, autoescape=True),
+        )
+
+    query = query.order_by(Parcelle.idu).limit(limit)
+    return [
+        _result("parcelle", f"{nom_com}, section {section_code}, parcelle {numero_code}", bbox, idu=parcelle_idu)
+        for parcelle_idu, nom_com, section_code, numero_code, *bbox in (await db.execute(query)).all()
+        if bbox[0] is not None
+    ]
+
+
+async def search(db: AsyncSession, text: str, limit: int) -> List[dict]:
+    """
+    Autocomplete results for a search text.
+
+    Args:
+        db: Database session
+        text: Text typed by the user
+        limit: Maximum number of results
+
+    Returns:
+        Results (type, label, identifiers and WGS84 bbox), best first
+    """
+    query = parse_query(text)
+    if query.idu is not None:
+        return await search_parcelles(db, [], None, None, query.idu, limit)
+
+    await commune_index.ensure(db, await data_version.get(db))
+    if query.section is None:
+        return [_commune_result(commune) for commune in commune_index.search(query.commune, limit)]
+
+    communes = commune_index.search(query.commune, SEARCH_COMMUNE_CANDIDATES)
+    if query.numero is not None:
+        if not communes:
+            return []
+        return await search_parcelles(db, communes, query.section, query.numero, None, limit)
+
+    # "saint ju" reads as commune "saint" + section "JU", but is more likely
+    # the beginning of a name: communes matching the whole text come first
+    results = [_commune_result(commune) for commune in commune_index.search(normalize(text), limit)]
+    if communes and len(results) < limit:
+        results += await search_sections(db, communes, query.section, limit - len(results))
+    return results
@@ -0,0 +1,203 @@
+"""
+Spatial query helpers.
+
+Shared bounding box filtering and geometry simplification for the layer
+endpoints. Filtering happens in the native SRID (Lambert 93) so that the
+spatial indexes are used; only the returned geometries are transformed to
+WGS84.
+
+Requests can also exclude the bboxes the client has already loaded
+(`exclude`): features intersecting them are left out, so that a pan only
+downloads the features new to the view (delta loading).
+"""
+
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from sqlalchemy import func, not_
+from sqlalchemy.sql import Select
+
+from config import EXCLUDE_MAX_BOXES, SOURCE_SRID, TARGET_SRID
+from services.cache import quantize_bbox, snap_bbox
+
+
+@dataclass
+class SpatialParams:
+    """
+    Common query parameters of the layer endpoints.
+
+    Attributes:
+        limit: Maximum number of features (None for no limit)
+        xmin, ymin, xmax, ymax: Bounding box (WGS84), all None if not given
+        simplify: Simplification tolerance in meters (None or 0 for none)
+        exclude: Bboxes (WGS84) already loaded by the client: features
+            intersecting them are left out
+    """
+
+    limit: Optional[int] = None
+    xmin: Optional[float] = None
+    ymin: Optional[float] = None
+    xmax: Optional[float] = None
+    ymax: Optional[float] = None
+    simplify: Optional[float] = None
+    exclude: tuple = ()
+
+    @property
+    def bbox(self) -> Optional[tuple]:
+        """
+        Bounding box as (xmin, ymin, xmax, ymax), or None if incomplete.
+        """
+        values = (self.xmin, self.ymin, self.xmax, self.ymax)
+        if all(v is not None for v in values):
+            return values
+        return None
+
+    def snapped(self) -> "SpatialParams":
+        """
+        Same parameters with the bbox snapped to the canonical grid
+        (see snap_bbox), so that similar views share one cached response.
+
+        Excluded bboxes are kept as given (they must match what the client
+        loaded), except those neither overlapping nor touching the bbox,
+        which change nothing (features crossing a shared edge intersect
+        both boxes).
+        """
+        if self.bbox is None:
+            return self
+        xmin, ymin, xmax, ymax = snap_bbox(*self.bbox)
+        exclude = tuple(
+            box for box in self.exclude
+            if box[0] <= xmax and xmin <= box[2] and box[1] <= ymax and ymin <= box[3]
+        )
+        return replace(self, xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax, exclude=exclude)
+
+    def cache_params(self) -> dict:
+        """
+        Parameters identifying a response in the cache (bbox quantized).
+        """
+        return {
+            "bbox": quantize_bbox(*self.bbox) if self.bbox is not None else None,
+            "limit": self.limit,
+            "simplify": self.simplify,
+            "exclude": tuple(quantize_bbox(*box) for box in self.exclude) or None,
+        }
+
+
+def parse_boxes(raw: Optional[str]) -> tuple:
+    """
+    Parse bboxes given as "xmin,ymin,xmax,ymax;xmin,ymin,xmax,ymax...".
+
+    Raises:
+        HTTPException: 400 on malformed or too many boxes
+    """
+    if not raw:
+        return ()
+    boxes = []
+    for part in raw.split(";"):
+        try:
+            box = tuple(float(value) for value in part.split(","))
+        except ValueError:
+            box = ()
+        if len(box) != 4 or box[0] > box[2] or box[1] > box[3]:
+            raise HTTPException(status_code=400, detail=f"Invalid bbox in exclude: {part!r}")
+        boxes.append(box)
+    if len(boxes) > EXCLUDE_MAX_BOXES:
+        raise HTTPException(status_code=400, detail=f"At most {EXCLUDE_MAX_BOXES} boxes can be excluded")
+    return tuple(boxes)
+
+
+# Query parameter of the bboxes already loaded by the client
+EXCLUDE_QUERY = Query(
+    None,
+    description=(
+        "Bboxes already loaded by the client, as xmin,ymin,xmax,ymax;... (WGS84): "
+        "features intersecting them are left out (delta loading)"
+    ),
+)
+
+
+def spatial_params(
+    limit: Optional[int] = Query(None, description="Maximum number of features to return", ge=1),
+    xmin: Optional[float] = Query(None, description="Bounding box min longitude (WGS84)"),
+    ymin: Optional[float] = Query(None, description="Bounding box min latitude (WGS84)"),
+    xmax: Optional[float] = Query(None, description="Bounding box max longitude (WGS84)"),
+    ymax: Optional[float] = Query(None, description="Bounding box max latitude (WGS84)"),
+    simplify: Optional[float] = Query(
+        None,
+        description="Geometry simplification tolerance in meters",
+        ge=0
+    ),
+    exclude: Optional[str] = EXCLUDE_QUERY,
+) -> SpatialParams:
+    """
+    FastAPI dependency collecting the common layer query parameters
+    (bbox snapped to the canonical grid).
+    """
+    return SpatialParams(limit, xmin, ymin, xmax, ymax, simplify, parse_boxes(exclude)).snapped()
+
+
+def bbox_native(xmin: float, ymin: float, xmax: float, ymax: float):
+    """
+    WGS84 bounding box transformed once to the native SRID.
+
+    Filtering native geometries against this envelope lets PostGIS use the
+    spatial index, instead of transforming every geometry to WGS84.
+    """
+    return func.ST_Transform(
+        func.ST_MakeEnvelope(xmin, ymin, xmax, ymax, TARGET_SRID),
+        SOURCE_SRID
+    )
+
+
+def output_geometry(geom, simplify: Optional[float]):
+    """
+    Geometry expression for output: optionally simplified, in WGS84.
+
+    Simplification happens in native SRID (meters) for an accurate tolerance;
+    preserve_collapsed=True keeps small geometries from disappearing.
+    """
+    if simplify and simplify > 0:
+        geom = func.ST_Simplify(geom, simplify, True)
+    return func.ST_Transform(geom, TARGET_SRID)
+
+
+def apply_spatial_filters(query: Select, geom, params: SpatialParams) -> Select:
+    """
+    Apply the bounding box filter, excluded bboxes and limit of `params` to
+    a query.
+
+    Args:
+        query: Query to filter
+        geom: Native geometry column of the layer
+        params: Layer query parameters
+
+    Returns:
+        Filtered query
+    """
+    if params.bbox is not None:
+        query = query.where(func.ST_Intersects(geom, bbox_native(*params.bbox)))
+    query = exclude_boxes(query, geom, params.exclude)
+    if params.limit is not None:
+        query = query.limit(params.limit)
+    return query
+
+
+def exclude_boxes(query: Select, geom, boxes: tuple, srid: int = SOURCE_SRID) -> Select:
+    """
+    Leave out the features intersecting any of the bboxes (WGS84).
+
+    The test is the one that selected the features of those bboxes
+    (ST_Intersects on the same geometry), so exactly the features the client
+    already holds are left out.
+
+    Args:
+        query: Query to filter
+        geom: Geometry column the bbox filter is applied to
+        boxes: Excluded bboxes
+        srid: SRID of the geometry column
+    """
+    for box in boxes:
+        envelope = bbox_native(*box) if srid == SOURCE_SRID else func.ST_MakeEnvelope(*box, srid)
+        query = query.where(not_(func.ST_Intersects(geom, envelope)))
+    return query
@@ -0,0 +1,96 @@
+"""
+Vector tile helpers.
+
+Tile addressing follows the XYZ / Web Mercator scheme (EPSG:3857) used by
+OpenStreetMap and Leaflet: zoom 0 is a single tile covering the world, and
+each zoom level splits every tile into four.
+"""
+
+import math
+
+from config import AGGREGATE_LEVELS, MVT_BUFFER, MVT_EXTENT, TILE_SIMPLIFY_TOLERANCES
+
+# Half the width of the Web Mercator world, in meters
+WEB_MERCATOR_HALF_WORLD = 20037508.342789244
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    """
+    Check that tile coordinates exist at the given zoom level.
+
+    Args:
+        z: Zoom level
+        x: Tile column
+        y: Tile row
+
+    Returns:
+        True if 0 <= x, y < 2^z
+    """
+    size = 1 << z
+    return 0 <= x < size and 0 <= y < size
+
+
+def tile_width(z: int) -> float:
+    """
+    Width of a tile in Web Mercator meters at zoom level z.
+    """
+    return 2 * WEB_MERCATOR_HALF_WORLD / (1 << z)
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    """
+    WGS84 bounds of a tile, including the MVT buffer.
+
+    Returns:
+        (xmin, ymin, xmax, ymax) in degrees
+    """
+    margin = MVT_BUFFER / MVT_EXTENT
+    size = 1 << z
+
+    def lon(tx):
+        return tx / size * 360.0 - 180.0
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / size))))
+
+    return (
+        lon(x - margin),
+        lat(min(y + 1 + margin, size)),
+        lon(x + 1 + margin),
+        lat(max(y - margin, 0)),
+    )
+
+
+def tile_simplify_tolerance(z: int) -> float:
+    """
+    Get the simplification tolerance (meters, native SRID) for a zoom level.
+
+    Mirrors getSimplifyTolerance() in static/index.html so that tiles and
+    GeoJSON responses show the same level of detail.
+
+    Args:
+        z: Zoom level
+
+    Returns:
+        Tolerance in meters (0 means no simplification)
+    """
+    for min_zoom, tolerance in TILE_SIMPLIFY_TOLERANCES:
+        if z >= min_zoom:
+            return tolerance
+    return TILE_SIMPLIFY_TOLERANCES[-1][1]
+
+
+def aggregate_level(z: int) -> str:
+    """
+    Get the parcelle aggregation level shown at a zoom level.
+
+    Args:
+        z: Zoom level
+
+    Returns:
+        Level name (see AGGREGATE_LEVELS)
+    """
+    for min_zoom, level, _ in AGGREGATE_LEVELS:
+        if z >= min_zoom:
+            return level
+    return AGGREGATE_LEVELS[-1][1]
@@ -0,0 +1,295 @@
+"""
+TopoJSON encoding of layer responses.
+
+Adjacent parcelles share almost all of their boundaries, and GeoJSON sends
+every ring in full with 9 decimal places. TopoJSON output (format=topojson)
+is much smaller and faster to parse:
+- coordinates are quantized to an integer grid of TOPOJSON_QUANTIZATION
+  steps across the requested bbox, so the precision follows the zoom level
+  (about 1/50 of a pixel)
+- rings are cut at the points where boundaries meet, and each resulting arc
+  is sent once, shared by the features on both sides
+- arcs are delta-encoded (small integers)
+
+Geometries are read as WKB and feature properties as JSON text built by
+PostGIS, inserted as-is. The map decodes the topology back to GeoJSON
+(decodeTopology() in static/index.html).
+"""
+
+import json
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Text, cast, func, literal_column
+from sqlalchemy.engine import Row
+
+from config import TOPOJSON_QUANTIZATION
+
+# Media type of TopoJSON responses (no registered type)
+TOPOJSON_MEDIA_TYPE = "application/json"
+
+
+def topology_columns(id_expr, geom_expr, properties: dict) -> list:
+    """
+    Columns of a feature query for TopoJSON output: id, properties (JSON
+    text) and geometry (WKB, already in the output SRID; None for features
+    without geometry).
+    """
+    args = [item for pair in properties.items() for item in pair]
+    return [
+        id_expr.label("id"),
+        cast(func.json_build_object(*args), Text).label("properties"),
+        (func.ST_AsBinary(geom_expr) if geom_expr is not None else literal_column("NULL::bytea")).label("wkb"),
+    ]
+
+
+# =============================================================================
+# WKB
+# =============================================================================
+
+def _read_coordinates(wkb: bytes, offset: int, order: str) -> Tuple[List[float], int]:
+    (count,) = struct.unpack_from(order + "I", wkb, offset)
+    values = list(struct.unpack_from(f"{order}{2 * count}d", wkb, offset + 4))
+    return values, offset + 4 + 16 * count
+
+
+def read_wkb(wkb: bytes, offset: int = 0) -> Tuple[str, list, int]:
+    """
+    Parse a 2D WKB geometry.
+
+    Returns:
+        (GeoJSON type, parts, end offset); parts are flat [x0, y0, x1, ...]
+        coordinate lists: one per ring for polygons, nested per polygon for
+        multipolygons
+    """
+    order = "<" if wkb[offset] == 1 else ">"
+    (kind,) = struct.unpack_from(order + "I", wkb, offset + 1)
+    offset += 5
+
+    if kind == 1:
+        return "Point", list(struct.unpack_from(order + "2d", wkb, offset)), offset + 16
+    if kind == 2:
+        line, offset = _read_coordinates(wkb, offset, order)
+        return "LineString", line, offset
+    if kind == 3:
+        (count,) = struct.unpack_from(order + "I", wkb, offset)
+        offset += 4
+        rings = []
+        for _ in range(count):
+            ring, offset = _read_coordinates(wkb, offset, order)
+            rings.append(ring)
+        return "Polygon", rings, offset
+    if kind in (4, 5, 6):
+        (count,) = struct.unpack_from(order + "I", wkb, offset)
+        offset += 4
+        parts = []
+        for _ in range(count):
+            _, part, offset = read_wkb(wkb, offset)
+            parts.append(part)
+        return ("MultiPoint", "MultiLineString", "MultiPolygon")[kind - 4], parts, offset
+    raise ValueError(f"Unsupported WKB geometry type {kind}")
+
+
+# =============================================================================
+# TOPOLOGY
+# =============================================================================
+
+class TopologyBuilder:
+    """
+    Builds shared arcs from quantized lines and rings.
+
+    A point is a junction when it is the end of a line, or when it has other
+    neighbours in another line or ring than in the first one it was seen in
+    (the point where two boundaries split). Lines and rings are cut at
+    junctions; arcs are deduplicated in both directions, a reversed arc being
+    referenced as ~index.
+    """
+
+    def __init__(self, translate: Tuple[float, float], scale: Tuple[float, float]):
+        self.translate = translate
+        self.scale = scale
+        self.arcs: List[list] = []
+        self._arc_index: Dict[tuple, int] = {}
+        self._lines: List[Tuple[list, bool]] = []
+        self._neighbours: Dict[tuple, tuple] = {}
+        self._junctions = set()
+
+    def quantize(self, coordinates: Sequence[float]) -> list:
+        """
+        Quantized points of a flat coordinate list, without repeated points.
+
+        Coordinates are not below the translation (data extent), so rounding
+        is int(v + 0.5).
+        """
+        x0, y0 = self.translate
+        fx, fy = 1 / self.scale[0], 1 / self.scale[1]
+        points = list(zip(
+            [int((x - x0) * fx + 0.5) for x in coordinates[0::2]],
+            [int((y - y0) * fy + 0.5) for y in coordinates[1::2]],
+        ))
+        return [point for i, point in enumerate(points) if i == 0 or point != points[i - 1]]
+
+    def add(self, points: list, closed: bool) -> int:
+        """
+        Register a quantized line or ring (first pass).
+
+        Returns:
+            Handle for arcs_of()
+        """
+        if closed and len(points) > 1 and points[0] == points[-1]:
+            points = points[:-1]
+        n = len(points)
+        neighbours, junctions = self._neighbours, self._junctions
+        for i, point in enumerate(points):
+            if closed:
+                before, after = points[i - 1], points[(i + 1) % n]
+            else:
+                if i == 0 or i == n - 1:
+                    junctions.add(point)
+                    continue
+                before, after = points[i - 1], points[i + 1]
+            pair = (before, after) if before < after else (after, before)
+            seen = neighbours.setdefault(point, pair)
+            if seen != pair:
+                junctions.add(point)
+        self._lines.append((points, closed))
+        return len(self._lines) - 1
+
+    def _arc(self, points: list) -> int:
+        key = tuple(points)
+        index = self._arc_index.get(key)
+        if index is not None:
+            return index
+        index = self._arc_index.get(key[::-1])
+        if index is not None:
+            return ~index
+
+        index = len(self.arcs)
+        self._arc_index[key] = index
+        x, y = points[0]
+        encoded = [[x, y]]
+        for px, py in points[1:]:
+            encoded.append([px - x, py - y])
+            x, y = px, py
+        self.arcs.append(encoded)
+        return index
+
+    def arcs_of(self, handle: int) -> List[int]:
+        """
+        Arc indexes of a registered line or ring (second pass).
+        """
+        points, closed = self._lines[handle]
+        junctions = self._junctions
+        if not points:
+            return []
+
+        if closed:
+            cuts = [i for i, point in enumerate(points) if point in junctions]
+            if not cuts:
+                # Ring without junction: canonical start and direction, so
+                # that a hole and the island filling it share their arc
+                start = points.index(min(points))
+                ring = points[start:] + points[:start]
+                forward = ring + [ring[0]]
+                backward = [ring[0]] + ring[:0:-1] + [ring[0]]
+                if backward[1] < forward[1]:
+                    return [~self._arc(backward)]
+                return [self._arc(forward)]
+            start = cuts[0]
+            ring = points[start:] + points[:start] + [points[start]]
+            cuts = [i - start for i in cuts] + [len(points)]
+            return [self._arc(ring[a:b + 1]) for a, b in zip(cuts, cuts[1:])]
+
+        cuts = [i for i, point in enumerate(points) if point in junctions]
+        return [self._arc(points[a:b + 1]) for a, b in zip(cuts, cuts[1:])]
+
+
+def _geometry_extent(geometries: list) -> Optional[tuple]:
+    xs, ys = [], []
+
+    def walk(part):
+        if part and isinstance(part[0], list):
+            for child in part:
+                walk(child)
+        elif part:
+            xs.extend((min(part[0::2]), max(part[0::2])))
+            ys.extend((min(part[1::2]), max(part[1::2])))
+
+    for _, parts in geometries:
+        walk(parts)
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def encode_topology(name: str, rows: Sequence[Row], bounds: Optional[tuple] = None) -> bytes:
+    """
+    Encode features as a quantized TopoJSON Topology.
+
+    Args:
+        name: Name of the GeometryCollection object (layer name)
+        rows: Rows with id, properties (JSON text) and wkb columns
+        bounds: WGS84 bbox of the request: the quantization step is its
+            size / TOPOJSON_QUANTIZATION (data extent if None)
+
+    Returns:
+        Serialized Topology
+    """
+    geometries = [read_wkb(bytes(row.wkb))[:2] if row.wkb is not None else (None, None) for row in rows]
+    extent = _geometry_extent([g for g in geometries if g[0] is not None])
+    if extent is None:
+        extent = bounds or (0.0, 0.0, 1.0, 1.0)
+    span = bounds or extent
+    scale = (
+        max(span[2] - span[0], 1e-9) / TOPOJSON_QUANTIZATION,
+        max(span[3] - span[1], 1e-9) / TOPOJSON_QUANTIZATION,
+    )
+    builder = TopologyBuilder((extent[0], extent[1]), scale)
+
+    # First pass: quantize and find junctions
+    shapes = []
+    for kind, parts in geometries:
+        if kind is None:
+            shapes.append(None)
+        elif kind == "Point":
+            shapes.append(builder.quantize(parts)[0])
+        elif kind == "MultiPoint":
+            shapes.append([builder.quantize(point)[0] for point in parts])
+        elif kind == "LineString":
+            shapes.append(builder.add(builder.quantize(parts), False))
+        elif kind == "MultiLineString":
+            shapes.append([builder.add(builder.quantize(line), False) for line in parts])
+        elif kind == "Polygon":
+            shapes.append([builder.add(builder.quantize(ring), True) for ring in parts])
+        else:
+            shapes.append([[builder.add(builder.quantize(ring), True) for ring in polygon] for polygon in parts])
+
+    # Second pass: cut into shared arcs
+    objects = []
+    for row, (kind, _), shape in zip(rows, geometries, shapes):
+        if kind is None:
+            geometry = {"type": None}
+        elif kind in ("Point", "MultiPoint"):
+            geometry = {"type": kind, "coordinates": [list(p) for p in shape] if kind == "MultiPoint" else list(shape)}
+        elif kind == "LineString":
+            geometry = {"type": kind, "arcs": builder.arcs_of(shape)}
+        elif kind in ("MultiLineString", "Polygon"):
+            geometry = {"type": kind, "arcs": [builder.arcs_of(handle) for handle in shape]}
+        else:
+            geometry = {"type": kind, "arcs": [[builder.arcs_of(handle) for handle in polygon] for polygon in shape]}
+        geometry["id"] = row.id
+        text = json.dumps(geometry, separators=(",", ":"))
+        objects.append(text[:-1] + ',"properties":' + (row.properties or "{}") + "}")
+
+    head = json.dumps({
+        "type": "Topology",
+        "bbox": list(extent),
+        "transform": {"scale": list(scale), "translate": [extent[0], extent[1]]},
+    }, separators=(",", ":"))
+    return (
+        head[:-1]
+        + ',"objects":{' + json.dumps(name) + ':{"type":"GeometryCollection","geometries":['
+        + ",".join(objects)
+        + ']}},"arcs":' + json.dumps(builder.arcs, separators=(",", ":"))
+        + "}"
+    ).encode("utf-8")
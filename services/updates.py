@@ -0,0 +1,433 @@
+"""
+Incremental edition updates.
+
+Applies a new Parcellaire Express delivery feuille by feuille instead of
+reloading everything:
+1. the delivery is loaded into staging tables (same columns as the layer
+   tables, see create_staging)
+2. diff_feuilles() compares the staging feuilles with the current ones of
+   the same départements: feuilles whose edition changed (or every feuille)
+   get a hash of their row, parcelles, subdivisions and buildings, old and new
+3. apply_feuille() replaces the changed rows of one feuille in its own
+   transaction (parcelles are updated in place, so unchanged ones keep their
+   gid); feuilles whose content did not change only get their new edition
+4. finish_update() refreshes the derived data of the affected parcelles and
+   records a data change with the extent of the changed feuilles, so that
+   caches only drop the responses of that area (see services/versioning.py)
+
+Buildings are not linked to a feuille in the source data: they belong to the
+feuille containing their point on surface.
+
+These functions are synchronous and meant for scripts (see
+scripts/update_edition.py).
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from geoalchemy2 import Geometry
+from sqlalchemy import func, text
+from sqlalchemy.engine import Connection
+
+from config import SOURCE_SRID, TARGET_SRID, UPDATE_CHANGE_MARGIN
+from services.derived import refresh_aggregates, refresh_centroids, refresh_pyramid
+from services.ingest import LAYERS
+from services.versioning import record_data_change
+
+logger = logging.getLogger(__name__)
+
+# Layers compared and updated per feuille
+UPDATE_LAYERS = ["feuille", "parcelle", "subdivision_fiscale", "batiments"]
+
+# Indexes of the layer tables used by the per-feuille diff and updates,
+# created if missing (tables loaded by ogr2ogr or shp2pgsql lack them)
+UPDATE_INDEXES = ["ix_parcelle_feuille_key", "ix_parcelle_idu", "ix_subdivision_fiscale_idu_parcelle"]
+
+STAGING_PREFIX = "staging_"
+DIFF_TABLE = STAGING_PREFIX + "feuille_diff"
+
+# Feuille key: département, commune, absorbed commune, section, sheet number.
+# The first 10 characters of a parcelle IDU are the same prefix.
+FEUILLE_PREFIX = "{a}.code_departement || {a}.code_commune || {a}.commune_abs || lpad({a}.section, 2, '0')"
+
+
+def staging_table(layer: str) -> str:
+    """
+    Name of the staging table of a layer.
+    """
+    return STAGING_PREFIX + LAYERS[layer].table.name
+
+
+def _columns(layer: str) -> List[str]:
+    return [column.name for column in LAYERS[layer].columns()]
+
+
+def _row_hash(layer: str, alias: str, exclude: tuple = ()) -> str:
+    # Hash of the loaded columns of a row (geometries compared as WKB)
+    values = [
+        f"ST_AsBinary({alias}.{column.name})" if isinstance(column.type, Geometry) else f"{alias}.{column.name}"
+        for column in LAYERS[layer].columns()
+        if column.name not in exclude
+    ]
+    return f"md5(row({', '.join(values)})::text)"
+
+
+def _hash_agg(layer: str, alias: str) -> str:
+    # Order-independent hash of a set of rows
+    row_hash = _row_hash(layer, alias)
+    return f"md5(string_agg({row_hash}, ',' ORDER BY {row_hash}))"
+
+
+def _in_feuille(alias: str, prefix: str = ":prefix", number: str = ":number") -> str:
+    # Parcelles of a feuille (matches ix_parcelle_feuille_key)
+    return f"left({alias}.idu, 10) = {prefix} AND {alias}.feuille = {number}"
+
+
+# =============================================================================
+# STAGING
+# =============================================================================
+
+def create_staging(conn: Connection, layers: List[str] = UPDATE_LAYERS):
+    """
+    Create empty staging tables for a delivery.
+
+    Staging tables are unlogged and only keep the primary key sequence of
+    the layer tables: they are rebuilt from the delivery files on every update.
+    """
+    for layer in layers:
+        table = LAYERS[layer].table
+        staging = staging_table(layer)
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+        conn.execute(text(f"CREATE UNLOGGED TABLE {staging} AS SELECT * FROM {table.name} WITH NO DATA"))
+        for column in table.primary_key.columns:
+            conn.execute(text(f"ALTER TABLE {staging} ALTER COLUMN {column.name} SET NOT NULL"))
+            conn.execute(text(
+                f"ALTER TABLE {staging} ALTER COLUMN {column.name} ADD GENERATED BY DEFAULT AS IDENTITY"
+            ))
+
+
+def index_staging(conn: Connection):
+    """
+    Index and analyze the loaded staging tables for the comparison.
+    """
+    parcelle = staging_table("parcelle")
+    conn.execute(text(f"CREATE INDEX ON {parcelle} (left(idu, 10), feuille)"))
+    conn.execute(text(f"CREATE INDEX ON {parcelle} (idu)"))
+    conn.execute(text(f"CREATE INDEX ON {staging_table('subdivision_fiscale')} (idu_parcelle)"))
+    conn.execute(text(f"CREATE INDEX ON {staging_table('batiments')} USING gist (geom)"))
+    for layer in UPDATE_LAYERS:
+        conn.execute(text(f"ANALYZE {staging_table(layer)}"))
+
+
+def drop_staging(conn: Connection):
+    """
+    Drop the staging tables.
+    """
+    for table in [DIFF_TABLE] + [staging_table(layer) for layer in UPDATE_LAYERS]:
+        conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+
+# =============================================================================
+# COMPARISON
+# =============================================================================
+
+@dataclass
+class FeuilleChange:
+    """
+    Changed feuille of a delivery.
+
+    Attributes:
+        prefix: First 10 characters of the IDUs of the feuille
+        number: Feuille number
+        old_id: Current feuille row id (None for a new feuille)
+        new_id: Staging feuille row id (None for a removed feuille)
+        layers: Layers whose rows changed in this feuille
+    """
+
+    prefix: str
+    number: int
+    old_id: Optional[int]
+    new_id: Optional[int]
+    layers: List[str] = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        return f"{self.prefix}-{self.number}"
+
+
+def _content_hashes(side: str) -> str:
+    # Hashes of the content of each compared feuille, current ("old") or
+    # staging ("new") side
+    feuille = "feuille" if side == "old" else staging_table("feuille")
+    parcelle = "parcelle" if side == "old" else staging_table("parcelle")
+    subdivision = "subdivision_fiscale" if side == "old" else staging_table("subdivision_fiscale")
+    batiments = "batiments" if side == "old" else staging_table("batiments")
+    feuille_id = f"d.{side}_id"
+
+    return f"""
+        UPDATE {DIFF_TABLE} AS d SET
+            {side}_feuille = (
+                SELECT {_row_hash("feuille", "f", exclude=("edition",))} FROM {feuille} AS f WHERE f.id = {feuille_id}
+            ),
+            {side}_parcelle = (
+                SELECT {_hash_agg("parcelle", "p")} FROM {parcelle} AS p
+                WHERE {_in_feuille("p", "d.prefix", "d.number")}
+            ),
+            {side}_subdivision_fiscale = (
+                SELECT {_hash_agg("subdivision_fiscale", "s")}
+                FROM {subdivision} AS s JOIN {parcelle} AS p ON p.idu = s.idu_parcelle
+                WHERE {_in_feuille("p", "d.prefix", "d.number")}
+            ),
+            {side}_batiments = (
+                SELECT {_hash_agg("batiments", "b")}
+                FROM {batiments} AS b JOIN {feuille} AS f ON f.id = {feuille_id}
+                WHERE b.geom && f.geom AND ST_Intersects(f.geom, ST_PointOnSurface(b.geom))
+            )
+        WHERE {feuille_id} IS NOT NULL
+    """
+
+
+def diff_feuilles(conn: Connection, full_compare: bool = False) -> tuple:
+    """
+    Compare the staging feuilles with the current ones.
+
+    Only the départements present in the delivery are compared (feuilles of
+    other départements are never removed).
+
+    Args:
+        conn: Database connection
+        full_compare: Compare every feuille, not only those whose edition
+            changed (deliveries that keep the edition of modified feuilles)
+
+    Returns:
+        (changed feuilles as FeuilleChange, number of edition-only changes)
+    """
+    started = time.perf_counter()
+    prefix = FEUILLE_PREFIX.format(a="f")
+    edition_changed = "TRUE" if full_compare else "o.edition IS DISTINCT FROM n.edition"
+
+    conn.execute(text(f"DROP TABLE IF EXISTS {DIFF_TABLE}"))
+    conn.execute(text(f"""
+        CREATE UNLOGGED TABLE {DIFF_TABLE} AS
+        SELECT
+            coalesce(o.prefix, n.prefix) AS prefix,
+            coalesce(o.number, n.number) AS number,
+            o.id AS old_id, n.id AS new_id,
+            n.edition AS new_edition,
+            coalesce(o.box, n.box) AS old_box,
+            coalesce(n.box, o.box) AS new_box,
+            NULL::text AS old_feuille, NULL::text AS new_feuille,
+            NULL::text AS old_parcelle, NULL::text AS new_parcelle,
+            NULL::text AS old_subdivision_fiscale, NULL::text AS new_subdivision_fiscale,
+            NULL::text AS old_batiments, NULL::text AS new_batiments
+        FROM (
+            SELECT f.id, f.edition, f.feuille AS number, {prefix} AS prefix, ST_Envelope(f.geom) AS box
+            FROM feuille AS f
+            WHERE f.code_departement IN (SELECT DISTINCT code_departement FROM {staging_table("feuille")})
+        ) AS o
+        FULL JOIN (
+            SELECT f.id, f.edition, f.feuille AS number, {prefix} AS prefix, ST_Envelope(f.geom) AS box
+            FROM {staging_table("feuille")} AS f
+        ) AS n ON n.prefix = o.prefix AND n.number = o.number
+        WHERE o.id IS NULL OR n.id IS NULL OR {edition_changed}
+    """))
+
+    conn.execute(text(_content_hashes("old")))
+    conn.execute(text(_content_hashes("new")))
+
+    changes = []
+    edition_only = 0
+    rows = conn.execute(text(f"SELECT * FROM {DIFF_TABLE} ORDER BY prefix, number")).mappings()
+    for row in rows:
+        change = FeuilleChange(row["prefix"], row["number"], row["old_id"], row["new_id"])
+        change.layers = [
+            layer for layer in UPDATE_LAYERS
+            if row[f"old_{layer}"] != row[f"new_{layer}"]
+        ]
+        if change.old_id is None or change.new_id is None or change.layers:
+            changes.append(change)
+        else:
+            edition_only += 1
+
+    logger.info(
+        "%d feuilles changed, %d with a new edition only (compared in %.1fs)",
+        len(changes), edition_only, time.perf_counter() - started
+    )
+    return changes, edition_only
+
+
+# =============================================================================
+# APPLY
+# =============================================================================
+
+def _replace_rows(conn: Connection, change: FeuilleChange, layer: str):
+    # Replace the subdivisions or buildings of a feuille
+    table = LAYERS[layer].table.name
+    columns = ", ".join(_columns(layer))
+    values = ", ".join(f"x.{name}" for name in _columns(layer))
+    params = {"prefix": change.prefix, "number": change.number, "old_id": change.old_id, "new_id": change.new_id}
+
+    if layer == "subdivision_fiscale":
+        conn.execute(text(
+            f"DELETE FROM {table} AS x USING parcelle AS p "
+            f"WHERE p.idu = x.idu_parcelle AND {_in_feuille('p')}"
+        ), params)
+        conn.execute(text(
+            f"INSERT INTO {table} ({columns}) SELECT {values} "
+            f"FROM {staging_table(layer)} AS x JOIN {staging_table('parcelle')} AS p ON p.idu = x.idu_parcelle "
+            f"WHERE {_in_feuille('p')}"
+        ), params)
+    else:
+        conn.execute(text(
+            f"DELETE FROM {table} AS x USING feuille AS f "
+            f"WHERE f.id = :old_id AND x.geom && f.geom AND ST_Intersects(f.geom, ST_PointOnSurface(x.geom))"
+        ), params)
+        conn.execute(text(
+            f"INSERT INTO {table} ({columns}) SELECT {values} "
+            f"FROM {staging_table(layer)} AS x JOIN {staging_table('feuille')} AS f ON f.id = :new_id "
+            f"WHERE x.geom && f.geom AND ST_Intersects(f.geom, ST_PointOnSurface(x.geom))"
+        ), params)
+
+
+def _apply_parcelles(conn: Connection, change: FeuilleChange) -> tuple:
+    # Delete, update and insert the parcelles of a feuille, matched by IDU
+    staging = staging_table("parcelle")
+    names = _columns("parcelle")
+    params = {"prefix": change.prefix, "number": change.number}
+
+    deleted = conn.execute(text(
+        f"DELETE FROM parcelle AS p WHERE {_in_feuille('p')} "
+        f"AND NOT EXISTS (SELECT 1 FROM {staging} AS n WHERE n.idu = p.idu AND {_in_feuille('n')}) "
+        f"RETURNING p.gid"
+    ), params).scalars().all()
+
+    updated = conn.execute(text(
+        f"UPDATE parcelle AS p SET {', '.join(f'{name} = n.{name}' for name in names)} "
+        f"FROM {staging} AS n "
+        f"WHERE {_in_feuille('p')} AND {_in_feuille('n')} AND n.idu = p.idu "
+        f"AND {_row_hash('parcelle', 'p')} <> {_row_hash('parcelle', 'n')} "
+        f"RETURNING p.gid"
+    ), params).scalars().all()
+
+    inserted = conn.execute(text(
+        f"INSERT INTO parcelle ({', '.join(names)}) "
+        f"SELECT {', '.join(f'n.{name}' for name in names)} FROM {staging} AS n "
+        f"WHERE {_in_feuille('n')} "
+        f"AND NOT EXISTS (SELECT 1 FROM parcelle AS p WHERE p.idu = n.idu AND {_in_feuille('p')}) "
+        f"RETURNING gid"
+    ), params).scalars().all()
+
+    return deleted, updated + inserted
+
+
+def _apply_feuille_row(conn: Connection, change: FeuilleChange):
+    # Replace, add or remove the feuille row itself
+    names = _columns("feuille")
+    params = {"old_id": change.old_id, "new_id": change.new_id}
+    if change.new_id is None:
+        conn.execute(text("DELETE FROM feuille WHERE id = :old_id"), params)
+    elif change.old_id is None:
+        conn.execute(text(
+            f"INSERT INTO feuille ({', '.join(names)}) "
+            f"SELECT {', '.join(names)} FROM {staging_table('feuille')} WHERE id = :new_id"
+        ), params)
+    else:
+        conn.execute(text(
+            f"UPDATE feuille AS f SET {', '.join(f'{name} = n.{name}' for name in names)} "
+            f"FROM {staging_table('feuille')} AS n WHERE f.id = :old_id AND n.id = :new_id"
+        ), params)
+
+
+def apply_feuille(conn: Connection, change: FeuilleChange) -> tuple:
+    """
+    Apply the changes of one feuille (call inside its own transaction).
+
+    Subdivisions and buildings are replaced when their hash differs,
+    parcelles are deleted, updated in place or inserted by IDU.
+
+    Returns:
+        (gids of deleted parcelles, gids of updated or inserted parcelles)
+    """
+    # Subdivisions first: they are matched through the current parcelles
+    for layer in ("subdivision_fiscale", "batiments"):
+        if layer in change.layers or change.old_id is None or change.new_id is None:
+            _replace_rows(conn, change, layer)
+
+    deleted, changed = [], []
+    if "parcelle" in change.layers or change.old_id is None or change.new_id is None:
+        deleted, changed = _apply_parcelles(conn, change)
+
+    _apply_feuille_row(conn, change)
+    return deleted, changed
+
+
+def apply_editions(conn: Connection) -> int:
+    """
+    Update the edition of the compared feuilles whose content did not change.
+
+    Returns:
+        Number of feuilles updated
+    """
+    result = conn.execute(text(
+        f"UPDATE feuille AS f SET edition = d.new_edition FROM {DIFF_TABLE} AS d "
+        f"WHERE f.id = d.old_id AND f.edition IS DISTINCT FROM d.new_edition"
+    ))
+    return result.rowcount
+
+
+def parcelles_of(conn: Connection, changes: List[FeuilleChange]) -> List[int]:
+    """
+    Gids of the current parcelles of the given feuilles.
+    """
+    gids = []
+    for change in changes:
+        gids.extend(conn.execute(
+            text(f"SELECT gid FROM parcelle AS p WHERE {_in_feuille('p')}"),
+            {"prefix": change.prefix, "number": change.number},
+        ).scalars())
+    return gids
+
+
+def finish_update(
+    conn: Connection,
+    deleted: List[int],
+    changed: List[int],
+    stale_cells: dict,
+    feuilles: int,
+) -> int:
+    """
+    Refresh the derived data of the affected parcelles and record the change.
+
+    Call only if diff_feuilles() found differences: the recorded extent is
+    the one of the compared feuilles.
+
+    Args:
+        conn: Database connection (inside a transaction)
+        deleted: Gids of deleted parcelles
+        changed: Gids of updated or inserted parcelles
+        stale_cells: Aggregation cells of the parcelles before the update
+            (see services.derived.aggregate_cells)
+        feuilles: Number of changed feuilles
+
+    Returns:
+        Data change number
+    """
+    refresh_centroids(conn, changed)
+    refresh_pyramid(conn, changed + deleted)
+    refresh_aggregates(conn, changed, cells=stale_cells)
+
+    # One box per compared feuille (old and new extent), in WGS84
+    extent = conn.execute(text(
+        f"SELECT ST_AsEWKT(ST_Multi(ST_Collect(ST_Envelope(ST_Transform("
+        f"ST_SetSRID(ST_Expand(ST_Envelope(ST_Collect(old_box, new_box)), :margin), {SOURCE_SRID}), "
+        f"{TARGET_SRID}))))) FROM {DIFF_TABLE}"
+    ), {"margin": UPDATE_CHANGE_MARGIN}).scalar()
+
+    return record_data_change(
+        conn,
+        "edition update",
+        extent=func.ST_GeomFromEWKT(extent) if extent else None,
+        feuilles=feuilles,
+    )
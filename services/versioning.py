@@ -0,0 +1,218 @@
+"""
+Data version tracking.
+
+The cadastral data only changes when data is loaded: a full reload (new
+Parcellaire Express delivery, refresh of the derived tables) or an incremental
+edition update limited to the changed feuilles. Each load is recorded in the
+data_change table, and the data version tells caches whether their entries
+are still valid:
+- the generation changes on full reloads: every cached entry is dropped
+- the stamp (latest change number) changes on every load; entries built
+  before an incremental update are only invalid if their area intersects
+  the changed area
+
+Databases without a recorded full reload fall back to the latest feuille
+edition as generation; scripts.update_edition records one (record_baseline)
+before its first update.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import DATA_VERSION_TTL
+from models.data_change import DataChange
+from models.feuille import Feuille
+
+
+def _intersects(a: tuple, b: tuple) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+@dataclass(frozen=True)
+class DataVersion:
+    """
+    Version of the loaded data.
+
+    Attributes:
+        generation: Identifier of the last full reload
+        stamp: Number of the latest change (0 if none is recorded)
+        changes: Incremental changes since the last full reload, as
+            (change number, tuple of (xmin, ymin, xmax, ymax) WGS84 boxes)
+    """
+
+    generation: str
+    stamp: int = 0
+    changes: tuple = ()
+
+    def __str__(self) -> str:
+        return f"{self.generation}.{self.stamp}"
+
+    def changed_since(self, stamp: int, bounds: Optional[tuple]) -> bool:
+        """
+        Check whether data changed after `stamp` within `bounds`.
+
+        Args:
+            stamp: Stamp of the data version a cached entry was built with
+            bounds: WGS84 (xmin, ymin, xmax, ymax) the entry depends on,
+                or None if it depends on all the data
+
+        Returns:
+            True if the entry is stale
+        """
+        for change, boxes in self.changes:
+            if change <= stamp:
+                continue
+            if bounds is None or any(_intersects(box, bounds) for box in boxes):
+                return True
+        return False
+
+
+class DataVersionTracker:
+    """
+    Cached lookup of the current data version.
+
+    The version is read from the database at most once every `ttl` seconds,
+    so that checking it does not add a query to every request.
+
+    Attributes:
+        ttl: Number of seconds a version read from the database is trusted
+    """
+
+    def __init__(self, ttl: float = DATA_VERSION_TTL):
+        self.ttl = ttl
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    async def get(self, db: AsyncSession) -> DataVersion:
+        """
+        Get the current data version.
+
+        Args:
+            db: Database session used when the cached version has expired
+
+        Returns:
+            Data version
+        """
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < self.ttl:
+                return self._version
+
+        version = await self._load(db)
+
+        with self._lock:
+            self._version = version
+            self._checked_at = time.monotonic()
+        return version
+
+    @property
+    def current(self) -> Optional[DataVersion]:
+        """
+        Last version read from the database (None before the first read),
+        without checking it.
+        """
+        with self._lock:
+            return self._version
+
+    def reset(self):
+        """
+        Forget the cached version (next call to get() reads the database).
+        """
+        with self._lock:
+            self._version = None
+            self._checked_at = 0.0
+
+    @staticmethod
+    async def _load(db: AsyncSession) -> DataVersion:
+        # Latest Parcellaire Express edition present in the feuille table
+        edition = (await db.execute(select(func.max(Feuille.edition)))).scalar()
+        edition = str(edition) if edition is not None else "0"
+
+        if (await db.execute(text(f"SELECT to_regclass('{DataChange.__tablename__}')"))).scalar() is None:
+            return DataVersion(edition)
+
+        stamp, full = (await db.execute(select(
+            func.coalesce(func.max(DataChange.id), 0),
+            func.coalesce(func.max(DataChange.id).filter(DataChange.extent.is_(None)), 0),
+        ))).one()
+
+        # Changed areas since the last full reload, one box per feuille
+        rows = (await db.execute(text(
+            f"SELECT c.id, ST_XMin(d.geom), ST_YMin(d.geom), ST_XMax(d.geom), ST_YMax(d.geom) "
+            f"FROM {DataChange.__tablename__} AS c, ST_Dump(c.extent) AS d "
+            f"WHERE c.id > :full ORDER BY c.id"
+        ), {"full": full})).all()
+
+        boxes = {}
+        for change, *box in rows:
+            boxes.setdefault(change, []).append(tuple(box))
+
+        return DataVersion(
+            generation=f"g{full}" if full else edition,
+            stamp=stamp,
+            changes=tuple((change, tuple(b)) for change, b in boxes.items()),
+        )
+
+
+def record_data_change(
+    conn: Connection,
+    description: str,
+    extent=None,
+    feuilles: Optional[int] = None,
+) -> int:
+    """
+    Record a data change (bumps the data version marker).
+
+    Synchronous, for scripts (inside the transaction of the change).
+
+    Args:
+        conn: Database connection
+        description: What was loaded
+        extent: Changed area (MultiPolygon expression in WGS84), or None for
+            a full reload
+        feuilles: Number of changed feuilles
+
+    Returns:
+        Change number
+    """
+    DataChange.__table__.create(conn, checkfirst=True)
+    return conn.execute(
+        insert(DataChange)
+        .values(description=description, feuilles=feuilles, extent=extent)
+        .returning(DataChange.id)
+    ).scalar()
+
+
+def record_baseline(conn: Connection) -> Optional[int]:
+    """
+    Record the loaded data as a full reload if none is recorded yet.
+
+    Without a recorded full reload (data loaded with ogr2ogr or shp2pgsql),
+    the generation is the latest feuille edition, which every incremental
+    update changes, dropping every cached entry. Called before an
+    incremental update, so that only its first run resets the caches and
+    the following ones stay limited to their area.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        Change number, or None if a full reload was already recorded
+    """
+    DataChange.__table__.create(conn, checkfirst=True)
+    full = conn.execute(
+        select(DataChange.id).where(DataChange.extent.is_(None)).limit(1)
+    ).scalar()
+    if full is not None:
+        return None
+    return record_data_change(conn, "baseline")
+
+
+# Shared tracker used by the caches
+data_version = DataVersionTracker()
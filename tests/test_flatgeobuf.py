@@ -0,0 +1,62 @@
+"""
+FlatGeobuf writer, read back through GDAL (pyogrio).
+"""
+
+import math
+
+import pytest
+from shapely import from_wkb
+from shapely.geometry import MultiPolygon, Polygon
+
+from services.flatgeobuf import INT, STRING, FlatGeobufWriter
+
+pyogrio = pytest.importorskip("pyogrio")
+
+
+def squares(count: int) -> list:
+    return [
+        MultiPolygon([Polygon([(x, y), (x + 1, y), (x + 1, y + 1), (x, y + 1)])])
+        for x in range(count) for y in range(count)
+    ]
+
+
+def test_written_file_reads_back(tmp_path):
+    geometries = squares(12)
+    writer = FlatGeobufWriter("parcelle", [("idu", STRING), ("contenance", INT)], srid=4326)
+    for i, geometry in enumerate(geometries):
+        writer.add(geometry.wkb, (f"02408000AB{i:04d}", None if i % 7 == 0 else i * 10))
+    writer.add(None, ("no geometry", 0))
+    path = tmp_path / "parcelle.fgb"
+    with open(path, "wb") as output:
+        writer.finish(output)
+
+    info = pyogrio.read_info(path)
+    assert info["features"] == len(geometries)
+    assert info["geometry_type"] == "MultiPolygon"
+    assert info["crs"] == "EPSG:4326"
+    assert list(info["fields"]) == ["idu", "contenance"]
+    assert tuple(info["total_bounds"]) == (0, 0, 12, 12)
+
+    _, _, wkbs, (idus, contenances) = pyogrio.raw.read(path)
+    # Features are written in spatial (Hilbert) order
+    by_idu = dict(zip(idus, zip(wkbs, contenances)))
+    for i, geometry in enumerate(geometries):
+        wkb, contenance = by_idu[f"02408000AB{i:04d}"]
+        assert from_wkb(wkb).equals(geometry)
+        if i % 7 == 0:
+            # Null integer field (read as NaN)
+            assert math.isnan(contenance)
+        else:
+            assert contenance == i * 10
+
+
+def test_spatial_filter_uses_index(tmp_path):
+    writer = FlatGeobufWriter("parcelle", [("idu", STRING)], srid=4326)
+    for i, geometry in enumerate(squares(20)):
+        writer.add(geometry.wkb, (str(i),))
+    path = tmp_path / "parcelle.fgb"
+    with open(path, "wb") as output:
+        writer.finish(output)
+
+    _, _, wkbs, _ = pyogrio.raw.read(path, bbox=(2.5, 2.5, 4.5, 4.5))
+    assert len(wkbs) == 9
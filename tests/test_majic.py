@@ -0,0 +1,65 @@
+"""
+MAJIC client batching and caching, against the local API stub.
+"""
+
+import asyncio
+
+import pytest
+
+from scripts import majic_stub
+from services.majic import MajicClient
+
+httpx = pytest.importorskip("httpx")
+
+
+def make_client() -> MajicClient:
+    return MajicClient(
+        base_url="http://majic-stub",
+        token="stub",
+        rate_limit=1000,
+        batch_size=50,
+        transport=httpx.ASGITransport(app=majic_stub.app),
+    )
+
+
+def test_lookups_are_batched_then_cached(monkeypatch):
+    monkeypatch.setattr(majic_stub, "LATENCY", 0)
+    monkeypatch.setattr(majic_stub, "stats", {"requests": 0, "idus": 0})
+    idus = [f"02408000AB{i:04d}" for i in range(230)]
+    lookups = idus + idus[:10]
+
+    async def run():
+        client = make_client()
+        try:
+            first = await asyncio.gather(*(client.get_owners(idu) for idu in lookups))
+            requests = client.requests
+            again = await client.get_owners_batch(idus)
+        finally:
+            await client.aclose()
+        return first, requests, again, client
+
+    first, requests, again, client = asyncio.run(run())
+
+    # 240 lookups of 230 IDUs: one request per 50 IDUs
+    assert requests == 5
+    assert majic_stub.stats == {"requests": 5, "idus": 230}
+    assert first == [majic_stub.fake_owners(idu) for idu in lookups]
+
+    # Repeat served from the cache
+    assert client.requests == 5
+    assert again == {idu: majic_stub.fake_owners(idu) for idu in idus}
+    assert client.cache.hits == len(idus)
+
+
+def test_failed_batch_returns_none(monkeypatch):
+    monkeypatch.setattr(majic_stub, "LATENCY", 0)
+
+    async def run():
+        client = make_client()
+        client.token = ""
+        try:
+            return await client.get_owners_batch(["02408000AB0001", "02408000AB0002"])
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == {"02408000AB0001": None, "02408000AB0002": None}
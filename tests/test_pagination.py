@@ -0,0 +1,29 @@
+"""
+Keyset pagination cursors.
+"""
+
+import pytest
+
+from services.pagination import decode_cursor, encode_cursor
+
+FILTERS = {"code_dep": "02", "section": "AB", "bbox": None}
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(123456, FILTERS)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, FILTERS) == 123456
+    # Key order of the filters does not matter
+    assert decode_cursor(cursor, dict(reversed(list(FILTERS.items())))) == 123456
+
+
+def test_cursor_rejects_other_filters():
+    cursor = encode_cursor(123456, FILTERS)
+    with pytest.raises(ValueError, match="does not match"):
+        decode_cursor(cursor, {**FILTERS, "section": "AC"})
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "eyJrIjoieCJ9"])
+def test_cursor_rejects_malformed(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, FILTERS)
@@ -0,0 +1,56 @@
+"""
+Bbox snapping and exclude boxes of the layer endpoints.
+"""
+
+import pytest
+from fastapi import HTTPException
+
+from config import EXCLUDE_MAX_BOXES
+from services.spatial import SpatialParams, parse_boxes
+
+
+def test_parse_boxes():
+    assert parse_boxes(None) == ()
+    assert parse_boxes("") == ()
+    assert parse_boxes("3.5,49.5,3.625,49.625;3.625,49.5,3.75,49.625") == (
+        (3.5, 49.5, 3.625, 49.625),
+        (3.625, 49.5, 3.75, 49.625),
+    )
+
+
+@pytest.mark.parametrize("raw", ["1,2,3", "a,b,c,d", "3,0,1,1", "0,3,1,1", "0,0,1,1;"])
+def test_parse_boxes_rejects_malformed(raw):
+    with pytest.raises(HTTPException) as error:
+        parse_boxes(raw)
+    assert error.value.status_code == 400
+
+
+def test_parse_boxes_rejects_too_many():
+    with pytest.raises(HTTPException) as error:
+        parse_boxes(";".join(["0,0,1,1"] * (EXCLUDE_MAX_BOXES + 1)))
+    assert error.value.status_code == 400
+
+
+def test_snapped_bbox_is_shared_by_close_views():
+    a = SpatialParams(100, 3.5012, 49.5031, 3.6487, 49.5969).snapped()
+    b = SpatialParams(100, 3.5047, 49.5002, 3.6491, 49.5993).snapped()
+    assert a.bbox == b.bbox
+    assert a.cache_params() == b.cache_params()
+    # Snapped outward: the view is still covered
+    assert a.xmin <= 3.5012 and a.ymin <= 49.5031 and a.xmax >= 3.6487 and a.ymax >= 49.5969
+
+
+def test_snapped_keeps_overlapping_and_touching_boxes():
+    params = SpatialParams(100, 3.5, 49.5, 3.625, 49.625, exclude=(
+        (3.4, 49.5, 3.55, 49.625),    # overlapping
+        (3.625, 49.5, 3.75, 49.625),  # touching the east edge
+        (3.8, 49.5, 3.9, 49.625),     # apart
+    )).snapped()
+    assert params.bbox == (3.5, 49.5, 3.625, 49.625)
+    assert params.exclude == ((3.4, 49.5, 3.55, 49.625), (3.625, 49.5, 3.75, 49.625))
+
+
+def test_snapped_without_bbox():
+    params = SpatialParams(limit=10, exclude=((0, 0, 1, 1),))
+    assert params.snapped() is params
+    assert params.cache_params()["bbox"] is None
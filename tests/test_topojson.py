@@ -0,0 +1,88 @@
+"""
+TopoJSON encoding, decoded back to the original geometries.
+"""
+
+import json
+from collections import namedtuple
+
+from shapely.geometry import MultiPolygon, Point, Polygon, shape
+
+from services.topojson import encode_topology
+
+Row = namedtuple("Row", "id properties wkb")
+
+
+def decode(topology: dict, name: str) -> list:
+    """
+    Python counterpart of decodeTopology() in static/index.html.
+    """
+    (sx, sy), (tx, ty) = topology["transform"]["scale"], topology["transform"]["translate"]
+    arcs = []
+    for arc in topology["arcs"]:
+        x = y = 0
+        points = []
+        for dx, dy in arc:
+            x, y = x + dx, y + dy
+            points.append([x * sx + tx, y * sy + ty])
+        arcs.append(points)
+
+    def line(indexes):
+        points = []
+        for index in indexes:
+            arc = arcs[index] if index >= 0 else arcs[~index][::-1]
+            points.extend(arc if not points else arc[1:])
+        return points
+
+    features = []
+    for geometry in topology["objects"][name]["geometries"]:
+        kind = geometry["type"]
+        if kind == "Polygon":
+            coordinates = [line(ring) for ring in geometry["arcs"]]
+        elif kind == "MultiPolygon":
+            coordinates = [[line(ring) for ring in polygon] for polygon in geometry["arcs"]]
+        elif kind == "Point":
+            coordinates = [c * s + t for c, s, t in zip(geometry["coordinates"], (sx, sy), (tx, ty))]
+        features.append({
+            "id": geometry["id"],
+            "properties": geometry["properties"],
+            "geometry": None if kind is None else {"type": kind, "coordinates": coordinates},
+        })
+    return features
+
+
+def test_round_trip_shares_boundaries():
+    left = MultiPolygon([Polygon([(0, 0), (1, 0), (1, 1), (0, 1)])])
+    right = Polygon([(1, 0), (2, 0), (2, 1), (1, 1)], [[(1.25, 0.25), (1.75, 0.25), (1.75, 0.75), (1.25, 0.75)]])
+    point = Point(0.5, 0.5)
+    rows = [
+        Row(1, '{"idu": "A"}', left.wkb),
+        Row(2, '{"idu": "B"}', right.wkb),
+        Row(3, '{"idu": "C"}', point.wkb),
+        Row(4, '{"idu": "D"}', None),
+    ]
+
+    topology = json.loads(encode_topology("parcelle", rows, bounds=(0, 0, 2, 1)))
+    features = decode(topology, "parcelle")
+
+    assert [f["id"] for f in features] == [1, 2, 3, 4]
+    assert [f["properties"]["idu"] for f in features] == ["A", "B", "C", "D"]
+    step = max(topology["transform"]["scale"])
+    for feature, geometry in zip(features, (left, right, point)):
+        decoded = shape(feature["geometry"])
+        assert decoded.geom_type == geometry.geom_type
+        assert decoded.normalize().equals_exact(geometry.normalize(), step)
+    assert features[3]["geometry"] is None
+
+    # The common edge is one arc, used in both directions
+    geometries = topology["objects"]["parcelle"]["geometries"]
+    left_arcs = {i if i >= 0 else ~i for i in geometries[0]["arcs"][0][0]}
+    right_arcs = {i if i >= 0 else ~i for i in geometries[1]["arcs"][0]}
+    assert len(left_arcs & right_arcs) == 1
+
+
+def test_quantization_follows_bounds():
+    square = Polygon([(0, 0), (1, 0), (1, 1), (0, 1)])
+    topology = json.loads(encode_topology("parcelle", [Row(1, "{}", square.wkb)], bounds=(0, 0, 10, 10)))
+    wide = json.loads(encode_topology("parcelle", [Row(1, "{}", square.wkb)], bounds=(0, 0, 100, 100)))
+    assert wide["transform"]["scale"][0] == 10 * topology["transform"]["scale"][0]
+    assert square.equals(shape(decode(wide, "parcelle")[0]["geometry"]))